@@ -0,0 +1,108 @@
+"""Archival of finished records into cold collections.
+
+Resolved emergencies, completed or cancelled appointments and completed
+consultations older than the retention age are moved, in batches, from
+their collection to "<collection>_archive". The hot collections, and their
+indexes, then only hold the working set: pending emergencies and recent or
+upcoming appointments. List endpoints read the archives only when asked
+to (include_archived=true). Archiving is not a deletion: delta sync sends
+no tombstone and clients keep their copies.
+
+A batch is copied to the archive with upserts and only then deleted from
+the hot collection, so an interrupted batch leaves at most a duplicate that
+the next run overwrites. A record whose status changed after it was copied
+is not deleted and its copy is removed again. Every worker may run the job;
+concurrent runs move the same records idempotently.
+"""
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING, ReplaceOne
+
+logger = logging.getLogger(__name__)
+
+# Archived collection -> (archived statuses, age field)
+ARCHIVE_RULES: Dict[str, Tuple[Tuple[str, ...], str]] = {
+    "emergencies": (("resolved",), "timestamp"),
+    "appointments": (("completed", "cancelled"), "appointment_date"),
+    "consultations": (("completed",), "consultation_date"),
+}
+
+
+def archive_collection(collection_name: str) -> str:
+    return f"{collection_name}_archive"
+
+
+def archived_filter(collection_name: str, cutoff: datetime) -> dict:
+    """Records of a collection due for archival"""
+    statuses, age_field = ARCHIVE_RULES[collection_name]
+    return {"status": {"$in": list(statuses)}, age_field: {"$lt": cutoff}}
+
+
+async def archive_batch(db, collection_name: str, cutoff: datetime, batch_size: int) -> List[dict]:
+    """Move up to batch_size records older than cutoff to the archive, returning the moved records"""
+    hot = db[collection_name]
+    cold = db[archive_collection(collection_name)]
+    query = archived_filter(collection_name, cutoff)
+    _, age_field = ARCHIVE_RULES[collection_name]
+    documents = await hot.find(query, {"_id": 0}).sort([(age_field, ASCENDING), ("id", ASCENDING)]).to_list(batch_size)
+    if not documents:
+        return []
+
+    await cold.bulk_write(
+        [ReplaceOne({"id": document["id"]}, document, upsert=True) for document in documents], ordered=False
+    )
+    ids = [document["id"] for document in documents]
+    await hot.delete_many({"id": {"$in": ids}, **query})
+    # Records that changed status in between stay hot
+    kept = {document["id"] async for document in hot.find({"id": {"$in": ids}}, {"_id": 0, "id": 1})}
+    if kept:
+        await cold.delete_many({"id": {"$in": list(kept)}})
+    return [document for document in documents if document["id"] not in kept]
+
+
+class Archiver:
+    def __init__(
+        self,
+        db,
+        max_age_days: float = 90,
+        batch_size: int = 1000,
+        on_archived: Optional[Callable[[str, List[dict]], Awaitable[None]]] = None,
+    ):
+        self.db = db
+        self.max_age = timedelta(days=max_age_days)
+        self.batch_size = batch_size
+        self.on_archived = on_archived
+
+    async def archive_once(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Archive every due record, returning the number moved per collection"""
+        cutoff = (now or datetime.utcnow()) - self.max_age
+        moved = {}
+        for collection_name in ARCHIVE_RULES:
+            moved[collection_name] = 0
+            while True:
+                documents = await archive_batch(self.db, collection_name, cutoff, self.batch_size)
+                if documents:
+                    moved[collection_name] += len(documents)
+                    if self.on_archived:
+                        await self.on_archived(collection_name, documents)
+                if len(documents) < self.batch_size:
+                    break
+            if moved[collection_name]:
+                logger.info(f"Archived {moved[collection_name]} {collection_name}")
+        return moved
+
+    async def run(self, interval: float):
+        """Archive every interval seconds, starting at a random offset so workers do not run together"""
+        await asyncio.sleep(random.uniform(0, interval))
+        while True:
+            try:
+                await self.archive_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Archival failed, retrying in {interval}s: {e}")
+            await asyncio.sleep(interval)
@@ -0,0 +1,199 @@
+"""Doctor schedules: appointment slot parsing and an in-memory booking index.
+
+Appointments occupy fixed-length slots aligned to APPOINTMENT_SLOT_MINUTES.
+The index keeps, per doctor and day, the booked intervals sorted by start
+time so conflicts are found with a binary search. Days are loaded from
+MongoDB the first time they are needed (upcoming days are preloaded on
+startup) and kept up to date by the appointment endpoints of this process.
+
+Changes made by other workers only reach this index when the day is
+reloaded, after ttl seconds, so the authoritative guard is the unique
+(doctor_name, appointment_date, slot_start) index: a concurrent double
+booking fails on insert with a duplicate key error. At most max_days days
+are kept, least recently used first out, and days without bookings are not
+kept at all, so availability requests for arbitrary doctors and dates do
+not grow the index.
+"""
+import bisect
+import re
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+INACTIVE_STATUSES = ("cancelled",)
+
+_TIME_PATTERN = re.compile(r"^([01]?\d|2[0-3]):([0-5]\d)$")
+
+
+def parse_time(value: str) -> int:
+    """Minutes after midnight for an "HH:MM" time"""
+    match = _TIME_PATTERN.match(value.strip()) if isinstance(value, str) else None
+    if not match:
+        raise ValueError("time must be HH:MM")
+    return int(match.group(1)) * 60 + int(match.group(2))
+
+
+def format_time(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def parse_slot(value: str, slot_minutes: int) -> int:
+    """Start minute of the slot booked at appointment_time; it must fall on the slot grid"""
+    minutes = parse_time(value)
+    if minutes % slot_minutes:
+        raise ValueError(f"appointment_time must be on a {slot_minutes}-minute boundary")
+    return minutes
+
+
+def parse_working_hours(value: str) -> List[Tuple[int, int]]:
+    """"08:00-12:00,14:00-18:00" -> [(480, 720), (840, 1080)]"""
+    ranges = []
+    for part in value.split(","):
+        start, end = part.strip().split("-")
+        ranges.append((parse_time(start), parse_time(end)))
+    return ranges
+
+
+def as_day(value) -> Optional[date]:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str):
+        try:
+            return date.fromisoformat(value[:10])
+        except ValueError:
+            return None
+    return None
+
+
+class SlotIndex:
+    def __init__(self, collection, slot_minutes: int, ttl: float = 30.0, max_days: int = 10000):
+        self.collection = collection
+        self.slot_minutes = slot_minutes
+        self.ttl = ttl
+        self.max_days = max_days
+        # (doctor_name, day) -> sorted [(start, end, appointment_id)], least recently used first
+        self._days: "OrderedDict[Tuple[str, date], list]" = OrderedDict()
+        self._expires: Dict[Tuple[str, date], float] = {}
+        self._by_id: Dict[str, Tuple[Tuple[str, date], tuple]] = {}
+
+    def _entry(self, appointment: dict):
+        day = as_day(appointment.get("appointment_date"))
+        try:
+            start = parse_time(appointment.get("appointment_time"))
+        except ValueError:
+            return None
+        if day is None:
+            return None
+        return (appointment["doctor_name"], day), (start, start + self.slot_minutes, appointment["id"])
+
+    def _insert(self, key, entry):
+        self.remove(entry[2])
+        bisect.insort(self._days[key], entry)
+        self._by_id[entry[2]] = (key, entry)
+
+    def _store(self, key, entries: list):
+        """Cache a loaded day, evicting the least recently used ones over max_days"""
+        self.forget_day(*key)
+        self._days[key] = []
+        self._expires[key] = time.monotonic() + self.ttl
+        for entry in entries:
+            self._insert(key, entry)
+        while len(self._days) > self.max_days:
+            self.forget_day(*next(iter(self._days)))
+
+    def _cached(self, key) -> Optional[list]:
+        if key not in self._days:
+            return None
+        if self._expires[key] <= time.monotonic():
+            self.forget_day(*key)
+            return None
+        self._days.move_to_end(key)
+        return self._days[key]
+
+    def _load_documents(self, appointments) -> Dict[Tuple[str, date], list]:
+        days: Dict[Tuple[str, date], list] = {}
+        for appointment in appointments:
+            parsed = self._entry(appointment)
+            if parsed:
+                days.setdefault(parsed[0], []).append(parsed[1])
+        return days
+
+    async def warm(self, from_day: date):
+        """Load every active appointment from from_day on"""
+        cursor = self.collection.find(
+            {"appointment_date": {"$gte": datetime.combine(from_day, datetime.min.time())},
+             "status": {"$nin": list(INACTIVE_STATUSES)}},
+            {"_id": 0, "id": 1, "doctor_name": 1, "appointment_date": 1, "appointment_time": 1},
+        )
+        days = self._load_documents(await cursor.to_list(None))
+        self.clear()
+        for key in sorted(days, key=lambda key: key[1], reverse=True):
+            # Nearest days last, so they are the last evicted
+            self._store(key, days[key])
+
+    async def _day(self, doctor_name: str, day: date) -> list:
+        key = (doctor_name, day)
+        entries = self._cached(key)
+        if entries is not None:
+            return entries
+        start = datetime.combine(day, datetime.min.time())
+        appointments = await self.collection.find(
+            {"doctor_name": doctor_name,
+             "appointment_date": {"$in": [start, day.isoformat()]},
+             "status": {"$nin": list(INACTIVE_STATUSES)}},
+            {"_id": 0, "id": 1, "doctor_name": 1, "appointment_date": 1, "appointment_time": 1},
+        ).to_list(None)
+        # Another coroutine may have loaded or booked this day meanwhile
+        entries = self._cached(key)
+        if entries is not None:
+            return entries
+        loaded = self._load_documents(appointments).get(key, [])
+        if not loaded:
+            return []
+        self._store(key, loaded)
+        return self._days[key]
+
+    async def conflict(self, doctor_name: str, day: date, start: int, ignore_id: Optional[str] = None) -> Optional[str]:
+        """Id of an appointment overlapping [start, start + slot) for this doctor and day, if any"""
+        end = start + self.slot_minutes
+        entries = await self._day(doctor_name, day)
+        position = bisect.bisect_left(entries, (start,))
+        for other_start, other_end, appointment_id in entries[max(0, position - 1):position + 1]:
+            if appointment_id != ignore_id and other_start < end and start < other_end:
+                return appointment_id
+        return None
+
+    async def booked(self, doctor_name: str, day: date) -> List[Tuple[int, int, str]]:
+        return list(await self._day(doctor_name, day))
+
+    def add(self, appointment: dict):
+        """Record an active appointment (a stored document or model dict)"""
+        parsed = self._entry(appointment)
+        if parsed and self._cached(parsed[0]) is not None:
+            self._insert(*parsed)
+        elif parsed:
+            # Day not loaded yet: it will be read from MongoDB on first use
+            self.remove(appointment["id"])
+
+    def remove(self, appointment_id: str):
+        found = self._by_id.pop(appointment_id, None)
+        if found:
+            key, entry = found
+            entries = self._days.get(key, [])
+            position = bisect.bisect_left(entries, entry)
+            if position < len(entries) and entries[position] == entry:
+                del entries[position]
+
+    def forget_day(self, doctor_name: str, day: date):
+        """Drop a cached day so it is reloaded from MongoDB"""
+        self._expires.pop((doctor_name, day), None)
+        for entry in self._days.pop((doctor_name, day), []):
+            self._by_id.pop(entry[2], None)
+
+    def clear(self):
+        self._days = OrderedDict()
+        self._expires = {}
+        self._by_id = {}
@@ -0,0 +1,186 @@
+"""Bulk import of records from JSON arrays or NDJSON streams.
+
+Items are validated one by one so every item gets its own result, then
+written in batches with a single unordered bulk_write per batch.
+"""
+import json
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Sequence, Tuple, Union
+
+from fastapi import HTTPException, Request
+from pydantic import BaseModel, ValidationError
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+BULK_BATCH_SIZE = 1000
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonlines")
+
+
+class BulkItemResult(BaseModel):
+    index: int
+    status: str  # created, updated, not_found, invalid, error
+    id: Optional[str] = None
+    error: Optional[Union[str, list]] = None
+
+
+class BulkResult(BaseModel):
+    created: int = 0
+    updated: int = 0
+    failed: int = 0
+    results: List[BulkItemResult] = []
+
+
+async def read_items(request: Request) -> AsyncIterator[Tuple[int, object]]:
+    """Yield (index, item) from a JSON array body or, line by line, from an NDJSON stream"""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type in NDJSON_MEDIA_TYPES:
+        index = 0
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield index, _parse_line(line)
+                    index += 1
+        if buffer.strip():
+            yield index, _parse_line(buffer)
+        return
+
+    try:
+        items = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or an NDJSON stream")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or an NDJSON stream")
+    for index, item in enumerate(items):
+        yield index, item
+
+
+def _parse_line(line: bytes):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return ValueError(f"Invalid JSON line: {e}")
+
+
+async def bulk_apply(
+    collection,
+    items: AsyncIterator[Tuple[int, object]],
+    build_insert: Callable[[dict], dict],
+    build_update: Callable[[dict], dict],
+    on_write: Optional[Callable[[List[Tuple[Optional[dict], dict]]], Awaitable]] = None,
+    tracked_fields: Sequence[str] = (),
+    complete_update: Optional[Callable[[dict, dict], dict]] = None,
+) -> BulkResult:
+    """Validate items and write them in unordered batches.
+
+    Items with an "id" are updates of existing records (build_update returns
+    the fields to $set), the others are new records (build_insert returns the
+    document to insert).
+
+    on_write is awaited after each batch with a (before, after) pair per
+    successful write: before is None for inserts, and for updates holds the
+    tracked_fields of the record as read before the batch was written.
+
+    complete_update(before, payload), when given, returns the fields to $set
+    for an update given those same tracked_fields, for changes that depend on
+    the values being replaced; it may raise ValueError to reject the item.
+    """
+    result = BulkResult()
+    batch = []
+    batch_ids = set()
+    async for index, item in items:
+        try:
+            if isinstance(item, Exception):
+                raise item
+            if not isinstance(item, dict):
+                raise ValueError("Item must be a JSON object")
+            if item.get("id"):
+                record_id = item["id"]
+                payload = build_update(item)
+                operation = _update_operation(record_id, payload)
+            else:
+                payload = build_insert(item)
+                record_id = payload["id"]
+                operation = InsertOne(payload)
+        except ValidationError as e:
+            result.results.append(BulkItemResult(index=index, status="invalid", error=e.errors(include_url=False, include_context=False, include_input=False)))
+            continue
+        except ValueError as e:
+            result.results.append(BulkItemResult(index=index, status="invalid", error=str(e)))
+            continue
+
+        if isinstance(operation, UpdateOne) and record_id in batch_ids:
+            # Unordered writes to one record could apply in any order: write the earlier one first,
+            # so this update also reads the values it replaces
+            await _write_batch(collection, batch, result, on_write, tracked_fields, complete_update)
+            batch, batch_ids = [], set()
+        batch.append((index, record_id, operation, payload))
+        batch_ids.add(record_id)
+        if len(batch) >= BULK_BATCH_SIZE:
+            await _write_batch(collection, batch, result, on_write, tracked_fields, complete_update)
+            batch, batch_ids = [], set()
+    if batch:
+        await _write_batch(collection, batch, result, on_write, tracked_fields, complete_update)
+
+    result.results.sort(key=lambda item_result: item_result.index)
+    result.created = sum(1 for r in result.results if r.status == "created")
+    result.updated = sum(1 for r in result.results if r.status == "updated")
+    result.failed = len(result.results) - result.created - result.updated
+    return result
+
+
+def _update_operation(record_id: str, payload: dict) -> UpdateOne:
+    return UpdateOne(
+        {"id": record_id},
+        {"$set": {**payload, "updated_at": datetime.utcnow()}, "$inc": {"version": 1}},
+    )
+
+
+async def _write_batch(collection, batch: list, result: BulkResult, on_write, tracked_fields: Sequence[str],
+                       complete_update: Optional[Callable[[dict, dict], dict]] = None):
+    update_ids = [record_id for _, record_id, operation, _ in batch if isinstance(operation, UpdateOne)]
+    existing = {}
+    if update_ids:
+        projection = {"_id": 0, "id": 1, **{field: 1 for field in tracked_fields}}
+        found = await collection.find({"id": {"$in": update_ids}}, projection).to_list(None)
+        existing = {document["id"]: document for document in found}
+
+    operations = []
+    positions = []
+    for index, record_id, operation, payload in batch:
+        if isinstance(operation, UpdateOne) and record_id not in existing:
+            result.results.append(BulkItemResult(index=index, status="not_found", id=record_id))
+            continue
+        if isinstance(operation, UpdateOne) and complete_update:
+            try:
+                payload = complete_update(existing[record_id], payload)
+            except ValueError as e:
+                result.results.append(BulkItemResult(index=index, status="invalid", id=record_id, error=str(e)))
+                continue
+            operation = _update_operation(record_id, payload)
+        positions.append((index, record_id, "updated" if isinstance(operation, UpdateOne) else "created", payload))
+        operations.append(operation)
+    if not operations:
+        return
+
+    errors = {}
+    try:
+        await collection.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        errors = {error["index"]: error.get("errmsg", "Write failed") for error in e.details.get("writeErrors", [])}
+
+    written = []
+    for position, (index, record_id, status, payload) in enumerate(positions):
+        if position in errors:
+            result.results.append(BulkItemResult(index=index, status="error", id=record_id, error=errors[position]))
+            continue
+        result.results.append(BulkItemResult(index=index, status=status, id=record_id))
+        if status == "created":
+            written.append((None, payload))
+        else:
+            before = existing[record_id]
+            written.append((before, {**before, **payload}))
+    if on_write and written:
+        await on_write(written)
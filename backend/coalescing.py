@@ -0,0 +1,81 @@
+"""Single-flight request coalescing with an optional micro-cache.
+
+Concurrent callers asking for the same key share one computation: the first
+one (the leader) runs it and the others await its result. With a positive
+ttl the result is also kept for that many seconds, so callers arriving just
+after the leader finished reuse it too. Failures are shared by the callers
+waiting on them but never cached.
+
+Every outcome is counted in metrics.coalesced_requests by result: "miss"
+(ran the computation), "shared" (joined one in flight) or "cached".
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+import metrics
+
+
+class Coalescer:
+    def __init__(self, name: str, ttl: float = 0.0, max_entries: int = 1000):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._cache: OrderedDict[Hashable, Tuple[float, Any]] = OrderedDict()
+
+    def _cached(self, key: Hashable, now: float):
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del self._cache[key]
+            return None
+        return entry
+
+    def _store(self, key: Hashable, value, now: float):
+        self._cache[key] = (now + self.ttl, value)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[Any]]):
+        """Result of compute() for key, shared with concurrent and (within ttl) recent callers"""
+        if self.ttl > 0:
+            entry = self._cached(key, time.monotonic())
+            if entry is not None:
+                metrics.coalesced_requests.inc(self.name, "cached")
+                return entry[1]
+
+        while key in self._inflight:
+            future = self._inflight[key]
+            metrics.coalesced_requests.inc(self.name, "shared")
+            try:
+                # shield: a follower going away must not cancel the leader
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leader was cancelled (its client disconnected): take over
+
+        metrics.coalesced_requests.inc(self.name, "miss")
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieved here, so a failure nobody else awaited is not logged as unhandled
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            if self.ttl > 0:
+                self._store(key, value, time.monotonic())
+            return value
+        finally:
+            del self._inflight[key]
@@ -0,0 +1,162 @@
+"""Negotiated response compression (brotli or gzip).
+
+Responses of at least minimum_size bytes are compressed with the best
+encoding the client accepts: brotli when the brotli package is installed,
+otherwise gzip. Streamed responses (exports) are compressed chunk by chunk
+and flushed so each chunk still reaches the client promptly; Server-Sent
+Events are never compressed because proxies and clients buffer them, and
+neither are already compressed formats (images, archives, Parquet).
+
+Compressing changes the bytes but not the meaning of a response, so strong
+ETags are turned into weak ones, as RFC 9110 expects.
+"""
+import gzip
+import zlib
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+SKIPPED_MEDIA_TYPES = ("text/event-stream", "image/", "video/", "audio/", "application/zip", "application/gzip",
+                       "application/vnd.apache.parquet")
+
+
+def _accepted_encodings(header: str) -> dict:
+    encodings = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            encodings[name.strip().lower()] = quality
+    return encodings
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Preferred supported encoding in an Accept-Encoding header, or None"""
+    accepted = _accepted_encodings(accept_encoding)
+    candidates = (["br"] if brotli else []) + ["gzip"]
+    best = None
+    for encoding in candidates:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (encoding, quality)
+    return best[0] if best else None
+
+
+class _Compressor:
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=level)
+        else:
+            self._zlib = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._brotli.process(data)
+            return out + (self._brotli.finish() if final else self._brotli.flush())
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+def compress(data: bytes, encoding: str, level: int) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses of at least minimum_size bytes"""
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.levels = {"gzip": gzip_level, "br": brotli_quality}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        level = self.levels[encoding]
+        start = None
+        compressor = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                response_headers = {k.lower(): v for k, v in message.get("headers", [])}
+                content_type = response_headers.get(b"content-type", b"").decode("latin-1")
+                passthrough = (
+                    b"content-encoding" in response_headers
+                    or message["status"] < 200 or message["status"] in (204, 304)
+                    or content_type.startswith(SKIPPED_MEDIA_TYPES)
+                )
+                if passthrough:
+                    await send(message)
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None and start is not None:
+                if not more_body:
+                    # Whole response in one message
+                    if len(body) < self.minimum_size:
+                        await send(start)
+                    else:
+                        body = compress(body, encoding, level)
+                        await send(_encoded_start(start, encoding, len(body)))
+                    start = None
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                compressor = _Compressor(encoding, level)
+                await send(_encoded_start(start, encoding, None))
+                start = None
+            if compressor is None:
+                await send(message)
+                return
+            await send({
+                "type": "http.response.body",
+                "body": compressor.compress(body, final=not more_body),
+                "more_body": more_body,
+            })
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def _encoded_start(start: dict, encoding: str, length: Optional[int]) -> dict:
+    headers = []
+    vary = None
+    for name, value in start.get("headers", []):
+        lowered = name.lower()
+        if lowered == b"content-length":
+            continue
+        if lowered == b"vary":
+            vary = value
+            continue
+        if lowered == b"etag" and not value.startswith(b"W/"):
+            value = b"W/" + value
+        headers.append((name, value))
+    headers.append((b"content-encoding", encoding.encode()))
+    headers.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+    if length is not None:
+        headers.append((b"content-length", str(length).encode()))
+    return {**start, "headers": headers}
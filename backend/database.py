@@ -0,0 +1,57 @@
+"""MongoDB client construction with connection pool settings read from the environment.
+
+Every setting is optional; unset ones keep the driver (or connection string)
+defaults. Each worker process creates its own client, so the server sees up
+to workers x MONGO_MAX_POOL_SIZE connections from one host.
+
+    MONGO_MAX_POOL_SIZE                 connections per process (driver default 100)
+    MONGO_MIN_POOL_SIZE                 connections kept open when idle (default 0)
+    MONGO_MAX_CONNECTING                connections being opened at once (default 2)
+    MONGO_MAX_IDLE_TIME_MS              close connections idle this long
+    MONGO_WAIT_QUEUE_TIMEOUT_MS         fail a request waiting this long for a free connection
+    MONGO_CONNECT_TIMEOUT_MS            TCP connect timeout (default 20000)
+    MONGO_SOCKET_TIMEOUT_MS             network read timeout (default none)
+    MONGO_SERVER_SELECTION_TIMEOUT_MS   wait for a usable server (default 30000)
+    MONGO_COMPRESSORS                   wire compression, e.g. "zstd,zlib" (zstd and snappy
+                                        need the zstandard / python-snappy packages)
+    MONGO_ZLIB_COMPRESSION_LEVEL        -1 to 9
+    MONGO_APP_NAME                      reported in MongoDB logs and currentOp
+"""
+import os
+from typing import Dict, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+# environment variable -> (client option, type)
+CLIENT_SETTINGS = {
+    "MONGO_MAX_POOL_SIZE": ("maxPoolSize", int),
+    "MONGO_MIN_POOL_SIZE": ("minPoolSize", int),
+    "MONGO_MAX_CONNECTING": ("maxConnecting", int),
+    "MONGO_MAX_IDLE_TIME_MS": ("maxIdleTimeMS", int),
+    "MONGO_WAIT_QUEUE_TIMEOUT_MS": ("waitQueueTimeoutMS", int),
+    "MONGO_CONNECT_TIMEOUT_MS": ("connectTimeoutMS", int),
+    "MONGO_SOCKET_TIMEOUT_MS": ("socketTimeoutMS", int),
+    "MONGO_SERVER_SELECTION_TIMEOUT_MS": ("serverSelectionTimeoutMS", int),
+    "MONGO_COMPRESSORS": ("compressors", str),
+    "MONGO_ZLIB_COMPRESSION_LEVEL": ("zlibCompressionLevel", int),
+    "MONGO_APP_NAME": ("appname", str),
+}
+
+
+def client_options(environ: Optional[Dict[str, str]] = None) -> dict:
+    """Client keyword arguments for the MONGO_* settings present in environ"""
+    environ = os.environ if environ is None else environ
+    options = {}
+    for variable, (option, convert) in CLIENT_SETTINGS.items():
+        value = environ.get(variable, "").strip()
+        if value:
+            try:
+                options[option] = convert(value)
+            except ValueError:
+                raise ValueError(f"{variable} must be an integer, got {value!r}")
+    return options
+
+
+def create_client(**kwargs) -> AsyncIOMotorClient:
+    """Motor client for MONGO_URL with the pool settings from the environment"""
+    return AsyncIOMotorClient(os.environ['MONGO_URL'], **client_options(), **kwargs)
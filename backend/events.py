@@ -0,0 +1,93 @@
+"""In-process publish/subscribe for real-time feeds.
+
+Every event is encoded once and fanned out to all subscribers. Each
+subscriber has a bounded queue; publishing never waits on a slow consumer.
+When a queue overflows its pending events are dropped and replaced by a
+single "resync" event, telling that client to reload the list.
+"""
+import asyncio
+import logging
+from typing import Optional, Set
+
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE_SIZE = 256
+RESYNC = b"event: resync\ndata: {}\n\n"
+
+
+class Subscription:
+    def __init__(self, hub: "EventHub", maxsize: int):
+        self.hub = hub
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def offer(self, message: bytes):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped += self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        """Next message, or None when timeout expires first"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class EventHub:
+    def __init__(self, name: str, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.name = name
+        self.queue_size = queue_size
+        self.subscribers: Set[Subscription] = set()
+        self.published = 0
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self, self.queue_size)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscribers.discard(subscription)
+        if subscription.dropped:
+            logger.warning(f"{self.name} subscriber dropped {subscription.dropped} events")
+
+    def publish(self, event_type: str, payload: dict):
+        """Encode an event once as a Server-Sent Events message and queue it for every subscriber"""
+        self.published += 1
+        if not self.subscribers:
+            return
+        message = b"event: " + event_type.encode() + b"\ndata: " + dumps(payload) + b"\n\n"
+        for subscription in list(self.subscribers):
+            subscription.offer(message)
+
+
+async def watch_changes(collection, hub: EventHub, to_event, retry_delay: float = 5.0):
+    """Publish changes from a MongoDB change stream (replica sets only).
+
+    to_event maps a change document to (event_type, payload), or None to skip it.
+    The stream is resumed from the last seen token after errors.
+    """
+    resume_token = None
+    while True:
+        try:
+            async with collection.watch(full_document="updateLookup", resume_after=resume_token) as stream:
+                logger.info(f"Watching {collection.name} change stream for {hub.name}")
+                async for change in stream:
+                    resume_token = stream.resume_token
+                    event = to_event(change)
+                    if event:
+                        hub.publish(*event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"{hub.name} change stream failed, retrying in {retry_delay}s: {e}")
+            await asyncio.sleep(retry_delay)
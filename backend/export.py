@@ -0,0 +1,182 @@
+"""Streaming exports of whole collections as CSV, NDJSON or Parquet.
+
+Records are read from MongoDB cursors batch_size at a time and each batch is
+encoded and sent before the next one is read, so memory use depends on the
+batch size and not on the size of the collection. Columns and their types
+come from the record's Pydantic model; nested values (an emergency's
+location) stay objects in NDJSON and are written as JSON text in CSV and
+Parquet.
+
+Parquet needs the optional pyarrow package. Every batch becomes one row
+group that is sent as soon as it is written; the file footer follows the
+last one.
+"""
+import csv
+import datetime as dt
+import io
+import typing
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Type
+
+import orjson
+from pydantic import BaseModel
+
+from serialization import dumps
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # optional: no Parquet exports
+    pyarrow = None
+
+# format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def column_kinds(model: Type[BaseModel]) -> Dict[str, str]:
+    """Export columns of a model: field name -> "string", "int", "float", "bool", "date", "datetime" or "json" """
+    kinds = {}
+    for name, field in model.model_fields.items():
+        annotation = field.annotation
+        if typing.get_origin(annotation) is typing.Union:
+            annotation = next(arg for arg in typing.get_args(annotation) if arg is not type(None))
+        if annotation is dt.datetime:
+            kinds[name] = "datetime"
+        elif annotation is dt.date:
+            kinds[name] = "date"
+        elif annotation in (int, float, bool, str):
+            kinds[name] = annotation.__name__.replace("str", "string")
+        else:
+            kinds[name] = "json"
+    return kinds
+
+
+def _cell(kind: str, value, nested_as_text: bool = True):
+    """A stored value as the column type (dates are stored as BSON dates, some legacy ones as strings)"""
+    if value is None:
+        return None
+    if kind == "date":
+        if isinstance(value, dt.datetime):
+            return value.date()
+        return dt.date.fromisoformat(value[:10]) if isinstance(value, str) else value
+    if kind == "datetime" and isinstance(value, str):
+        return dt.datetime.fromisoformat(value)
+    if kind == "json" and nested_as_text:
+        return dumps(value).decode()
+    return value
+
+
+def _rows(documents: List[dict], columns: Dict[str, str], nested_as_text: bool = True) -> List[list]:
+    return [
+        [_cell(kind, document.get(name), nested_as_text) for name, kind in columns.items()]
+        for document in documents
+    ]
+
+
+async def _batches(cursors: Iterable, batch_size: int) -> AsyncIterator[List[dict]]:
+    batch = []
+    for cursor in cursors:
+        async for document in cursor.batch_size(batch_size):
+            batch.append(document)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+async def _csv(batches: AsyncIterator[List[dict]], columns: Dict[str, str]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    async for batch in batches:
+        writer.writerows(
+            ["" if value is None else value.isoformat() if isinstance(value, dt.date) else value for value in row]
+            for row in _rows(batch, columns)
+        )
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Header of an empty export
+        yield buffer.getvalue().encode()
+
+
+async def _ndjson(batches: AsyncIterator[List[dict]], columns: Dict[str, str]) -> AsyncIterator[bytes]:
+    async for batch in batches:
+        yield b"".join(
+            orjson.dumps(dict(zip(columns, row)), option=orjson.OPT_APPEND_NEWLINE)
+            for row in _rows(batch, columns, nested_as_text=False)
+        )
+
+
+class _Chunks(io.RawIOBase):
+    """Write-only file collecting what pyarrow writes until it is drained"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def parquet_schema(columns: Dict[str, str]):
+    types = {
+        "string": pyarrow.string(), "json": pyarrow.string(), "int": pyarrow.int64(), "float": pyarrow.float64(),
+        "bool": pyarrow.bool_(), "date": pyarrow.date32(), "datetime": pyarrow.timestamp("ms"),
+    }
+    return pyarrow.schema([(name, types[kind]) for name, kind in columns.items()])
+
+
+async def _parquet(batches: AsyncIterator[List[dict]], columns: Dict[str, str]) -> AsyncIterator[bytes]:
+    schema = parquet_schema(columns)
+    sink = _Chunks()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression="snappy")
+    try:
+        async for batch in batches:
+            rows = _rows(batch, columns)
+            table = pyarrow.Table.from_arrays(
+                [pyarrow.array([row[i] for row in rows], type=field.type) for i, field in enumerate(schema)],
+                schema=schema,
+            )
+            writer.write_table(table)
+            yield sink.drain()
+    finally:
+        writer.close()
+    # Footer
+    yield sink.drain()
+
+
+ENCODERS = {"csv": _csv, "ndjson": _ndjson, "parquet": _parquet}
+
+
+def parquet_available() -> bool:
+    return pyarrow is not None
+
+
+def stream_export(cursors: Iterable, columns: Dict[str, str], export_format: str,
+                  batch_size: int = 1000) -> AsyncIterator[bytes]:
+    """Encoded chunks of every record of the cursors, read batch_size records at a time"""
+    return ENCODERS[export_format](_batches(cursors, batch_size), columns)
+
+
+def export_filename(collection_name: str, export_format: str, day: Optional[dt.date] = None) -> str:
+    _, extension = EXPORT_FORMATS[export_format]
+    return f"{collection_name}-{(day or dt.date.today()).isoformat()}.{extension}"
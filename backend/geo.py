@@ -0,0 +1,34 @@
+"""GeoJSON helpers for emergency locations"""
+from typing import Optional
+
+EARTH_RADIUS_M = 6371000.0
+
+
+def to_geojson_point(location: dict) -> Optional[dict]:
+    """GeoJSON Point for a {latitude, longitude, ...} location, or None if it has no valid coordinates"""
+    if not isinstance(location, dict):
+        return None
+    try:
+        latitude = float(location["latitude"])
+        longitude = float(location["longitude"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+
+def near_pipeline(latitude: float, longitude: float, radius_m: float, query: dict, limit: int, projection: dict) -> list:
+    """Aggregation returning the closest documents first, with their distance in meters"""
+    return [
+        {"$geoNear": {
+            "near": {"type": "Point", "coordinates": [longitude, latitude]},
+            "key": "geo",
+            "distanceField": "distance_m",
+            "maxDistance": radius_m,
+            "query": query,
+            "spherical": True,
+        }},
+        {"$limit": limit},
+        {"$project": {**projection, "distance_m": 1}},
+    ]
@@ -0,0 +1,31 @@
+"""Gunicorn settings for running the API on several cores.
+
+    cd backend && gunicorn -c gunicorn.conf.py server:app
+
+Each worker is a separate process with its own event loop and MongoDB
+client, created by the application lifespan after the fork.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8001")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Seconds a worker may stay silent before it is restarted, and the grace
+# period for in-flight requests (and SSE streams) on shutdown or reload
+timeout = int(os.environ.get("WORKER_TIMEOUT", "60"))
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.environ.get("KEEPALIVE", "5"))
+
+# Recycle workers now and then to bound memory growth; jitter avoids
+# restarting them all at once
+max_requests = int(os.environ.get("MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.environ.get("MAX_REQUESTS_JITTER", "0"))
+
+# Proxies whose X-Forwarded-For is trusted for the client address (rate
+# limits, access log): comma separated IPs, "*" only behind a proxy that
+# overwrites the header
+forwarded_allow_ips = os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+accesslog = os.environ.get("ACCESS_LOG") or None
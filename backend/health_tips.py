@@ -0,0 +1,128 @@
+"""Health tips catalog stored in MongoDB and served from a process-level cache.
+
+The catalog is small and read far more often than it changes, so each worker
+keeps the encoded JSON responses (all tips and one per category) with their
+ETags. Entries are reloaded after a TTL and dropped immediately when tips are
+edited through this process; a load that was reading while tips were edited
+is served to its callers but not cached. Only categories that have tips are
+cached, so arbitrary category strings cannot grow the cache.
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from http_cache import strong_etag
+from serialization import dumps
+
+DEFAULT_TIPS = [
+    {
+        "id": "tip-1",
+        "title": "Hidratación Diaria",
+        "content": "Bebe al menos 8 vasos de agua al día para mantener tu cuerpo hidratado y ayudar a tu organismo a funcionar correctamente.",
+        "category": "Nutrición",
+        "image_url": "",
+        "is_active": True
+    },
+    {
+        "id": "tip-2",
+        "title": "Ejercicio Regular",
+        "content": "Realiza al menos 30 minutos de actividad física moderada 5 días a la semana para mantener un corazón saludable.",
+        "category": "Ejercicio",
+        "image_url": "",
+        "is_active": True
+    },
+    {
+        "id": "tip-3",
+        "title": "Descanso Adecuado",
+        "content": "Duerme entre 7-9 horas cada noche para permitir que tu cuerpo se recupere y tu mente se regenere.",
+        "category": "Descanso",
+        "image_url": "",
+        "is_active": True
+    },
+    {
+        "id": "tip-4",
+        "title": "Alimentación Balanceada",
+        "content": "Incluye frutas, verduras, proteínas magras y granos enteros en tu dieta diaria para obtener todos los nutrientes necesarios.",
+        "category": "Nutrición",
+        "image_url": "",
+        "is_active": True
+    },
+    {
+        "id": "tip-5",
+        "title": "Chequeos Médicos",
+        "content": "Realiza chequeos médicos regulares para detectar problemas de salud a tiempo y mantener un historial médico actualizado.",
+        "category": "Prevención",
+        "image_url": "",
+        "is_active": True
+    },
+    {
+        "id": "tip-6",
+        "title": "Manejo del Estrés",
+        "content": "Practica técnicas de relajación como meditación, yoga o respiración profunda para reducir el estrés diario.",
+        "category": "Bienestar Mental",
+        "image_url": "",
+        "is_active": True
+    }
+]
+
+TIP_FIELDS = ("id", "title", "content", "category", "image_url", "created_at", "is_active")
+
+
+class HealthTipsCatalog:
+    def __init__(self, collection, ttl_seconds: float = 300):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        self._tips = None
+        self._loaded_at = 0.0
+        self._bodies: Dict[Optional[str], Tuple[bytes, str]] = {}
+        # Moved by every invalidate, so a load overlapping an edit is not cached
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    async def seed(self):
+        """Insert the default tips that are missing, leaving edited and deleted
+        (deactivated) ones alone"""
+        now = datetime.utcnow()
+        for tip in DEFAULT_TIPS:
+            await self.collection.update_one(
+                {"id": tip["id"]},
+                {"$setOnInsert": {**tip, "created_at": now}},
+                upsert=True,
+            )
+
+    def invalidate(self):
+        self._generation += 1
+        self._tips = None
+        self._bodies = {}
+
+    def _expired(self) -> bool:
+        return self._tips is None or time.monotonic() - self._loaded_at > self.ttl_seconds
+
+    async def _load(self) -> list:
+        async with self._lock:
+            if not self._expired():
+                return self._tips
+            generation = self._generation
+            projection = {field: 1 for field in TIP_FIELDS}
+            projection["_id"] = 0
+            tips = await self.collection.find({"is_active": True}, projection).sort("id", 1).to_list(None)
+            if generation == self._generation:
+                self._bodies = {}
+                self._tips = tips
+                self._loaded_at = time.monotonic()
+            return tips
+
+    async def get(self, category: Optional[str] = None) -> Tuple[bytes, str]:
+        """Encoded JSON list of active tips (optionally one category) and its ETag"""
+        tips = self._tips
+        if self._expired():
+            tips = await self._load()
+        cached = self._bodies.get(category) if tips is self._tips else None
+        if cached is None:
+            selected = tips if category is None else [tip for tip in tips if tip["category"] == category]
+            body = dumps(selected)
+            cached = (body, strong_etag(body))
+            if tips is self._tips and (category is None or selected):
+                self._bodies[category] = cached
+        return cached
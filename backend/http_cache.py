@@ -0,0 +1,89 @@
+"""HTTP caching helpers: ETags and conditional GET handling"""
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response
+
+
+def strong_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match comparison. Uses the weak comparison, as RFC 9110 requires for GET."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def cached_response(request: Request, body: bytes, etag: str, cache_control: str) -> Response:
+    """200 with the body, or an empty 304 when the client already holds this version"""
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def list_etag(collection_version: int, request: Request) -> str:
+    """Weak ETag for a list page: the collection's write counter plus the query that selected it"""
+    query = "&".join(sorted(request.url.query.split("&")))
+    return f'W/"{collection_version}-{hashlib.sha256(query.encode()).hexdigest()[:16]}"'
+
+
+class CollectionVersions:
+    """Counters bumped on every write to a collection, one document per collection.
+
+    A list response can only change when its collection's counter moves, so
+    the counter is read before the list query and used in its ETag.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def bump(self, name: str):
+        await self.collection.update_one({"_id": name}, {"$inc": {"version": 1}}, upsert=True)
+
+    async def get(self, name: str) -> int:
+        document = await self.collection.find_one({"_id": name})
+        return document["version"] if document else 0
+
+
+def version_etag(version: Optional[int]) -> str:
+    """Strong ETag for a stored record's version counter (records written before versioning are version 0)"""
+    return f'"v{version or 0}"'
+
+
+def parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """Version a client expects from If-Match, or None when it sent no precondition (or "*").
+
+    An ETag that is not a version ETag can never match, so it maps to -1.
+    CompressionMiddleware weakens the ETags of the responses it encodes, so
+    W/"vN" names the same version as "vN".
+    """
+    if not if_match or if_match.strip() == "*":
+        return None
+    tag = if_match.split(",")[0].strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    if tag.startswith('"v') and tag.endswith('"') and tag[2:-1].isdigit():
+        return int(tag[2:-1])
+    return -1
+
+
+def version_filter(record_id: str, expected_version: Optional[int]) -> dict:
+    """Filter matching a record, and only at the expected version when one is given"""
+    query = {"id": record_id}
+    if expected_version == 0:
+        query["version"] = {"$in": [None, 0]}
+    elif expected_version is not None:
+        query["version"] = expected_version
+    return query
@@ -0,0 +1,205 @@
+"""MongoDB index declarations and query plan checks for the Salud al Paso API"""
+import logging
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, TEXT, IndexModel
+
+from archive import ARCHIVE_RULES, archive_collection, archived_filter
+from search import SEARCH_FIELDS, SEARCH_LANGUAGE
+from sync import TOMBSTONE_RETENTION_DAYS
+
+logger = logging.getLogger(__name__)
+
+# Indexes required by each collection. Every list endpoint filter gets a
+# compound index of (filter field, sort key, id) so that filtered keyset
+# pages are served by a single index range scan.
+def _text_index(collection_name: str) -> IndexModel:
+    _, weights = SEARCH_FIELDS[collection_name]
+    return IndexModel(
+        [(field, TEXT) for field in weights],
+        weights=weights,
+        default_language=SEARCH_LANGUAGE,
+        # Records have no per-document language; keep "language" an ordinary field
+        language_override="search_language",
+        name="text_search",
+    )
+
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "appointments": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("appointment_date", ASCENDING), ("id", ASCENDING)], name="date_id"),
+        IndexModel([("status", ASCENDING), ("appointment_date", ASCENDING), ("id", ASCENDING)], name="status_date_id"),
+        IndexModel([("doctor_name", ASCENDING), ("appointment_date", ASCENDING), ("id", ASCENDING)], name="doctor_date_id"),
+        IndexModel([("specialty", ASCENDING), ("appointment_date", ASCENDING), ("id", ASCENDING)], name="specialty_date_id"),
+        IndexModel([("patient_phone", ASCENDING), ("appointment_date", ASCENDING), ("id", ASCENDING)], name="phone_date_id"),
+        IndexModel([("phone_e164", ASCENDING), ("appointment_date", DESCENDING), ("id", DESCENDING)], name="phone_key_date_id"),
+        # One active appointment per doctor and slot; cancelled ones have slot_start null
+        IndexModel(
+            [("doctor_name", ASCENDING), ("appointment_date", ASCENDING), ("slot_start", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"slot_start": {"$type": "number"}},
+            name="doctor_slot_unique",
+        ),
+        IndexModel([("updated_at", ASCENDING), ("id", ASCENDING)], name="updated_id"),
+        _text_index("appointments"),
+    ],
+    "consultations": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("consultation_date", DESCENDING), ("id", DESCENDING)], name="date_id"),
+        IndexModel([("status", ASCENDING), ("consultation_date", DESCENDING), ("id", DESCENDING)], name="status_date_id"),
+        IndexModel([("doctor_name", ASCENDING), ("consultation_date", DESCENDING), ("id", DESCENDING)], name="doctor_date_id"),
+        IndexModel([("patient_phone", ASCENDING), ("consultation_date", DESCENDING), ("id", DESCENDING)], name="phone_date_id"),
+        IndexModel([("phone_e164", ASCENDING), ("consultation_date", DESCENDING), ("id", DESCENDING)], name="phone_key_date_id"),
+        IndexModel([("consultation_type", ASCENDING), ("consultation_date", DESCENDING), ("id", DESCENDING)], name="type_date_id"),
+        IndexModel([("updated_at", ASCENDING), ("id", ASCENDING)], name="updated_id"),
+        _text_index("consultations"),
+    ],
+    "emergencies": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("timestamp", ASCENDING), ("id", ASCENDING)], name="timestamp_id"),
+        IndexModel([("status", ASCENDING), ("timestamp", ASCENDING), ("id", ASCENDING)], name="status_timestamp_id"),
+        IndexModel([("phone", ASCENDING), ("timestamp", ASCENDING), ("id", ASCENDING)], name="phone_timestamp_id"),
+        IndexModel([("phone_e164", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)], name="phone_key_timestamp_id"),
+        IndexModel([("emergency_type", ASCENDING), ("timestamp", ASCENDING), ("id", ASCENDING)], name="type_timestamp_id"),
+        IndexModel([("geo", GEOSPHERE), ("status", ASCENDING)], name="geo_status"),
+        IndexModel([("updated_at", ASCENDING), ("id", ASCENDING)], name="updated_id"),
+        _text_index("emergencies"),
+    ],
+    "health_tips": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+    ],
+    "patients": [
+        IndexModel([("phone", ASCENDING)], unique=True, name="phone_unique"),
+    ],
+    "reminder_leases": [
+        # No reminder fires after its appointment started
+        IndexModel([("appointment_start", ASCENDING)], expireAfterSeconds=24 * 3600, name="appointment_start_ttl"),
+    ],
+    "tombstones": [
+        IndexModel([("collection", ASCENDING), ("updated_at", ASCENDING), ("id", ASCENDING)], name="collection_updated_id"),
+        # Sync tokens older than this are refused, so older tombstones are never read
+        IndexModel([("updated_at", ASCENDING)], expireAfterSeconds=TOMBSTONE_RETENTION_DAYS * 24 * 3600, name="updated_ttl"),
+    ],
+    "notification_outbox": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_due"),
+        IndexModel([("claim", ASCENDING)], name="claim"),
+        # Delivered messages are kept a week; dead letters stay until handled
+        IndexModel(
+            [("sent_at", ASCENDING)],
+            expireAfterSeconds=7 * 24 * 3600,
+            partialFilterExpression={"status": "sent"},
+            name="sent_ttl",
+        ),
+    ],
+}
+
+# Archives serve the same list filters (include_archived=true) but are
+# neither searched, synced, nor checked for slot conflicts
+HOT_ONLY_INDEXES = ("doctor_slot_unique", "geo_status", "updated_id", "text_search")
+for _name in ARCHIVE_RULES:
+    INDEXES[archive_collection(_name)] = [
+        index for index in INDEXES[_name] if index.document["name"] not in HOT_ONLY_INDEXES
+    ]
+
+# Query shapes issued by the API, as (collection, filter, sort). The values
+# are placeholders: only the shape matters to the query planner.
+QUERY_SHAPES: List[Tuple[str, dict, list]] = [
+    ("appointments", {"id": ""}, []),
+    ("appointments", {}, [("appointment_date", ASCENDING), ("id", ASCENDING)]),
+    ("appointments", {"status": ""}, [("appointment_date", ASCENDING), ("id", ASCENDING)]),
+    ("appointments", {"doctor_name": ""}, [("appointment_date", ASCENDING), ("id", ASCENDING)]),
+    ("appointments", {"specialty": ""}, [("appointment_date", ASCENDING), ("id", ASCENDING)]),
+    ("appointments", {"patient_phone": ""}, [("appointment_date", ASCENDING), ("id", ASCENDING)]),
+    ("consultations", {"id": ""}, []),
+    ("consultations", {}, [("consultation_date", DESCENDING), ("id", DESCENDING)]),
+    ("consultations", {"status": ""}, [("consultation_date", DESCENDING), ("id", DESCENDING)]),
+    ("consultations", {"doctor_name": ""}, [("consultation_date", DESCENDING), ("id", DESCENDING)]),
+    ("consultations", {"patient_phone": ""}, [("consultation_date", DESCENDING), ("id", DESCENDING)]),
+    ("consultations", {"consultation_type": ""}, [("consultation_date", DESCENDING), ("id", DESCENDING)]),
+    ("emergencies", {"id": ""}, []),
+    ("emergencies", {}, [("timestamp", ASCENDING), ("id", ASCENDING)]),
+    ("emergencies", {"status": ""}, [("timestamp", ASCENDING), ("id", ASCENDING)]),
+    ("emergencies", {"phone": ""}, [("timestamp", ASCENDING), ("id", ASCENDING)]),
+    ("emergencies", {"emergency_type": ""}, [("timestamp", ASCENDING), ("id", ASCENDING)]),
+    # Branches of a patient's history (/api/patients/{phone}/history)
+    ("appointments", {"phone_e164": ""}, [("appointment_date", DESCENDING), ("id", DESCENDING)]),
+    ("consultations", {"phone_e164": ""}, [("consultation_date", DESCENDING), ("id", DESCENDING)]),
+    ("emergencies", {"phone_e164": ""}, [("timestamp", DESCENDING), ("id", DESCENDING)]),
+    ("patients", {"phone": ""}, []),
+    # Delta sync (/api/*/sync): changed records, then the tombstones of deleted ones
+    ("appointments", {"updated_at": {"$gte": datetime.min}}, [("updated_at", ASCENDING), ("id", ASCENDING)]),
+    ("consultations", {"updated_at": {"$gte": datetime.min}}, [("updated_at", ASCENDING), ("id", ASCENDING)]),
+    ("emergencies", {"updated_at": {"$gte": datetime.min}}, [("updated_at", ASCENDING), ("id", ASCENDING)]),
+    ("tombstones", {"collection": "", "updated_at": {"$gte": datetime.min}}, [("updated_at", ASCENDING), ("id", ASCENDING)]),
+    # Notification outbox workers: due messages, a claimed batch, and its outcome
+    ("notification_outbox", {"status": {"$in": ["", ""]}, "next_attempt_at": {"$lte": datetime.min}}, [("next_attempt_at", ASCENDING)]),
+    ("notification_outbox", {"claim": "", "status": ""}, []),
+    ("notification_outbox", {"id": "", "claim": ""}, []),
+    # In-memory indexes: a doctor's booked slots, their warm-up, the triage
+    # queue, the reminder schedule and the health tips catalog
+    ("appointments", {"doctor_name": "", "appointment_date": {"$in": [datetime.min, ""]}, "status": {"$nin": ["", ""]}}, []),
+    ("appointments", {"appointment_date": {"$gte": datetime.min}, "status": {"$nin": ["", ""]}}, []),
+    ("emergencies", {"status": ""}, []),
+    ("appointments", {"status": {"$nin": ["", ""]}, "appointment_date": {"$gte": datetime.min, "$lte": datetime.min}}, []),
+    ("health_tips", {"is_active": True}, [("id", ASCENDING)]),
+]
+# Archival batches, oldest first
+QUERY_SHAPES += [
+    (collection_name, archived_filter(collection_name, datetime.min), [(age_field, ASCENDING), ("id", ASCENDING)])
+    for collection_name, (_, age_field) in ARCHIVE_RULES.items()
+]
+
+
+class QueryPlanError(RuntimeError):
+    """Raised when a registered query shape is planned as a collection scan"""
+
+
+async def ensure_indexes(db):
+    """Create every declared index. Existing indexes are left untouched."""
+    for collection_name, indexes in INDEXES.items():
+        names = await db[collection_name].create_indexes(indexes)
+        logger.info(f"Ensured indexes on {collection_name}: {', '.join(names)}")
+
+
+def _plan_stages(plan: dict):
+    """Yield every stage name in a winning plan tree"""
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan["stage"]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+
+def _winning_plan(explanation: dict) -> dict:
+    planner = explanation.get("queryPlanner", {})
+    return planner.get("winningPlan", {})
+
+
+async def check_query_plans(db, strict: bool = False) -> List[Tuple[str, dict, list]]:
+    """Explain every registered query shape and report those that scan the collection.
+
+    Returns the offending shapes. With strict=True a QueryPlanError is raised
+    instead, which aborts application startup.
+    """
+    collection_scans = []
+    for collection_name, query, sort in QUERY_SHAPES:
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explanation = await cursor.explain()
+        if "COLLSCAN" in set(_plan_stages(_winning_plan(explanation))):
+            collection_scans.append((collection_name, query, sort))
+            logger.error(f"COLLSCAN on {collection_name}: filter={query} sort={sort}")
+
+    if collection_scans and strict:
+        raise QueryPlanError(f"{len(collection_scans)} query shape(s) fall back to a collection scan")
+    if not collection_scans:
+        logger.info(f"All {len(QUERY_SHAPES)} registered query shapes use an index")
+    return collection_scans
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Maintenance commands for the Salud al Paso backend.
+
+Usage: python manage.py --help
+"""
+import asyncio
+import logging
+import os
+from pathlib import Path
+
+import typer
+from dotenv import load_dotenv
+import migrations
+from archive import Archiver
+from http_cache import CollectionVersions
+import notifications
+from patients import DEFAULT_COUNTRY_CODE, PatientDirectory
+from stats import StatsCounters
+from database import create_client
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+cli = typer.Typer(help="Salud al Paso maintenance commands")
+
+
+@cli.callback()
+def main():
+    """Salud al Paso maintenance commands"""
+
+
+def run(command):
+    """Run an async command against the configured database"""
+    async def main():
+        client = create_client()
+        try:
+            return await command(client[os.environ['DB_NAME']])
+        finally:
+            client.close()
+    return asyncio.run(main())
+
+
+@cli.command("migrate-appointment-dates")
+def migrate_appointment_dates(batch_size: int = typer.Option(1000, min=1)):
+    """Convert appointments stored with ISO string dates to BSON dates"""
+    migrated = run(lambda db: migrations.migrate_appointment_dates(db, batch_size))
+    typer.echo(f"Migrated {migrated} appointments")
+
+
+@cli.command("backfill-slot-start")
+def backfill_slot_start(
+    slot_minutes: int = typer.Option(int(os.environ.get('APPOINTMENT_SLOT_MINUTES', '30')), min=1),
+    batch_size: int = typer.Option(1000, min=1),
+):
+    """Add slot_start to active appointments so the unique slot index covers them"""
+    updated, problems = run(lambda db: migrations.backfill_slot_start(db, slot_minutes, batch_size))
+    typer.echo(f"Backfilled {updated} appointments")
+    for appointment_id, reason in problems:
+        typer.echo(f"Appointment {appointment_id}: {reason}", err=True)
+    if problems:
+        typer.echo(f"{len(problems)} appointments need a new time or cancelling, then run this again", err=True)
+        raise typer.Exit(code=1)
+
+
+@cli.command("backfill-emergency-geo")
+def backfill_emergency_geo(batch_size: int = typer.Option(1000, min=1)):
+    """Add GeoJSON points to emergencies reported before geo indexing"""
+    updated = run(lambda db: migrations.backfill_emergency_geo(db, batch_size))
+    typer.echo(f"Backfilled {updated} emergencies")
+
+
+@cli.command("backfill-updated-at")
+def backfill_updated_at(batch_size: int = typer.Option(1000, min=1)):
+    """Add updated_at to records written before delta sync"""
+    updated = run(lambda db: migrations.backfill_updated_at(db, batch_size))
+    typer.echo(f"Backfilled {updated} records")
+
+
+@cli.command("backfill-phone-keys")
+def backfill_phone_keys(
+    country_code: str = typer.Option(os.environ.get('PATIENT_COUNTRY_CODE', DEFAULT_COUNTRY_CODE)),
+    batch_size: int = typer.Option(1000, min=1),
+):
+    """Add the normalized phone to records written before patient profiles"""
+    updated = run(lambda db: migrations.backfill_phone_keys(db, country_code, batch_size))
+    typer.echo(f"Backfilled {updated} records")
+
+
+@cli.command("requeue-dead-notifications")
+def requeue_dead_notifications():
+    """Retry notifications that exhausted their delivery attempts"""
+    requeued = run(lambda db: notifications.requeue_dead(db.notification_outbox))
+    typer.echo(f"Requeued {requeued} notifications")
+
+
+@cli.command("archive")
+def archive(
+    max_age_days: float = typer.Option(90, min=0),
+    batch_size: int = typer.Option(1000, min=1),
+):
+    """Move resolved emergencies and finished appointments and consultations to the archives"""
+    async def command(db):
+        versions = CollectionVersions(db.collection_versions)
+
+        async def on_archived(collection_name, documents):
+            await versions.bump(collection_name)
+        return await Archiver(db, max_age_days, batch_size, on_archived).archive_once()
+
+    moved = run(command)
+    for collection_name, count in moved.items():
+        typer.echo(f"Archived {count} {collection_name}")
+
+
+@cli.command("rebuild-stats")
+def rebuild_stats():
+    """Recount the dashboard statistics from the records"""
+    buckets = run(lambda db: StatsCounters(db.stats).rebuild(db))
+    typer.echo(f"Rebuilt {buckets} statistics counters")
+
+
+@cli.command("rebuild-patients")
+def rebuild_patients(batch_size: int = typer.Option(1000, min=1)):
+    """Recreate the patient profiles from the records (run backfill-phone-keys first)"""
+    profiles = run(lambda db: PatientDirectory(db.patients).rebuild(db, batch_size))
+    typer.echo(f"Rebuilt {profiles} patient profiles")
+
+
+if __name__ == "__main__":
+    cli()
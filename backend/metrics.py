@@ -0,0 +1,311 @@
+"""Request and MongoDB instrumentation exposed in the Prometheus text format.
+
+Metrics are plain in-process counters, gauges and histograms (no external
+client library). MongoDB callbacks run on driver threads, so every metric
+guards its samples with a lock.
+"""
+import bisect
+import threading
+import time
+from typing import Dict, Sequence, Tuple
+
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield from self._samples()
+
+    def _samples(self):
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def label_sets(self):
+        with self._lock:
+            return list(self._values)
+
+    def _samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_number(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *labels, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # per-bucket counts (last one is +Inf), then sum
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def _samples(self):
+        with self._lock:
+            snapshot = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        names = self.labelnames + ("le",)
+        for labels, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(names, labels + (_format_number(bound),))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_number(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs) -> Counter:
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs) -> Gauge:
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        return self.register(Histogram(*args, **kwargs))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+http_request_duration = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route", "status"))
+http_request_size = REGISTRY.histogram(
+    "http_request_size_bytes", "HTTP request body size", ("method", "route"), buckets=SIZE_BUCKETS)
+http_response_size = REGISTRY.histogram(
+    "http_response_size_bytes", "HTTP response body size", ("method", "route"), buckets=SIZE_BUCKETS)
+mongodb_command_duration = REGISTRY.histogram(
+    "mongodb_command_duration_seconds", "MongoDB command latency", ("collection", "command"))
+mongodb_documents = REGISTRY.counter(
+    "mongodb_documents_total", "Documents returned or written by MongoDB commands", ("collection", "command"))
+mongodb_command_failures = REGISTRY.counter(
+    "mongodb_command_failures_total", "Failed MongoDB commands", ("collection", "command"))
+mongodb_pool_connections = REGISTRY.gauge(
+    "mongodb_pool_connections", "Open connections in the MongoDB pool", ("address",))
+mongodb_pool_checked_out = REGISTRY.gauge(
+    "mongodb_pool_checked_out", "Connections currently checked out of the MongoDB pool", ("address",))
+notifications = REGISTRY.counter(
+    "notifications_total", "Notification delivery outcomes (sent, retry, dead)", ("channel", "result"))
+notification_delay = REGISTRY.histogram(
+    "notification_delay_seconds", "Time from enqueueing a notification to its delivery", ("channel",),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0))
+coalesced_requests = REGISTRY.counter(
+    "coalesced_requests_total", "Coalesced reads by outcome (miss, shared, cached)", ("cache", "result"))
+rate_limited_requests = REGISTRY.counter(
+    "rate_limited_requests_total", "Requests refused by the rate limiter", ("route",))
+appointment_reminders = REGISTRY.counter(
+    "appointment_reminders_total", "Appointment reminders due, by outcome (sent, skipped, taken)", ("result",))
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and body sizes per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+        request_size = 0
+        response_size = 0
+
+        async def receive_wrapper():
+            nonlocal request_size
+            message = await receive()
+            if message["type"] == "http.request":
+                request_size += len(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message):
+            nonlocal status, response_size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # Route templates keep label cardinality bounded
+            path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            http_request_duration.observe(time.perf_counter() - started, method, path, status)
+            http_request_size.observe(request_size, method, path)
+            http_response_size.observe(response_size, method, path)
+
+
+# Commands whose first value names the collection they act on
+_COLLECTION_COMMANDS = {"find", "insert", "update", "delete", "aggregate", "count", "distinct", "findAndModify", "createIndexes"}
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Per-collection, per-command MongoDB timings"""
+
+    def __init__(self):
+        self._pending: Dict[Tuple, Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if event.command_name in _COLLECTION_COMMANDS:
+            collection = event.command.get(event.command_name)
+        elif event.command_name == "getMore":
+            collection = event.command.get("collection")
+        else:
+            collection = "-"
+        with self._lock:
+            self._pending[(event.request_id, event.connection_id)] = (str(collection), event.command_name)
+
+    def _finish(self, event):
+        with self._lock:
+            return self._pending.pop((event.request_id, event.connection_id), ("-", event.command_name))
+
+    def succeeded(self, event):
+        collection, command = self._finish(event)
+        mongodb_command_duration.observe(event.duration_micros / 1_000_000, collection, command)
+        reply = event.reply
+        cursor = reply.get("cursor")
+        if cursor:
+            documents = len(cursor.get("firstBatch", cursor.get("nextBatch", ())))
+        else:
+            documents = reply.get("n", 0)
+        if documents:
+            mongodb_documents.inc(collection, command, amount=documents)
+
+    def failed(self, event):
+        collection, command = self._finish(event)
+        mongodb_command_duration.observe(event.duration_micros / 1_000_000, collection, command)
+        mongodb_command_failures.inc(collection, command)
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool occupancy per server address"""
+
+    @staticmethod
+    def _address(event) -> str:
+        host, port = event.address
+        return f"{host}:{port}"
+
+    def pool_created(self, event):
+        mongodb_pool_connections.set(self._address(event), value=0)
+        mongodb_pool_checked_out.set(self._address(event), value=0)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        mongodb_pool_connections.inc(self._address(event))
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        mongodb_pool_connections.dec(self._address(event))
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        pass
+
+    def connection_checked_out(self, event):
+        mongodb_pool_checked_out.inc(self._address(event))
+
+    def connection_checked_in(self, event):
+        mongodb_pool_checked_out.dec(self._address(event))
+
+
+def pool_stats() -> dict:
+    """Current pool occupancy per server address"""
+    return {
+        address: {
+            "connections": mongodb_pool_connections.value(address),
+            "checked_out": mongodb_pool_checked_out.value(address),
+        }
+        for (address,) in mongodb_pool_connections.label_sets()
+    }
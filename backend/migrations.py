@@ -0,0 +1,211 @@
+"""Online data migrations for the Salud al Paso collections.
+
+Migrations work in batches and guard every write on the value that was read,
+so they can run while the API keeps serving traffic.
+"""
+import logging
+from datetime import datetime
+from typing import List, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from archive import archive_collection
+from availability import INACTIVE_STATUSES, parse_slot
+from geo import to_geojson_point
+from patients import DEFAULT_COUNTRY_CODE, PATIENT_SOURCES, PHONE_KEY, normalize_phone
+
+logger = logging.getLogger(__name__)
+
+
+async def migrate_appointment_dates(db, batch_size: int = 1000) -> int:
+    """Rewrite appointment_date and created_at stored as ISO strings into BSON dates.
+
+    Returns the number of documents rewritten.
+    """
+    query = {"$or": [
+        {"appointment_date": {"$type": "string"}},
+        {"created_at": {"$type": "string"}},
+    ]}
+    projection = {"_id": 1, "appointment_date": 1, "created_at": 1}
+    migrated = 0
+    while True:
+        documents = await db.appointments.find(query, projection).limit(batch_size).to_list(batch_size)
+        if not documents:
+            break
+
+        operations = []
+        for document in documents:
+            guard = {"_id": document["_id"]}
+            changes = {}
+            for field in ("appointment_date", "created_at"):
+                value = document.get(field)
+                if isinstance(value, str):
+                    guard[field] = value
+                    changes[field] = datetime.fromisoformat(value)
+            operations.append(UpdateOne(guard, {"$set": changes}))
+
+        result = await db.appointments.bulk_write(operations, ordered=False)
+        migrated += result.modified_count
+        logger.info(f"Migrated {migrated} appointments to BSON dates")
+        if len(documents) < batch_size:
+            break
+    return migrated
+
+
+async def backfill_emergency_geo(db, batch_size: int = 1000) -> int:
+    """Add the GeoJSON geo field to emergencies stored before it existed.
+
+    Reports without valid coordinates are skipped. Returns the number of
+    documents updated.
+    """
+    query = {"geo": {"$exists": False}}
+    projection = {"_id": 1, "location": 1}
+    last_id = None
+    updated = 0
+    while True:
+        batch_query = {**query, "_id": {"$gt": last_id}} if last_id else query
+        documents = await db.emergencies.find(batch_query, projection).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not documents:
+            break
+        last_id = documents[-1]["_id"]
+
+        operations = []
+        for document in documents:
+            point = to_geojson_point(document.get("location"))
+            if point:
+                operations.append(UpdateOne({"_id": document["_id"], "geo": {"$exists": False}}, {"$set": {"geo": point}}))
+        if operations:
+            result = await db.emergencies.bulk_write(operations, ordered=False)
+            updated += result.modified_count
+        logger.info(f"Backfilled geo on {updated} emergencies")
+        if len(documents) < batch_size:
+            break
+    return updated
+
+
+# Field whose value stands in for updated_at on records written before it existed
+UPDATED_AT_SOURCES = {
+    "appointments": "created_at",
+    "consultations": "consultation_date",
+    "emergencies": "timestamp",
+}
+
+
+async def backfill_updated_at(db, batch_size: int = 1000) -> int:
+    """Stamp records written before delta sync with updated_at.
+
+    The creation time is used when it is a BSON date, otherwise the time of
+    the migration. Returns the number of documents updated.
+    """
+    updated = 0
+    for collection_name, source in UPDATED_AT_SOURCES.items():
+        collection = db[collection_name]
+        query = {"updated_at": {"$exists": False}}
+        last_id = None
+        while True:
+            batch_query = {**query, "_id": {"$gt": last_id}} if last_id else query
+            documents = await collection.find(batch_query, {"_id": 1, source: 1}).sort("_id", 1).limit(batch_size).to_list(batch_size)
+            if not documents:
+                break
+            last_id = documents[-1]["_id"]
+
+            now = datetime.utcnow()
+            operations = [
+                UpdateOne(
+                    {"_id": document["_id"], "updated_at": {"$exists": False}},
+                    {"$set": {"updated_at": document[source] if isinstance(document.get(source), datetime) else now}},
+                )
+                for document in documents
+            ]
+            result = await collection.bulk_write(operations, ordered=False)
+            updated += result.modified_count
+            logger.info(f"Backfilled updated_at on {updated} records")
+            if len(documents) < batch_size:
+                break
+    return updated
+
+
+async def backfill_phone_keys(db, country_code: str = DEFAULT_COUNTRY_CODE, batch_size: int = 1000) -> int:
+    """Add phone_e164, the normalized phone, to records written before patient profiles.
+
+    Archived records are included. Returns the number of documents updated.
+    """
+    updated = 0
+    for collection_name, (phone_field, _, _) in PATIENT_SOURCES.items():
+        for source in (collection_name, archive_collection(collection_name)):
+            collection = db[source]
+            query = {PHONE_KEY: {"$exists": False}}
+            last_id = None
+            while True:
+                batch_query = {**query, "_id": {"$gt": last_id}} if last_id else query
+                documents = await collection.find(batch_query, {"_id": 1, phone_field: 1}).sort("_id", 1).limit(batch_size).to_list(batch_size)
+                if not documents:
+                    break
+                last_id = documents[-1]["_id"]
+
+                operations = [
+                    UpdateOne(
+                        {"_id": document["_id"], phone_field: document.get(phone_field), PHONE_KEY: {"$exists": False}},
+                        {"$set": {PHONE_KEY: normalize_phone(document.get(phone_field), country_code)}},
+                    )
+                    for document in documents
+                ]
+                result = await collection.bulk_write(operations, ordered=False)
+                updated += result.modified_count
+                logger.info(f"Backfilled phone_e164 on {updated} records")
+                if len(documents) < batch_size:
+                    break
+    return updated
+
+
+async def backfill_slot_start(db, slot_minutes: int, batch_size: int = 1000) -> Tuple[int, List[Tuple[str, str]]]:
+    """Add slot_start to active appointments booked before the unique slot index.
+
+    Only appointments with a numeric slot_start are covered by that index, so
+    until this runs a booking into a legacy slot is checked against the
+    workers' slot caches alone. Appointments whose time cannot be read, is
+    off the slot grid or whose slot is already held are left without
+    slot_start and returned as (id, reason) for a person to fix. Returns the
+    number of documents updated and those problems.
+    """
+    query = {"slot_start": {"$not": {"$type": "number"}}, "status": {"$nin": list(INACTIVE_STATUSES)}}
+    projection = {"_id": 1, "id": 1, "appointment_time": 1, "status": 1}
+    last_id = None
+    updated = 0
+    problems = []
+    while True:
+        batch_query = {**query, "_id": {"$gt": last_id}} if last_id else query
+        documents = await db.appointments.find(batch_query, projection).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not documents:
+            break
+        last_id = documents[-1]["_id"]
+
+        operations, planned = [], []
+        for document in documents:
+            try:
+                start = parse_slot(document.get("appointment_time"), slot_minutes)
+            except ValueError as e:
+                problems.append((document.get("id"), f"{e}, got {document.get('appointment_time')!r}"))
+                continue
+            operations.append(UpdateOne(
+                {"_id": document["_id"], "appointment_time": document.get("appointment_time"),
+                 "status": document.get("status"), "slot_start": {"$not": {"$type": "number"}}},
+                {"$set": {"slot_start": start}},
+            ))
+            planned.append(document)
+        if operations:
+            try:
+                result = await db.appointments.bulk_write(operations, ordered=False)
+                updated += result.modified_count
+            except BulkWriteError as e:
+                updated += e.details.get("nModified", 0)
+                for error in e.details.get("writeErrors", []):
+                    document = planned[error["index"]]
+                    if error.get("code") != 11000:
+                        raise
+                    problems.append((document.get("id"), f"slot {document.get('appointment_time')} is already held by another appointment"))
+        logger.info(f"Backfilled slot_start on {updated} appointments, {len(problems)} need attention")
+        if len(documents) < batch_size:
+            break
+    return updated, problems
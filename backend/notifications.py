@@ -0,0 +1,271 @@
+"""Durable notification outbox drained by a background worker pool.
+
+Request handlers only write outbox documents; delivery happens here, off
+the request path. Each worker claims a batch of due messages, hands it to
+the configured sender and records the outcome:
+
+    pending -> sending -> sent
+                       -> pending (retry after exponential backoff with jitter)
+                       -> dead    (after max_attempts; kept for inspection)
+
+A claim is a lease: messages left in "sending" by a crashed worker become
+due again when the lease expires, so delivery is at-least-once. Senders
+should make deliveries idempotent on the message id where the provider
+allows it.
+"""
+import asyncio
+import importlib
+import logging
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence, Tuple
+
+from pymongo import UpdateOne
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+PENDING, SENDING, SENT, DEAD = "pending", "sending", "sent", "dead"
+
+
+def parse_recipients(value: str) -> List[Tuple[str, str]]:
+    """"sms:+50588887777,push:dispatch" -> [("sms", "+50588887777"), ("push", "dispatch")]"""
+    recipients = []
+    for part in value.split(","):
+        if part.strip():
+            channel, _, address = part.strip().partition(":")
+            if not address:
+                raise ValueError(f"Notification recipient must be channel:address, got {part!r}")
+            recipients.append((channel, address))
+    return recipients
+
+
+def outbox_messages(event: str, payload: dict, recipients: Sequence[Tuple[str, str]]) -> List[dict]:
+    """One outbox document per recipient for an event"""
+    now = datetime.utcnow()
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "event": event,
+            "channel": channel,
+            "recipient": address,
+            "payload": payload,
+            "status": PENDING,
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+        }
+        for channel, address in recipients
+    ]
+
+
+def supports_transactions(client) -> bool:
+    topology = getattr(client, "topology_description", None)
+    return getattr(topology, "topology_type_name", None) in ("ReplicaSetWithPrimary", "Sharded")
+
+
+async def insert_with_outbox(client, collection, document: dict, outbox: "NotificationOutbox", messages: List[dict]):
+    """Insert a document together with its outbox messages.
+
+    On replica sets and sharded clusters both writes commit in one
+    transaction. A standalone server has no transactions, so the document is
+    written first and the messages right after it.
+    """
+    if messages and supports_transactions(client):
+        async with await client.start_session() as session:
+            async with session.start_transaction():
+                await collection.insert_one(document, session=session)
+                await outbox.collection.insert_many(messages, session=session)
+        outbox.wake()
+        return
+    await collection.insert_one(document)
+    if messages:
+        await outbox.enqueue(messages)
+
+
+def describe(message: dict) -> str:
+    """Human readable text of a notification"""
+    payload = message["payload"]
+    if message.get("event") == "appointment_reminder":
+        return (
+            f"APPOINTMENT REMINDER: {payload.get('patient_name')}, {payload.get('specialty')} with "
+            f"{payload.get('doctor_name')} on {payload.get('appointment_date')} at {payload.get('appointment_time')}"
+        )
+    return (
+        f"EMERGENCY ALERT: {payload.get('emergency_type')} reported by {payload.get('patient_name')} "
+        f"at {payload.get('location')}"
+    )
+
+
+class NotificationSender:
+    """Delivers notifications. Subclasses implement send()."""
+
+    async def send(self, messages: List[dict]) -> List[Optional[str]]:
+        """Deliver a batch; return one entry per message: None if delivered, else the error"""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class FakeSender(NotificationSender):
+    """Local stand-in that logs each notification and keeps what it delivered.
+
+    fail_rate makes a share of deliveries fail, to exercise retries.
+    """
+
+    def __init__(self, fail_rate: float = 0.0, delay: float = 0.0):
+        self.fail_rate = fail_rate
+        self.delay = delay
+        self.sent: List[dict] = []
+
+    async def send(self, messages: List[dict]) -> List[Optional[str]]:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        results = []
+        for message in messages:
+            if random.random() < self.fail_rate:
+                results.append("simulated delivery failure")
+                continue
+            logger.info(f"{message['channel']} -> {message['recipient']}: {describe(message)}")
+            self.sent.append(message)
+            results.append(None)
+        return results
+
+
+async def requeue_dead(collection) -> int:
+    """Return dead-lettered messages to the queue with a fresh retry budget"""
+    result = await collection.update_many(
+        {"status": DEAD},
+        {"$set": {"status": PENDING, "attempts": 0, "next_attempt_at": datetime.utcnow()}},
+    )
+    return result.modified_count
+
+
+def load_sender(spec: str) -> NotificationSender:
+    """"fake" for FakeSender, or "package.module:ClassName" for a custom sender"""
+    if spec == "fake":
+        return FakeSender()
+    module_name, _, class_name = spec.partition(":")
+    if not class_name:
+        raise ValueError(f"NOTIFICATION_SENDER must be 'fake' or 'module:Class', got {spec!r}")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+class NotificationOutbox:
+    def __init__(
+        self,
+        collection,
+        sender: NotificationSender,
+        workers: int = 4,
+        batch_size: int = 50,
+        max_attempts: int = 8,
+        retry_base: float = 2.0,
+        retry_max: float = 600.0,
+        lease_seconds: float = 60.0,
+        poll_interval: float = 5.0,
+    ):
+        self.collection = collection
+        self.sender = sender
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._wake = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    async def enqueue(self, messages: List[dict], session=None):
+        await self.collection.insert_many(messages, session=session)
+        self.wake()
+
+    def wake(self):
+        """Let idle workers pick up new messages without waiting for the next poll"""
+        self._wake.set()
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker(n)) for n in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.sender.close()
+
+    def retry_delay(self, attempts: int) -> float:
+        """Exponential backoff, jittered between half and all of the delay"""
+        delay = min(self.retry_max, self.retry_base * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def claim(self) -> Tuple[str, List[dict]]:
+        """Lease up to batch_size due messages to this worker"""
+        now = datetime.utcnow()
+        due = {"status": {"$in": [PENDING, SENDING]}, "next_attempt_at": {"$lte": now}}
+        candidates = await self.collection.find(due, {"_id": 0, "id": 1}).sort(
+            "next_attempt_at", 1).limit(self.batch_size).to_list(None)
+        if not candidates:
+            return "", []
+        claim = str(uuid.uuid4())
+        # Re-checking "due" per document makes the claim atomic against other workers
+        await self.collection.update_many(
+            {"id": {"$in": [c["id"] for c in candidates]}, **due},
+            {"$set": {"status": SENDING, "claim": claim,
+                      "next_attempt_at": now + timedelta(seconds=self.lease_seconds)}},
+        )
+        batch = await self.collection.find({"claim": claim, "status": SENDING}, {"_id": 0}).to_list(None)
+        return claim, batch
+
+    async def complete(self, claim: str, batch: List[dict], errors: List[Optional[str]]):
+        now = datetime.utcnow()
+        operations = []
+        for message, error in zip(batch, errors):
+            attempts = message.get("attempts", 0) + 1
+            if error is None:
+                update = {"status": SENT, "sent_at": now, "attempts": attempts}
+                metrics.notifications.inc(message["channel"], SENT)
+                metrics.notification_delay.observe((now - message["created_at"]).total_seconds(), message["channel"])
+            elif attempts >= self.max_attempts:
+                update = {"status": DEAD, "attempts": attempts, "last_error": error, "failed_at": now}
+                metrics.notifications.inc(message["channel"], DEAD)
+                logger.error(f"Notification {message['id']} dead-lettered after {attempts} attempts: {error}")
+            else:
+                update = {"status": PENDING, "attempts": attempts, "last_error": error,
+                          "next_attempt_at": now + timedelta(seconds=self.retry_delay(attempts))}
+                metrics.notifications.inc(message["channel"], "retry")
+            # The claim guard skips messages whose lease expired and were taken by another worker
+            operations.append(UpdateOne({"id": message["id"], "claim": claim}, {"$set": update}))
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+
+    async def drain_once(self) -> int:
+        """Claim and deliver one batch; return the number of messages handled"""
+        claim, batch = await self.claim()
+        if not batch:
+            return 0
+        try:
+            errors = await self.sender.send(batch)
+        except Exception as e:
+            errors = [f"{type(e).__name__}: {e}"] * len(batch)
+        await self.complete(claim, batch, errors)
+        return len(batch)
+
+    async def _worker(self, number: int):
+        while True:
+            try:
+                if await self.drain_once():
+                    continue
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Notification worker {number} failed, retrying in {self.poll_interval}s: {e}")
+                await asyncio.sleep(self.poll_interval)
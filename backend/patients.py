@@ -0,0 +1,165 @@
+"""Patient profiles keyed by phone number, and their history across collections.
+
+Appointments, consultations and emergencies carry the patient's phone as
+typed, so "8888-7777", "+505 8888 7777" and "50588887777" are one person.
+Every record also stores phone_e164, the number normalized to E.164, and
+the patients collection holds one profile per normalized number, upserted
+when records are created.
+
+A patient's history is one aggregation: the appointments of the number,
+then consultations and emergencies added with $unionWith. Each branch reads
+at most one page from its (phone_e164, date, id) index before the branches
+are merged, so a page costs the same with millions of records.
+"""
+import re
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from archive import archive_collection
+
+DEFAULT_COUNTRY_CODE = "505"
+PHONE_KEY = "phone_e164"
+
+# Record collection -> (phone field, date field, history entry type)
+PATIENT_SOURCES: Dict[str, Tuple[str, str, str]] = {
+    "appointments": ("patient_phone", "appointment_date", "appointment"),
+    "consultations": ("patient_phone", "consultation_date", "consultation"),
+    "emergencies": ("phone", "timestamp", "emergency"),
+}
+
+# National significant numbers of the default country (Nicaragua: 8 digits)
+NATIONAL_NUMBER_LENGTH = 8
+
+
+def normalize_phone(value: Optional[str], country_code: str = DEFAULT_COUNTRY_CODE) -> Optional[str]:
+    """E.164 form of a phone number ("8888-7777" -> "+50588887777"), or None when it is not one.
+
+    Numbers without a country code are taken as national numbers of country_code.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    international = value.startswith("+") or value.startswith("00")
+    digits = re.sub(r"\D", "", value)
+    if value.startswith("00"):
+        digits = digits[2:]
+    if not international and len(digits) == NATIONAL_NUMBER_LENGTH:
+        digits = country_code + digits
+    if not 8 <= len(digits) <= 15 or digits.startswith("0"):
+        return None
+    return "+" + digits
+
+
+def with_phone_key(collection_name: str, record: dict, country_code: str = DEFAULT_COUNTRY_CODE) -> dict:
+    """Set phone_e164 on a record, or on a set of changes that touch its phone"""
+    phone_field, _, _ = PATIENT_SOURCES[collection_name]
+    if phone_field in record:
+        record[PHONE_KEY] = normalize_phone(record[phone_field], country_code)
+    return record
+
+
+class PatientDirectory:
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def record(self, collection_name: str, records: Iterable[dict]):
+        """Upsert the profiles of the patients of newly created records, one write per phone"""
+        profiles = defaultdict(lambda: {"names": [], "count": 0, "seen": []})
+        for record in records:
+            phone = record.get(PHONE_KEY)
+            if not phone:
+                continue
+            profile = profiles[phone]
+            name = record.get("patient_name")
+            if name and name not in profile["names"]:
+                profile["names"].append(name)
+            profile["count"] += 1
+            # Records are stamped with updated_at when they are created
+            profile["seen"].append(record.get("updated_at") or datetime.utcnow())
+
+        operations = []
+        for phone, profile in profiles.items():
+            update = {
+                "$addToSet": {"names": {"$each": profile["names"]}},
+                "$inc": {f"records.{collection_name}": profile["count"]},
+                "$min": {"first_seen": min(profile["seen"])},
+                "$max": {"last_seen": max(profile["seen"])},
+            }
+            if profile["names"]:
+                update["$set"] = {"patient_name": profile["names"][-1]}
+            operations.append(UpdateOne({"phone": phone}, update, upsert=True))
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+
+    async def get(self, phone: str) -> Optional[dict]:
+        return await self.collection.find_one({"phone": phone}, {"_id": 0})
+
+    async def rebuild(self, db, batch_size: int = 1000) -> int:
+        """Recreate every profile from the records, archived ones included.
+
+        Records created while the rebuild runs may be counted twice or not at
+        all; run it when traffic is low. Returns the number of profiles.
+        """
+        await self.collection.delete_many({})
+        projection = {"_id": 0, PHONE_KEY: 1, "patient_name": 1, "updated_at": 1}
+        for collection_name in PATIENT_SOURCES:
+            for source in (collection_name, archive_collection(collection_name)):
+                cursor = db[source].find({PHONE_KEY: {"$ne": None}}, projection).sort("updated_at", 1)
+                batch = []
+                async for record in cursor.batch_size(batch_size):
+                    batch.append(record)
+                    if len(batch) == batch_size:
+                        await self.record(collection_name, batch)
+                        batch = []
+                if batch:
+                    await self.record(collection_name, batch)
+        return await self.collection.count_documents({})
+
+
+def _history_branch(collection_name: str, phone: str, limit: int, after: Optional[Tuple[datetime, str]],
+                    projection: dict) -> List[dict]:
+    _, date_field, entry_type = PATIENT_SOURCES[collection_name]
+    match = {PHONE_KEY: phone}
+    if after:
+        last_value, last_id = after
+        match["$or"] = [
+            {date_field: {"$lt": last_value}},
+            {date_field: last_value, "id": {"$lt": last_id}},
+        ]
+    return [
+        {"$match": match},
+        {"$sort": {date_field: -1, "id": -1}},
+        {"$limit": limit},
+        {"$project": {
+            "_id": 0,
+            "type": {"$literal": entry_type},
+            "at": f"${date_field}",
+            "id": 1,
+            "record": {field: f"${field}" for field in projection if field != "_id"},
+        }},
+    ]
+
+
+def history_pipeline(phone: str, limit: int, after: Optional[Tuple[datetime, str]],
+                     projections: Dict[str, dict], sources: Dict[str, List[str]]) -> List[dict]:
+    """Aggregation on the first source collection returning up to limit entries
+    {type, at, id, record} of a phone, newest first, after an (at, id) keyset.
+
+    sources maps each record collection to the collections it is read from
+    (e.g. the collection and its archive); projections gives its fields.
+    """
+    branches = [
+        (collection, _history_branch(name, phone, limit, after, projections[name]))
+        for name, collections in sources.items()
+        for collection in collections
+    ]
+    (_, pipeline), others = branches[0], branches[1:]
+    pipeline = list(pipeline)
+    for collection, branch in others:
+        pipeline.append({"$unionWith": {"coll": collection, "pipeline": branch}})
+    pipeline.append({"$sort": {"at": -1, "id": -1}})
+    pipeline.append({"$limit": limit})
+    return pipeline
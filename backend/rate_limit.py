@@ -0,0 +1,43 @@
+"""In-process token-bucket rate limiting.
+
+Each key (a client address) owns a bucket holding
+up to burst tokens, refilled at rate tokens per second; a request takes one
+token or is refused until the next token arrives. Buckets live in this
+process, so with N workers a client gets up to N times the rate. The least
+recently used buckets are dropped beyond max_keys; a dropped bucket comes
+back full, which only ever favours the client, so keys must not be chosen
+by the client.
+"""
+import math
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+class RateLimiter:
+    def __init__(self, rate: float, burst: float, max_keys: int = 100_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        # key -> (tokens, last refill)
+        self._buckets: OrderedDict[str, Tuple[float, float]] = OrderedDict()
+
+    def acquire(self, key: str, now: Optional[float] = None) -> float:
+        """Take a token for key. Returns 0 when allowed, else the seconds until a token is available."""
+        now = time.monotonic() if now is None else now
+        tokens, updated = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+def retry_after(wait: float) -> str:
+    """Retry-After header value (whole seconds, at least 1)"""
+    return str(max(1, math.ceil(wait)))
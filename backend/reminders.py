@@ -0,0 +1,316 @@
+"""Appointment reminders: a timer heap of upcoming appointments and leases.
+
+Every active appointment gets one reminder per lead time (REMINDER_LEAD_MINUTES)
+before it starts. Each worker keeps a heap of (fire_at, appointment) entries,
+loaded from MongoDB on startup and reloaded periodically, and updated
+directly by this worker's creates, updates and deletes. Like the triage
+queue, superseded entries stay in the heap and are skipped when they come
+up: an entry is current only while the appointment still starts at the
+time it was scheduled for.
+
+All workers hold the same reminders, so firing one takes a lease in the
+reminder_leases collection first. Only the worker holding the lease reads
+the appointment again, hands the reminder to on_due and marks it fired;
+the others drop it, or retry once the lease expires if its holder died
+before firing. Reminders are therefore sent at least once: a worker that
+dies between on_due and marking the reminder fired has it sent again.
+
+Appointment dates and times are wall clock times in the clinic's time zone;
+fire times are naive UTC like every other stored timestamp.
+"""
+import asyncio
+import heapq
+import logging
+import uuid
+from datetime import datetime, time, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+from pymongo.errors import DuplicateKeyError
+
+import metrics
+from availability import INACTIVE_STATUSES, as_day, parse_time
+
+logger = logging.getLogger(__name__)
+
+# Longest wait between checks, so a clock jump is noticed
+MAX_SLEEP_SECONDS = 60
+
+# Appointments that get no reminders
+FINISHED_STATUSES = INACTIVE_STATUSES + ("completed",)
+
+
+def parse_lead_minutes(value: str) -> List[int]:
+    """"1440,120" -> [1440, 120], longest lead first"""
+    leads = set()
+    for part in value.split(","):
+        if part.strip():
+            try:
+                lead = int(part)
+            except ValueError:
+                raise ValueError(f"Reminder lead must be a number of minutes, got {part!r}")
+            if lead <= 0:
+                raise ValueError(f"Reminder lead must be positive, got {part!r}")
+            leads.add(lead)
+    return sorted(leads, reverse=True)
+
+
+def lease_id(appointment_id: str, start: datetime, lead: int) -> str:
+    """A rescheduled appointment gets new reminders, so the start is part of the key"""
+    return f"{appointment_id}:{start.isoformat()}:{lead}"
+
+
+class ReminderScheduler:
+    def __init__(
+        self,
+        appointments,
+        leases,
+        on_due: Callable[[dict, int], Awaitable],
+        lead_minutes: Sequence[int],
+        time_zone: str = "UTC",
+        reload_seconds: float = 300.0,
+        lease_seconds: float = 60.0,
+    ):
+        self.appointments = appointments
+        self.leases = leases
+        self.on_due = on_due
+        self.lead_minutes = sorted(lead_minutes, reverse=True)
+        self.time_zone = ZoneInfo(time_zone)
+        self.reload_seconds = reload_seconds
+        self.lease_seconds = lease_seconds
+        self.owner = str(uuid.uuid4())
+        # Heap of (fire_at, appointment id, lead, start); an entry is current only while scheduled[id] == start
+        self._heap: List[Tuple[datetime, str, int, datetime]] = []
+        self._scheduled: Dict[str, datetime] = {}
+        # While a reload reads MongoDB: changes made meanwhile, id -> start or None (removed)
+        self._changes: Optional[Dict[str, Optional[datetime]]] = None
+        self._wake = asyncio.Event()
+
+    def __len__(self):
+        return len(self._scheduled)
+
+    def start_time(self, appointment: dict) -> Optional[datetime]:
+        """When an active appointment starts, in naive UTC, or None"""
+        if appointment.get("status") in FINISHED_STATUSES:
+            return None
+        day = as_day(appointment.get("appointment_date"))
+        try:
+            minutes = parse_time(appointment.get("appointment_time"))
+        except ValueError:
+            return None
+        if day is None:
+            return None
+        local = datetime.combine(day, time(minutes // 60, minutes % 60), tzinfo=self.time_zone)
+        return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+    def _reminders(self, appointment: dict, start: datetime) -> List[Tuple[datetime, int]]:
+        # Leads that had already passed when the appointment was booked are not sent
+        booked = appointment.get("created_at")
+        return [
+            (start - timedelta(minutes=lead), lead)
+            for lead in self.lead_minutes
+            if not isinstance(booked, datetime) or start - timedelta(minutes=lead) > booked
+        ]
+
+    def update(self, appointment: dict):
+        """Schedule the reminders of a created or changed appointment, replacing its earlier ones.
+
+        Needs id and status; an active appointment also needs appointment_date
+        and appointment_time, without them its reminders are left as they are.
+        """
+        if not self.lead_minutes:
+            return
+        appointment_id = appointment["id"]
+        if appointment.get("status") in FINISHED_STATUSES:
+            self.remove(appointment_id)
+            return
+        if "appointment_time" not in appointment or "appointment_date" not in appointment:
+            return
+        start = self.start_time(appointment)
+        if start is None or start <= datetime.utcnow():
+            self.remove(appointment_id)
+            return
+        reminders = self._reminders(appointment, start)
+        if not reminders:
+            self.remove(appointment_id)
+            return
+        if self._changes is not None:
+            self._changes[appointment_id] = start
+        if self._scheduled.get(appointment_id) == start:
+            return
+        self._scheduled[appointment_id] = start
+        earliest = self._heap[0][0] if self._heap else None
+        for fire_at, lead in reminders:
+            heapq.heappush(self._heap, (fire_at, appointment_id, lead, start))
+        if self._heap and self._heap[0][0] != earliest:
+            self._wake.set()
+        self._compact()
+
+    def remove(self, appointment_id: str):
+        if self._changes is not None:
+            self._changes[appointment_id] = None
+        self._scheduled.pop(appointment_id, None)
+
+    def _compact(self):
+        # Stale entries are skipped lazily; rebuild once they outnumber the live ones
+        if len(self._heap) > 2 * len(self._scheduled) * max(len(self.lead_minutes), 1) + 64:
+            self._heap = [entry for entry in self._heap if self._scheduled.get(entry[1]) == entry[3]]
+            heapq.heapify(self._heap)
+
+    def next_due(self) -> Optional[datetime]:
+        while self._heap:
+            fire_at, appointment_id, _, start = self._heap[0]
+            if self._scheduled.get(appointment_id) == start:
+                return fire_at
+            heapq.heappop(self._heap)
+        return None
+
+    def _superseded(self, lead: int, start: datetime, now: datetime) -> bool:
+        # After downtime several reminders of one appointment can be due; only the shortest lead is sent
+        shorter = [other for other in self.lead_minutes if other < lead]
+        return bool(shorter) and start - timedelta(minutes=max(shorter)) <= now
+
+    async def reload(self) -> int:
+        """Load the appointments starting within the reload horizon from MongoDB"""
+        now = datetime.utcnow()
+        query = {"status": {"$nin": list(FINISHED_STATUSES)}}
+        # appointment_date is the local day at midnight UTC: one day of margin covers any time zone
+        query["appointment_date"] = {"$gte": datetime.combine(now.date() - timedelta(days=1), time.min)}
+        if self.reload_seconds > 0:
+            horizon = now + timedelta(minutes=max(self.lead_minutes), seconds=2 * self.reload_seconds)
+            query["appointment_date"]["$lte"] = datetime.combine(horizon.date() + timedelta(days=1), time.min)
+        projection = {"_id": 0, "id": 1, "status": 1, "appointment_date": 1, "appointment_time": 1, "created_at": 1}
+
+        heap = []
+        self._changes = {}
+        try:
+            async for appointment in self.appointments.find(query, projection):
+                start = self.start_time(appointment)
+                if start is not None and start > now:
+                    heap.extend(
+                        (fire_at, appointment["id"], lead, start) for fire_at, lead in self._reminders(appointment, start)
+                    )
+            # Reminders already due have mostly been fired: look their leases up at once
+            due = [lease_id(appointment_id, start, lead) for fire_at, appointment_id, lead, start in heap if fire_at <= now]
+            if due:
+                fired = {
+                    lease["_id"]
+                    async for lease in self.leases.find({"_id": {"$in": due}, "fired_at": {"$ne": None}}, {"_id": 1})
+                }
+                heap = [entry for entry in heap if lease_id(entry[1], entry[3], entry[2]) not in fired]
+            # This worker's own changes during the read win over what it read
+            changes = self._changes
+        finally:
+            self._changes = None
+        scheduled = {appointment_id: start for _, appointment_id, _, start in heap}
+        for appointment_id, start in changes.items():
+            if start is None:
+                scheduled.pop(appointment_id, None)
+            elif scheduled.get(appointment_id) != start:
+                scheduled[appointment_id] = start
+                heap.extend(entry for entry in self._heap if entry[1] == appointment_id and entry[3] == start)
+        heapq.heapify(heap)
+        self._scheduled = scheduled
+        self._heap = heap
+        self._wake.set()
+        return len(scheduled)
+
+    async def _acquire(self, appointment_id: str, start: datetime, lead: int, now: datetime) -> Optional[datetime]:
+        """Take the lease of a reminder. Returns None when taken, else when to try again (datetime.max: fired)."""
+        key = lease_id(appointment_id, start, lead)
+        try:
+            await self.leases.update_one(
+                {"_id": key, "fired_at": None, "lease_until": {"$lte": now}},
+                {"$set": {
+                    "appointment_id": appointment_id,
+                    "appointment_start": start,
+                    "lead_minutes": lead,
+                    "owner": self.owner,
+                    "lease_until": now + timedelta(seconds=self.lease_seconds),
+                }},
+                upsert=True,
+            )
+            return None
+        except DuplicateKeyError:
+            # Fired, or leased by another worker
+            lease = await self.leases.find_one({"_id": key}, {"fired_at": 1, "lease_until": 1})
+            if lease is None:
+                return now
+            return datetime.max if lease.get("fired_at") else lease["lease_until"]
+
+    async def _fire(self, appointment_id: str, lead: int, start: datetime, now: datetime) -> bool:
+        """Fire one reminder unless another worker does; False when it was put back to retry"""
+        try:
+            retry_at = await self._acquire(appointment_id, start, lead, now)
+            if retry_at is not None:
+                metrics.appointment_reminders.inc("taken")
+                if retry_at != datetime.max and self._scheduled.get(appointment_id) == start:
+                    heapq.heappush(self._heap, (retry_at, appointment_id, lead, start))
+                    return False
+                return True
+
+            # Another worker may have cancelled or rescheduled it since this one loaded it
+            appointment = await self.appointments.find_one({"id": appointment_id}, {"_id": 0})
+            if appointment is None or self.start_time(appointment) != start:
+                result = "skipped"
+                if appointment is None:
+                    self.remove(appointment_id)
+                else:
+                    self.update(appointment)
+            else:
+                await self.on_due(appointment, lead)
+                result = "sent"
+        except Exception:
+            # Retried once the lease expires, by this worker or another one
+            if self._scheduled.get(appointment_id) == start:
+                heapq.heappush(self._heap, (now + timedelta(seconds=self.lease_seconds), appointment_id, lead, start))
+            raise
+        await self.leases.update_one(
+            {"_id": lease_id(appointment_id, start, lead), "owner": self.owner},
+            {"$set": {"fired_at": datetime.utcnow(), "result": result}},
+        )
+        metrics.appointment_reminders.inc(result)
+        return True
+
+    async def fire_due(self, now: Optional[datetime] = None) -> int:
+        """Fire every reminder due at now; returns how many were due"""
+        now = now or datetime.utcnow()
+        due = 0
+        while True:
+            fire_at = self.next_due()
+            if fire_at is None or fire_at > now:
+                return due
+            _, appointment_id, lead, start = heapq.heappop(self._heap)
+            due += 1
+            if start > now and not self._superseded(lead, start, now):
+                if not await self._fire(appointment_id, lead, start, now):
+                    continue
+            if lead == self.lead_minutes[-1] and self._scheduled.get(appointment_id) == start:
+                # Its last reminder
+                self.remove(appointment_id)
+
+    async def run(self):
+        """Fire reminders as they come due, reloading from MongoDB every reload_seconds"""
+        next_reload = asyncio.get_running_loop().time() + self.reload_seconds
+        while True:
+            try:
+                if self.reload_seconds > 0 and asyncio.get_running_loop().time() >= next_reload:
+                    next_reload = asyncio.get_running_loop().time() + self.reload_seconds
+                    await self.reload()
+                await self.fire_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Appointment reminders failed, retrying: {e}")
+
+            delay = MAX_SLEEP_SECONDS
+            fire_at = self.next_due()
+            if fire_at is not None:
+                delay = min(delay, max((fire_at - datetime.utcnow()).total_seconds(), 0))
+            if self.reload_seconds > 0:
+                delay = min(delay, max(next_reload - asyncio.get_running_loop().time(), 0))
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,57 @@
+"""Full-text search over consultations, appointments and emergencies.
+
+Each collection has one MongoDB text index in Spanish (stemming and
+stop words) that is case and diacritic insensitive, so "dolor de cabeza"
+matches "Dolores de cabéza". Results from the searched collections are
+merged by text score and paginated with a (score, id) keyset.
+"""
+import heapq
+from typing import Dict, List, Optional, Tuple
+
+SEARCH_LANGUAGE = "spanish"
+
+# Searched collection -> (result type, {field: weight}) of its text index
+SEARCH_FIELDS: Dict[str, Tuple[str, Dict[str, int]]] = {
+    "consultations": ("consultation", {"symptoms": 2, "diagnosis": 2}),
+    "appointments": ("appointment", {"reason": 2, "notes": 1}),
+    "emergencies": ("emergency", {"description": 1}),
+}
+
+
+def text_search_pipeline(text: str, limit: int, after: Optional[Tuple[float, str]] = None,
+                         projection: Optional[dict] = None) -> List[dict]:
+    """Matches for text ranked by score (then id), starting after a (score, id) keyset"""
+    pipeline = [
+        {"$match": {"$text": {"$search": text}}},
+        {"$addFields": {"_score": {"$meta": "textScore"}}},
+    ]
+    if after:
+        last_score, last_id = after
+        pipeline.append({"$match": {"$or": [
+            {"_score": {"$lt": last_score}},
+            {"_score": last_score, "id": {"$gt": last_id}},
+        ]}})
+    pipeline.append({"$sort": {"_score": -1, "id": 1}})
+    pipeline.append({"$limit": limit})
+    if projection:
+        pipeline.append({"$project": {**projection, "_score": 1}})
+    return pipeline
+
+
+def merge_ranked(results: Dict[str, List[dict]], limit: int) -> Tuple[List[Tuple[str, dict]], bool]:
+    """Merge per-collection ranked results into one page of (collection, document).
+
+    Each list must hold up to limit + 1 documents in (score desc, id) order;
+    the flag tells whether more results follow the page.
+    """
+    merged = heapq.merge(
+        *([(-document["_score"], document["id"], name, document) for document in documents]
+          for name, documents in results.items()),
+        key=lambda entry: (entry[0], entry[1]),
+    )
+    page = []
+    for _, _, name, document in merged:
+        if len(page) == limit:
+            return page, True
+        page.append((name, document))
+    return page, False
@@ -0,0 +1,38 @@
+"""Fast JSON serialization of MongoDB documents for read endpoints.
+
+Documents are validated by the Pydantic models when they are written, so read
+paths can encode them directly from the BSON-decoded dicts instead of building
+a model per row and having FastAPI validate it again against response_model.
+"""
+from typing import Iterable, Optional, Type
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content) -> bytes:
+    """Encode documents to JSON bytes. Datetimes and dates are written in ISO 8601."""
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class DocumentResponse(Response):
+    """JSON response for documents that were already validated on write"""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def model_projection(model: Type[BaseModel], fields: Optional[Iterable[str]] = None) -> dict:
+    """MongoDB projection returning exactly the fields of model (or the given subset)"""
+    projection = {name: 1 for name in (fields if fields is not None else model.model_fields)}
+    projection["_id"] = 0
+    return projection
@@ -1,30 +1,161 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Query, Request, Header
 from dotenv import load_dotenv
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 import os
+import asyncio
 import logging
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, field_validator
+from typing import List, Optional, Type
 import uuid
-from datetime import datetime, date
+import base64
+import heapq
+import json
+from datetime import datetime, date, time as day_time
 from bson import ObjectId
 
+from database import create_client
+from indexes import ensure_indexes, check_query_plans
+from serialization import DocumentResponse, model_projection
+from bulk import BulkResult, bulk_apply, read_items
+from events import EventHub, watch_changes
+from geo import to_geojson_point, near_pipeline
+from health_tips import HealthTipsCatalog
+from http_cache import (
+    CollectionVersions, cached_response, etag_matches, list_etag, parse_if_match, version_etag, version_filter,
+)
+from compression import CompressionMiddleware
+import metrics
+from archive import Archiver, archive_collection
+from coalescing import Coalescer
+from patients import DEFAULT_COUNTRY_CODE, PATIENT_SOURCES, PatientDirectory, history_pipeline, normalize_phone, with_phone_key
+from export import EXPORT_FORMATS, column_kinds, export_filename, parquet_available, stream_export
+from rate_limit import RateLimiter, retry_after
+from reminders import ReminderScheduler, parse_lead_minutes
+from triage import DEFAULT_TRIAGE_RULES, IN_PROGRESS, TriageQueue, parse_triage_rules
+from sync import DeltaSync, SyncTokenError, SyncTokenExpired
+from search import SEARCH_FIELDS, merge_ranked, text_search_pipeline
+from stats import StatsCounters, tracked_fields
+from notifications import NotificationOutbox, insert_with_outbox, load_sender, outbox_messages, parse_recipients
+from availability import (
+    INACTIVE_STATUSES, SlotIndex, as_day, format_time, parse_slot, parse_time, parse_working_hours,
+)
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Query plan check on startup: "off", "warn" (log collection scans) or "strict" (fail startup)
+QUERY_PLAN_CHECK = os.environ.get('QUERY_PLAN_CHECK', 'off').lower()
+
+# Emergency feed source: "local" (events published by this process) or
+# "changestream" (MongoDB change stream, requires a replica set; use it with several workers)
+EMERGENCY_EVENTS_SOURCE = os.environ.get('EMERGENCY_EVENTS_SOURCE', 'local').lower()
+SSE_KEEPALIVE_SECONDS = 15
+
+# Appointment slot length in minutes, and doctors' working hours offered as availability
+APPOINTMENT_SLOT_MINUTES = int(os.environ.get('APPOINTMENT_SLOT_MINUTES', '30'))
+# Seconds a worker trusts a cached doctor's day before reading it again (other workers' changes)
+SLOT_CACHE_SECONDS = float(os.environ.get('SLOT_CACHE_SECONDS', '30'))
+DOCTOR_WORKING_HOURS = parse_working_hours(os.environ.get('DOCTOR_WORKING_HOURS', '08:00-12:00,14:00-18:00'))
+
+# Emergency notifications: sender ("fake" or "module:Class"), recipients as
+# channel:address pairs, and the outbox worker pool of each process
+NOTIFICATION_SENDER = os.environ.get('NOTIFICATION_SENDER', 'fake')
+NOTIFICATION_RECIPIENTS = parse_recipients(os.environ.get('NOTIFICATION_RECIPIENTS', 'log:dispatch'))
+NOTIFICATION_WORKERS = int(os.environ.get('NOTIFICATION_WORKERS', '4'))
+NOTIFICATION_BATCH_SIZE = int(os.environ.get('NOTIFICATION_BATCH_SIZE', '50'))
+NOTIFICATION_MAX_ATTEMPTS = int(os.environ.get('NOTIFICATION_MAX_ATTEMPTS', '8'))
+
+# Emergency triage: severity per emergency_type (type=severity pairs) and for
+# other types, priority gained per minute of waiting, and seconds between
+# rebuilds of each worker's queue from MongoDB (0 disables them)
+TRIAGE_RULES = parse_triage_rules(os.environ.get('TRIAGE_RULES', DEFAULT_TRIAGE_RULES))
+TRIAGE_DEFAULT_SEVERITY = int(os.environ.get('TRIAGE_DEFAULT_SEVERITY', '50'))
+TRIAGE_AGING_PER_MINUTE = float(os.environ.get('TRIAGE_AGING_PER_MINUTE', '1'))
+TRIAGE_REBUILD_SECONDS = float(os.environ.get('TRIAGE_REBUILD_SECONDS', '60'))
+
+# Appointment reminders: minutes before an appointment each reminder is sent
+# (empty disables them), the channel they go out on to the patient's phone,
+# the time zone of appointment dates and times, and seconds between reloads
+# of each worker's schedule from MongoDB (0 loads every upcoming appointment once)
+REMINDER_LEAD_MINUTES = parse_lead_minutes(os.environ.get('REMINDER_LEAD_MINUTES', '1440,120'))
+REMINDER_CHANNEL = os.environ.get('REMINDER_CHANNEL', 'sms')
+APPOINTMENT_TIMEZONE = os.environ.get('APPOINTMENT_TIMEZONE', 'America/Managua')
+REMINDER_RELOAD_SECONDS = float(os.environ.get('REMINDER_RELOAD_SECONDS', '300'))
+
+# Delta sync: seconds of changes repeated by the next sync, covering clock
+# skew between workers and writes that commit after their updated_at
+SYNC_OVERLAP_SECONDS = float(os.environ.get('SYNC_OVERLAP_SECONDS', '30'))
+
+# Archival of resolved emergencies and finished appointments and consultations
+ARCHIVE_AFTER_DAYS = float(os.environ.get('ARCHIVE_AFTER_DAYS', '90'))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '1000'))
+# Seconds between archival runs in each worker; 0 disables the job
+ARCHIVE_INTERVAL_SECONDS = float(os.environ.get('ARCHIVE_INTERVAL_SECONDS', '3600'))
+
+# Hot list endpoints: requests per second and burst allowed per client
+# address (0, the default, disables the limit: behind a proxy set
+# FORWARDED_ALLOW_IPS first, or every client shares the proxy's bucket), and
+# seconds a computed list page is reused (0: only requests arriving while it
+# is computed share it)
+RATE_LIMIT_PER_SECOND = float(os.environ.get('RATE_LIMIT_PER_SECOND', '0'))
+RATE_LIMIT_BURST = float(os.environ.get('RATE_LIMIT_BURST', '40'))
+LIST_CACHE_SECONDS = float(os.environ.get('LIST_CACHE_SECONDS', '0.5'))
+
+# Country code of phone numbers entered without one, for the patient profiles
+PATIENT_COUNTRY_CODE = os.environ.get('PATIENT_COUNTRY_CODE', DEFAULT_COUNTRY_CODE)
+
+# Records read from MongoDB, encoded and sent at a time by /api/export
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '1000'))
 
-# Create the main app without a prefix
-app = FastAPI(title="Salud al Paso API", version="1.0.0")
+# Responses of at least this many bytes are gzip/brotli compressed for clients that accept it
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+
+# Seconds /api/health?deep=true waits for the MongoDB ping
+HEALTH_PING_TIMEOUT = float(os.environ.get('HEALTH_PING_TIMEOUT', '2'))
+
+# Health tips: seconds a worker keeps the catalog cached, and client max-age
+HEALTH_TIPS_CACHE_TTL = float(os.environ.get('HEALTH_TIPS_CACHE_TTL', '300'))
+HEALTH_TIPS_MAX_AGE = int(os.environ.get('HEALTH_TIPS_MAX_AGE', '300'))
+
+emergency_events = EventHub("emergencies")
+background_tasks = []
+
+# MongoDB connection and the caches bound to it. Each worker process creates
+# its own in the application lifespan (see connect), never at import time.
+client = None
+db = None
+health_tips_catalog: Optional[HealthTipsCatalog] = None
+slot_index: Optional[SlotIndex] = None
+notification_outbox: Optional[NotificationOutbox] = None
+stats_counters: Optional[StatsCounters] = None
+collection_versions: Optional[CollectionVersions] = None
+delta_sync: Optional[DeltaSync] = None
+archiver: Optional[Archiver] = None
+triage_queue: Optional[TriageQueue] = None
+reminder_scheduler: Optional[ReminderScheduler] = None
+patient_directory: Optional[PatientDirectory] = None
+rate_limiter: Optional[RateLimiter] = None
+list_versions: Optional[Coalescer] = None
+list_pages: Optional[Coalescer] = None
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
+# Read-modify-write attempts of an update sent without If-Match before answering 409
+UPDATE_ATTEMPTS = 3
+
+# List endpoints page size; a list request with neither limit nor cursor gets
+# MAX_PAGE_SIZE, the cap older app versions that do not page rely on
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
 # Pydantic models for the health app
 
 # Emergency models
@@ -37,6 +168,25 @@ class EmergencyReport(BaseModel):
     description: str
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     status: str = "pending"  # pending, in_progress, resolved
+    severity: int = 0  # triage score of emergency_type (TRIAGE_RULES)
+    version: int = 1
+
+class EmergencySummary(BaseModel):
+    id: str
+    patient_name: str
+    phone: str
+    location: dict
+    emergency_type: str
+    timestamp: datetime
+    status: str
+    severity: int = 0
+
+class NearbyEmergency(EmergencyReport):
+    distance_m: float
+
+class QueuedEmergency(EmergencyReport):
+    priority: float
+    waiting_minutes: float
 
 class EmergencyCreate(BaseModel):
     patient_name: str
@@ -58,6 +208,7 @@ class MedicalAppointment(BaseModel):
     status: str = "scheduled"  # scheduled, confirmed, completed, cancelled
     notes: Optional[str] = ""
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    version: int = 1
     
     class Config:
         json_encoders = {
@@ -65,6 +216,16 @@ class MedicalAppointment(BaseModel):
             datetime: lambda v: v.isoformat()
         }
 
+class AppointmentSummary(BaseModel):
+    id: str
+    patient_name: str
+    patient_phone: str
+    doctor_name: str
+    specialty: str
+    appointment_date: date
+    appointment_time: str
+    status: str
+
 class AppointmentCreate(BaseModel):
     patient_name: str
     patient_phone: str
@@ -74,6 +235,12 @@ class AppointmentCreate(BaseModel):
     appointment_time: str
     reason: str
 
+    @field_validator('appointment_time')
+    @classmethod
+    def check_slot(cls, value):
+        parse_slot(value, APPOINTMENT_SLOT_MINUTES)
+        return value.strip()
+
 class AppointmentUpdate(BaseModel):
     patient_name: Optional[str] = None
     patient_phone: Optional[str] = None
@@ -85,6 +252,21 @@ class AppointmentUpdate(BaseModel):
     status: Optional[str] = None
     notes: Optional[str] = None
 
+    @field_validator('appointment_time')
+    @classmethod
+    def check_slot(cls, value):
+        if value is not None:
+            parse_slot(value, APPOINTMENT_SLOT_MINUTES)
+            return value.strip()
+        return value
+
+class DoctorAvailability(BaseModel):
+    doctor_name: str
+    date: date
+    slot_minutes: int
+    booked: List[str]
+    available: List[str]
+
 # Medical consultation models
 class MedicalConsultation(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -98,6 +280,16 @@ class MedicalConsultation(BaseModel):
     diagnosis: Optional[str] = ""
     treatment: Optional[str] = ""
     follow_up_date: Optional[date] = None
+    version: int = 1
+
+class ConsultationSummary(BaseModel):
+    id: str
+    patient_name: str
+    patient_phone: str
+    doctor_name: str
+    consultation_type: str
+    consultation_date: datetime
+    status: str
 
 class ConsultationCreate(BaseModel):
     patient_name: str
@@ -106,6 +298,17 @@ class ConsultationCreate(BaseModel):
     consultation_type: str
     symptoms: str
 
+class ConsultationUpdate(BaseModel):
+    patient_name: Optional[str] = None
+    patient_phone: Optional[str] = None
+    doctor_name: Optional[str] = None
+    consultation_type: Optional[str] = None
+    symptoms: Optional[str] = None
+    status: Optional[str] = None
+    diagnosis: Optional[str] = None
+    treatment: Optional[str] = None
+    follow_up_date: Optional[date] = None
+
 # Health tips model
 class HealthTip(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -116,38 +319,501 @@ class HealthTip(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     is_active: bool = True
 
+class HealthTipCreate(BaseModel):
+    title: str
+    content: str
+    category: str
+    image_url: Optional[str] = ""
+    is_active: bool = True
+
+class HealthTipUpdate(BaseModel):
+    title: Optional[str] = None
+    content: Optional[str] = None
+    category: Optional[str] = None
+    image_url: Optional[str] = None
+    is_active: Optional[bool] = None
+
+# Appointment dates are stored as BSON dates at midnight UTC, BSON has no date-only type
+def to_storage_date(value: date) -> datetime:
+    return datetime.combine(value, day_time.min)
+
+def from_storage_dates(appointments: list) -> list:
+    """Turn stored appointment_date datetimes back into dates for the response"""
+    for appointment in appointments:
+        value = appointment.get('appointment_date')
+        if isinstance(value, datetime):
+            appointment['appointment_date'] = value.date()
+    return appointments
+
+# Storage documents
+def emergency_document(emergency_obj: EmergencyReport) -> dict:
+    emergency_data = emergency_obj.dict()
+    # GeoJSON copy of location for the 2dsphere index, not part of the API response
+    point = to_geojson_point(emergency_data['location'])
+    if point:
+        emergency_data['geo'] = point
+    emergency_data['updated_at'] = emergency_data['timestamp']
+    return with_phone_key("emergencies", emergency_data, PATIENT_COUNTRY_CODE)
+
+async def send_reminder(appointment: dict, lead_minutes: int):
+    """Reminder of an upcoming appointment to the patient's phone, delivered by the outbox workers"""
+    payload = {
+        "appointment_id": appointment["id"],
+        "patient_name": appointment.get("patient_name"),
+        "doctor_name": appointment.get("doctor_name"),
+        "specialty": appointment.get("specialty"),
+        "appointment_date": as_day(appointment.get("appointment_date")).isoformat(),
+        "appointment_time": appointment.get("appointment_time"),
+        "minutes_before": lead_minutes,
+    }
+    recipient = appointment.get("phone_e164") or appointment["patient_phone"]
+    await notification_outbox.enqueue(outbox_messages("appointment_reminder", payload, [(REMINDER_CHANNEL, recipient)]))
+
+def emergency_notification(emergency_obj: EmergencyReport) -> dict:
+    """Payload of the alert sent to NOTIFICATION_RECIPIENTS for a new report"""
+    return {
+        "emergency_id": emergency_obj.id,
+        "emergency_type": emergency_obj.emergency_type,
+        "patient_name": emergency_obj.patient_name,
+        "phone": emergency_obj.phone,
+        "location": emergency_obj.location,
+        "timestamp": emergency_obj.timestamp,
+    }
+
+SLOT_FIELDS = ('doctor_name', 'appointment_date', 'appointment_time', 'status')
+
+def slot_start(appointment: dict) -> Optional[int]:
+    """Minute the appointment's slot starts, or None when it does not hold a slot.
+
+    Stored as slot_start; the unique (doctor_name, appointment_date, slot_start)
+    index is what prevents double bookings across workers.
+    """
+    if appointment.get('status') in INACTIVE_STATUSES:
+        return None
+    try:
+        return parse_time(appointment.get('appointment_time'))
+    except ValueError:
+        return None
+
+def appointment_document(appointment_obj: MedicalAppointment) -> dict:
+    appointment_data = appointment_obj.dict()
+    appointment_data['appointment_date'] = to_storage_date(appointment_data['appointment_date'])
+    appointment_data['slot_start'] = slot_start(appointment_data)
+    appointment_data['updated_at'] = appointment_data['created_at']
+    return with_phone_key("appointments", appointment_data, PATIENT_COUNTRY_CODE)
+
+def appointment_changes(appointment_update: AppointmentUpdate) -> dict:
+    update_data = {k: v for k, v in appointment_update.dict().items() if v is not None}
+    if 'appointment_date' in update_data:
+        update_data['appointment_date'] = to_storage_date(update_data['appointment_date'])
+    return with_phone_key("appointments", update_data, PATIENT_COUNTRY_CODE)
+
+def complete_appointment_bulk_update(current: dict, update_data: dict) -> dict:
+    """bulk_apply complete_update hook: recompute slot_start from the current
+    schedule when a bulk update reschedules, cancels or reactivates"""
+    if any(field in update_data for field in SLOT_FIELDS):
+        update_data = {**update_data, 'slot_start': slot_start({**current, **update_data})}
+    return update_data
+
+def appointment_conflict():
+    return HTTPException(status_code=409, detail="The doctor already has an appointment at that time")
+
+def consultation_document(consultation_obj: MedicalConsultation) -> dict:
+    consultation_data = consultation_obj.dict()
+    if consultation_data['follow_up_date'] is not None:
+        consultation_data['follow_up_date'] = to_storage_date(consultation_data['follow_up_date'])
+    consultation_data['updated_at'] = datetime.utcnow()
+    return with_phone_key("consultations", consultation_data, PATIENT_COUNTRY_CODE)
+
+def consultation_changes(consultation_update: ConsultationUpdate) -> dict:
+    update_data = {k: v for k, v in consultation_update.dict().items() if v is not None}
+    if 'follow_up_date' in update_data:
+        update_data['follow_up_date'] = to_storage_date(update_data['follow_up_date'])
+    return with_phone_key("consultations", update_data, PATIENT_COUNTRY_CODE)
+
+def bulk_builders(model: Type[BaseModel], create_model: Type[BaseModel], update_model: Type[BaseModel], to_document, to_changes):
+    """Item builders for bulk_apply: validate a create or update item into what gets written"""
+    def build_insert(item: dict) -> dict:
+        return to_document(model(**create_model(**item).dict()))
+
+    def build_update(item: dict) -> dict:
+        changes = to_changes(update_model(**{k: v for k, v in item.items() if k != "id"}))
+        if not changes:
+            raise ValueError("Nothing to update")
+        return changes
+
+    return build_insert, build_update
+
+async def record_created(collection_name: str, document: dict):
+    """Move the dashboard counters, the patient profile and the list version
+    after a create. The three writes are independent and sent together."""
+    await asyncio.gather(
+        stats_counters.created(collection_name, document),
+        patient_directory.record(collection_name, [document]),
+        collection_versions.bump(collection_name),
+    )
+
+async def record_bulk_writes(collection_name: str, written: list):
+    """bulk_apply on_write hook: move the dashboard counters, the list version and the patient profiles"""
+    if collection_name == "appointments":
+        for _, after in written:
+            reminder_scheduler.update(after)
+    await asyncio.gather(
+        stats_counters.record(collection_name, written),
+        patient_directory.record(collection_name, [after for before, after in written if before is None]),
+        collection_versions.bump(collection_name),
+    )
+
+async def record_archived(collection_name: str, archived: list):
+    """Archived records leave the default list results"""
+    await collection_versions.bump(collection_name)
+
+async def find_with_archive(collection_name: str, record_id: str, projection: dict) -> Optional[dict]:
+    """A record by id from the hot collection, or from its archive"""
+    document = await db[collection_name].find_one({"id": record_id}, projection)
+    if document is None:
+        document = await db[archive_collection(collection_name)].find_one({"id": record_id}, projection)
+    return document
+
+async def raise_update_failed(collection, record_id: str, expected_version: Optional[int], not_found: str):
+    """Raise 412 if the record exists but is not at the If-Match version, 404 otherwise"""
+    if expected_version is not None and await collection.count_documents({"id": record_id}, limit=1):
+        raise HTTPException(status_code=412, detail="Record was modified by someone else, reload it and retry")
+    raise HTTPException(status_code=404, detail=not_found)
+
+# Keyset pagination helpers
+def encode_cursor(sort_value, doc_id: str) -> str:
+    """Encode the sort key and id of the last returned document as an opaque cursor"""
+    if isinstance(sort_value, (datetime, date)):
+        sort_value = {"$date": sort_value.isoformat()}
+    raw = json.dumps([sort_value, doc_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    """Decode a cursor produced by encode_cursor into (sort_value, id)"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, doc_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if isinstance(sort_value, dict):
+            sort_value = datetime.fromisoformat(sort_value["$date"])
+        if not isinstance(doc_id, str):
+            raise ValueError("cursor id must be a string")
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return sort_value, doc_id
+
+def date_range_filter(field: str, start=None, end=None) -> dict:
+    """Build an inclusive range filter on a date field"""
+    bounds = {}
+    if start is not None:
+        bounds["$gte"] = start
+    if end is not None:
+        bounds["$lte"] = end
+    return {field: bounds} if bounds else {}
+
+def list_sources(collection_name: str, include_archived: bool) -> list:
+    """Collections a list endpoint reads: the hot one, and its archive on request"""
+    if include_archived:
+        return [db[collection_name], db[archive_collection(collection_name)]]
+    return [db[collection_name]]
+
+def page_limit(limit: Optional[int], after: Optional[str]) -> int:
+    """Page size of a list request: the limit sent, else DEFAULT_PAGE_SIZE while
+    paging with a cursor, else MAX_PAGE_SIZE for clients that do not page"""
+    if limit is not None:
+        return limit
+    return DEFAULT_PAGE_SIZE if after else MAX_PAGE_SIZE
+
+async def fetch_page(collections: list, query: dict, sort_field: str, direction: int, limit: int, after: Optional[str], projection: Optional[dict] = None):
+    """Fetch one page ordered by (sort_field, id), returning the documents and the next cursor.
+
+    The filter and the keyset condition are both pushed down to MongoDB, so the
+    cost of a page depends on its size and not on its position in the collection.
+    With several collections (hot and archive) each returns its own page and
+    the pages are merged in the same order.
+    """
+    if after:
+        last_value, last_id = decode_cursor(after)
+        op = "$gt" if direction == 1 else "$lt"
+        keyset = {"$or": [
+            {sort_field: {op: last_value}},
+            {sort_field: last_value, "id": {op: last_id}},
+        ]}
+        query = {"$and": [query, keyset]} if query else keyset
+
+    pages = [
+        await collection.find(query, projection).sort([(sort_field, direction), ("id", direction)]).to_list(limit + 1)
+        for collection in collections
+    ]
+    if len(pages) == 1:
+        documents = pages[0]
+    else:
+        documents = list(heapq.merge(
+            *pages, key=lambda document: (document.get(sort_field), document["id"]), reverse=direction == -1
+        ))[:limit + 1]
+
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        last = documents[-1]
+        next_cursor = encode_cursor(last.get(sort_field), last["id"])
+    return documents, next_cursor
+
+# Projected list views
+def list_view(full_model: Type[BaseModel], summary_model: Type[BaseModel], view: str, fields: Optional[str], sort_field: str):
+    """Resolve the view/fields query parameters into the output fields and a MongoDB projection.
+
+    Only the selected fields, plus the id and sort key needed to build the
+    next cursor, are read from MongoDB.
+    """
+    if fields:
+        selected = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+        unknown = set(selected) - set(full_model.model_fields)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    elif view == "summary":
+        selected = tuple(summary_model.model_fields)
+    else:
+        selected = tuple(full_model.model_fields)
+
+    projection = model_projection(full_model, selected)
+    projection.update({"id": 1, sort_field: 1})
+    return selected, projection
+
+LIST_CACHE_CONTROL = "private, no-cache"
+
+async def list_etag_for(request: Request, collection_name: str) -> str:
+    """ETag of a list request. The counter is read before the query, so a
+    concurrent write can leave the ETag older than the body but never newer."""
+    version = await list_versions.run(collection_name, lambda: collection_versions.get(collection_name))
+    return list_etag(version, request)
+
+async def shared_list_page(collection_name: str, etag: str, load_page) -> Response:
+    """One list page computed once for every identical request arriving while
+    it is loaded or within LIST_CACHE_SECONDS. The ETag holds the collection
+    version and the query, so a page is only reused for the same query at the
+    same version."""
+    page = await list_pages.run((collection_name, etag), load_page)
+    return Response(content=page.body, status_code=page.status_code, headers=page.headers)
+
+def client_key(request: Request) -> str:
+    """Rate limit key: the client address. Behind a proxy this is the address
+    it reports in X-Forwarded-For, trusted only from FORWARDED_ALLOW_IPS (see
+    the README); headers and parameters chosen by the caller never pick the bucket."""
+    return f"address:{request.client.host if request.client else '-'}"
+
+async def rate_limited(request: Request):
+    """Dependency refusing requests over the client's token bucket with 429"""
+    if rate_limiter is None:
+        return
+    wait = rate_limiter.acquire(client_key(request))
+    if wait:
+        metrics.rate_limited_requests.inc(request.scope["route"].path)
+        raise HTTPException(status_code=429, detail="Too many requests", headers={"Retry-After": retry_after(wait)})
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """Empty 304 when the client already holds this list page"""
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": LIST_CACHE_CONTROL})
+    return None
+
+def list_response(documents: list, next_cursor: Optional[str], output_fields: tuple, etag: Optional[str] = None) -> DocumentResponse:
+    """Encode a page of stored documents straight to JSON, bypassing response_model validation.
+
+    Rows holding fields beyond output_fields (the sort key read for the
+    cursor, fields of older or newer records) are trimmed one by one.
+    """
+    allowed = set(output_fields)
+    documents = [
+        document if allowed.issuperset(document) else {k: document[k] for k in output_fields if k in document}
+        for document in documents
+    ]
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    if etag:
+        headers.update({"ETag": etag, "Cache-Control": LIST_CACHE_CONTROL})
+    return DocumentResponse(content=documents, headers=headers or None)
+
 # Emergency endpoints
 @api_router.post("/emergencies", response_model=EmergencyReport)
 async def create_emergency_report(emergency: EmergencyCreate):
     """Create a new emergency report"""
     emergency_dict = emergency.dict()
-    emergency_obj = EmergencyReport(**emergency_dict)
+    emergency_obj = EmergencyReport(**emergency_dict, severity=triage_queue.severity(emergency.emergency_type))
     
-    # Insert into MongoDB
-    result = await db.emergencies.insert_one(emergency_obj.dict())
-    
-    # Simulate sending notification
-    logger.info(f"EMERGENCY ALERT: {emergency_obj.emergency_type} reported by {emergency_obj.patient_name}")
-    logger.info(f"Location: {emergency_obj.location}")
+    # Insert into MongoDB with its notifications; the outbox workers deliver them
+    emergency_data = emergency_document(emergency_obj)
+    messages = outbox_messages("emergency_created", emergency_notification(emergency_obj), NOTIFICATION_RECIPIENTS)
+    await insert_with_outbox(client, db.emergencies, emergency_data, notification_outbox, messages)
+    triage_queue.update(emergency_data)
+    await record_created("emergencies", emergency_data)
+    if EMERGENCY_EVENTS_SOURCE == "local":
+        emergency_events.publish("created", emergency_obj.dict())
     
     return emergency_obj
 
-@api_router.get("/emergencies", response_model=List[EmergencyReport])
-async def get_emergencies():
-    """Get all emergency reports"""
-    emergencies = await db.emergencies.find().to_list(1000)
-    return [EmergencyReport(**emergency) for emergency in emergencies]
+@api_router.get("/emergencies", response_model=List[EmergencyReport], dependencies=[Depends(rate_limited)])
+async def get_emergencies(
+    request: Request,
+    status: Optional[str] = None,
+    phone: Optional[str] = None,
+    emergency_type: Optional[str] = None,
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    view: str = Query("full", pattern="^(full|summary)$"),
+    fields: Optional[str] = None,
+    include_archived: bool = False,
+):
+    """Get emergency reports, oldest first, one page at a time.
+
+    The cursor for the next page is returned in the X-Next-Cursor header.
+    Without limit the first page holds up to 1000 records and the following
+    ones 100.
+    Use view=summary or fields=a,b,c to receive only the listed fields.
+    Send the ETag back in If-None-Match to get an empty 304 while nothing changed.
+    Archived records are left out unless include_archived=true.
+    Each client is rate limited; over the limit the answer is 429 with Retry-After.
+    """
+    query = {k: v for k, v in {"status": status, "phone": phone, "emergency_type": emergency_type}.items() if v is not None}
+    query.update(date_range_filter("timestamp", date_from, date_to))
+
+    etag = await list_etag_for(request, "emergencies")
+    if cached := not_modified(request, etag):
+        return cached
+
+    async def load_page():
+        output_fields, projection = list_view(EmergencyReport, EmergencySummary, view, fields, "timestamp")
+        emergencies, next_cursor = await fetch_page(list_sources("emergencies", include_archived), query, "timestamp", 1, page_limit(limit, after), after, projection)
+        return list_response(emergencies, next_cursor, output_fields, etag)
+    return await shared_list_page("emergencies", etag, load_page)
+
+@api_router.get("/emergencies/nearby", response_model=List[NearbyEmergency])
+async def get_nearby_emergencies(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(5, gt=0, le=500),
+    status: Optional[List[str]] = Query(None),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+):
+    """Get emergency reports within radius_km of a point, closest first.
+
+    status may be repeated, e.g. ?status=pending&status=in_progress.
+    """
+    query = {"status": {"$in": status}} if status else {}
+    pipeline = near_pipeline(latitude, longitude, radius_km * 1000, query, limit, model_projection(EmergencyReport))
+    emergencies = await db.emergencies.aggregate(pipeline).to_list(limit)
+    return DocumentResponse(content=emergencies)
+
+def queued_emergency(emergency: dict, key: float, now: datetime) -> dict:
+    emergency["priority"] = round(triage_queue.priority(key, now), 2)
+    emergency["waiting_minutes"] = round((now - emergency["timestamp"]).total_seconds() / 60, 1)
+    return emergency
+
+@api_router.get("/emergencies/queue", response_model=List[QueuedEmergency])
+async def get_emergency_queue(limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE)):
+    """Pending emergencies in dispatch order, highest priority first.
+
+    priority is the severity of the emergency_type plus TRIAGE_AGING_PER_MINUTE
+    for every minute the report has waited.
+    """
+    top = triage_queue.top(limit)
+    emergencies = await db.emergencies.find(
+        {"id": {"$in": [emergency_id for _, emergency_id in top]}, "status": "pending"},
+        model_projection(EmergencyReport),
+    ).to_list(limit)
+    by_id = {emergency["id"]: emergency for emergency in emergencies}
+    now = datetime.utcnow()
+    return DocumentResponse(content=[
+        queued_emergency(by_id[emergency_id], key, now) for key, emergency_id in top if emergency_id in by_id
+    ])
+
+@api_router.post("/emergencies/queue/claim", response_model=QueuedEmergency)
+async def claim_next_emergency(dispatcher: Optional[str] = None):
+    """Take the highest priority pending emergency and mark it in_progress.
+
+    Each emergency is handed to exactly one caller, across all workers.
+    Returns 204 when no emergency is pending.
+    """
+    now = datetime.utcnow()
+    changes = {"updated_at": now, "claimed_at": now}
+    if dispatcher:
+        changes["claimed_by"] = dispatcher
+    claimed = await triage_queue.claim(changes, model_projection(EmergencyReport))
+    if claimed is None:
+        return Response(status_code=204)
+    previous, key = claimed
+    await stats_counters.updated("emergencies", previous, {"status": IN_PROGRESS})
+    await collection_versions.bump("emergencies")
+    if EMERGENCY_EVENTS_SOURCE == "local":
+        emergency_events.publish("status_changed", {"id": previous["id"], "status": IN_PROGRESS})
+    version = (previous.get("version") or 0) + 1
+    emergency = queued_emergency({**previous, "status": IN_PROGRESS, "version": version}, key, now)
+    return DocumentResponse(content=emergency, headers={"ETag": version_etag(version)})
 
 @api_router.put("/emergencies/{emergency_id}")
-async def update_emergency_status(emergency_id: str, status: str):
-    """Update emergency status"""
-    result = await db.emergencies.update_one(
-        {"id": emergency_id},
-        {"$set": {"status": status}}
+@api_router.patch("/emergencies/{emergency_id}")
+async def update_emergency_status(emergency_id: str, status: str, if_match: Optional[str] = Header(None)):
+    """Update emergency status.
+
+    Send the ETag of the version you edited in If-Match to get 412 instead of
+    overwriting a change made by another dispatcher in the meantime.
+    """
+    expected_version = parse_if_match(if_match)
+    # The previous values move the dashboard counters
+    previous = await db.emergencies.find_one_and_update(
+        version_filter(emergency_id, expected_version),
+        {"$set": {"status": status, "updated_at": datetime.utcnow()}, "$inc": {"version": 1}},
+        projection={"_id": 0, "version": 1, "severity": 1, **{field: 1 for field in tracked_fields("emergencies")}},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if previous is None:
+        await raise_update_failed(db.emergencies, emergency_id, expected_version, "Emergency not found")
+    triage_queue.update({**previous, "id": emergency_id, "status": status})
+    await stats_counters.updated("emergencies", previous, {"status": status})
+    await collection_versions.bump("emergencies")
+    if EMERGENCY_EVENTS_SOURCE == "local":
+        emergency_events.publish("status_changed", {"id": emergency_id, "status": status})
+    return JSONResponse(
+        content={"message": "Emergency status updated"},
+        headers={"ETag": version_etag((previous.get("version") or 0) + 1)},
+    )
+
+@api_router.get("/emergencies/stream")
+async def stream_emergencies():
+    """Server-Sent Events feed of new emergency reports and status changes.
+
+    Events are "created" (the full report), "status_changed" ({id, status})
+    and "resync" when this client fell too far behind and should reload the list.
+    """
+    subscription = emergency_events.subscribe()
+
+    async def event_stream():
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                message = await subscription.get(timeout=SSE_KEEPALIVE_SECONDS)
+                yield message if message is not None else b": keep-alive\n\n"
+        finally:
+            subscription.close()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    if result.modified_count == 0:
-        raise HTTPException(status_code=404, detail="Emergency not found")
-    return {"message": "Emergency status updated"}
+
+def emergency_change_event(change: dict):
+    """Map an emergencies change stream document to a feed event"""
+    document = change.get("fullDocument")
+    if change["operationType"] == "insert" and document:
+        document.pop("_id", None)
+        return "created", document
+    if change["operationType"] == "update" and document:
+        updated_fields = change.get("updateDescription", {}).get("updatedFields", {})
+        if "status" in updated_fields:
+            return "status_changed", {"id": document["id"], "status": updated_fields["status"]}
+    return None
 
 # Medical appointments endpoints
 @api_router.post("/appointments", response_model=MedicalAppointment)
@@ -155,75 +821,243 @@ async def create_appointment(appointment: AppointmentCreate):
     """Create a new medical appointment"""
     appointment_dict = appointment.dict()
     appointment_obj = MedicalAppointment(**appointment_dict)
+    appointment_data = appointment_document(appointment_obj)
     
-    # Convert date objects to strings for MongoDB storage
-    appointment_data = appointment_obj.dict()
-    if 'appointment_date' in appointment_data and isinstance(appointment_data['appointment_date'], date):
-        appointment_data['appointment_date'] = appointment_data['appointment_date'].isoformat()
-    if 'created_at' in appointment_data and isinstance(appointment_data['created_at'], datetime):
-        appointment_data['created_at'] = appointment_data['created_at'].isoformat()
-    
-    result = await db.appointments.insert_one(appointment_data)
+    if await slot_index.conflict(appointment_obj.doctor_name, appointment_obj.appointment_date, appointment_data['slot_start']):
+        raise appointment_conflict()
+    try:
+        result = await db.appointments.insert_one(appointment_data)
+    except DuplicateKeyError:
+        # Booked by another worker since this one loaded the day
+        slot_index.forget_day(appointment_obj.doctor_name, appointment_obj.appointment_date)
+        raise appointment_conflict()
+    slot_index.add(appointment_data)
+    reminder_scheduler.update(appointment_data)
+    await record_created("appointments", appointment_data)
     return appointment_obj
 
-@api_router.get("/appointments", response_model=List[MedicalAppointment])
-async def get_appointments():
-    """Get all medical appointments"""
-    appointments = await db.appointments.find().sort("appointment_date", 1).to_list(1000)
-    # Convert string dates back to date objects
-    for appointment in appointments:
-        if 'appointment_date' in appointment and isinstance(appointment['appointment_date'], str):
-            appointment['appointment_date'] = datetime.fromisoformat(appointment['appointment_date']).date()
-        if 'created_at' in appointment and isinstance(appointment['created_at'], str):
-            appointment['created_at'] = datetime.fromisoformat(appointment['created_at'])
-    return [MedicalAppointment(**appointment) for appointment in appointments]
+@api_router.post("/appointments/bulk", response_model=BulkResult)
+async def bulk_appointments(request: Request):
+    """Create or update many appointments from a JSON array or an NDJSON stream.
+
+    Items with an "id" update that appointment, the others create new ones.
+    """
+    build_insert, build_update = bulk_builders(
+        MedicalAppointment, AppointmentCreate, AppointmentUpdate, appointment_document, appointment_changes
+    )
+    try:
+        return await bulk_apply(
+            db.appointments, read_items(request), build_insert, build_update,
+            on_write=lambda written: record_bulk_writes("appointments", written),
+            tracked_fields=tuple(dict.fromkeys(tracked_fields("appointments") + SLOT_FIELDS + ('created_at',))),
+            complete_update=complete_appointment_bulk_update,
+        )
+    finally:
+        # Double bookings in the import are rejected by the unique slot index; reload schedules lazily
+        slot_index.clear()
+
+@api_router.get("/appointments", response_model=List[MedicalAppointment], dependencies=[Depends(rate_limited)])
+async def get_appointments(
+    request: Request,
+    status: Optional[str] = None,
+    doctor_name: Optional[str] = None,
+    specialty: Optional[str] = None,
+    patient_phone: Optional[str] = None,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    view: str = Query("full", pattern="^(full|summary)$"),
+    fields: Optional[str] = None,
+    include_archived: bool = False,
+):
+    """Get medical appointments ordered by date, one page at a time.
+
+    The cursor for the next page is returned in the X-Next-Cursor header.
+    Without limit the first page holds up to 1000 records and the following
+    ones 100.
+    Use view=summary or fields=a,b,c to receive only the listed fields.
+    Send the ETag back in If-None-Match to get an empty 304 while nothing changed.
+    Archived records are left out unless include_archived=true.
+    Each client is rate limited; over the limit the answer is 429 with Retry-After.
+    """
+    query = {k: v for k, v in {
+        "status": status,
+        "doctor_name": doctor_name,
+        "specialty": specialty,
+        "patient_phone": patient_phone,
+    }.items() if v is not None}
+    query.update(date_range_filter(
+        "appointment_date",
+        to_storage_date(date_from) if date_from else None,
+        to_storage_date(date_to) if date_to else None,
+    ))
+
+    etag = await list_etag_for(request, "appointments")
+    if cached := not_modified(request, etag):
+        return cached
+
+    async def load_page():
+        output_fields, projection = list_view(MedicalAppointment, AppointmentSummary, view, fields, "appointment_date")
+        appointments, next_cursor = await fetch_page(list_sources("appointments", include_archived), query, "appointment_date", 1, page_limit(limit, after), after, projection)
+        return list_response(from_storage_dates(appointments), next_cursor, output_fields, etag)
+    return await shared_list_page("appointments", etag, load_page)
+
+class SyncResponse(BaseModel):
+    changed: List[dict]
+    deleted: List[str]
+    token: str
+    has_more: bool
+
+async def sync_page(collection_name: str, model: Type[BaseModel], token: Optional[str], limit: int) -> dict:
+    try:
+        changed, deleted, next_token, has_more = await delta_sync.changes(
+            db[collection_name], collection_name, token, limit, model_projection(model)
+        )
+    except SyncTokenError:
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+    except SyncTokenExpired:
+        raise HTTPException(status_code=410, detail="Sync token expired, sync again without a token")
+    return {"changed": changed, "deleted": deleted, "token": next_token, "has_more": has_more}
+
+@api_router.get("/appointments/sync", response_model=SyncResponse)
+async def sync_appointments(
+    since: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    """Appointments created, modified or deleted since a sync token.
+
+    Without a token every appointment is returned. Keep calling with the
+    returned token while has_more is true, then store it for the next sync.
+    Upsert "changed" records by id, then remove the "deleted" ids; a record
+    may be sent again by the next sync. 410 means the token is too old:
+    drop the local copy and sync without a token.
+    """
+    page = await sync_page("appointments", MedicalAppointment, since, limit)
+    from_storage_dates(page["changed"])
+    return DocumentResponse(content=page)
 
 @api_router.get("/appointments/{appointment_id}", response_model=MedicalAppointment)
-async def get_appointment(appointment_id: str):
-    """Get a specific appointment"""
-    appointment = await db.appointments.find_one({"id": appointment_id})
+async def get_appointment(appointment_id: str, if_none_match: Optional[str] = Header(None)):
+    """Get a specific appointment, archived or not. The ETag identifies its version, for If-Match on updates."""
+    appointment = await find_with_archive("appointments", appointment_id, model_projection(MedicalAppointment))
     if not appointment:
         raise HTTPException(status_code=404, detail="Appointment not found")
-    # Convert string dates back to date objects
-    if 'appointment_date' in appointment and isinstance(appointment['appointment_date'], str):
-        appointment['appointment_date'] = datetime.fromisoformat(appointment['appointment_date']).date()
-    if 'created_at' in appointment and isinstance(appointment['created_at'], str):
-        appointment['created_at'] = datetime.fromisoformat(appointment['created_at'])
-    return MedicalAppointment(**appointment)
+    etag = version_etag(appointment.get("version"))
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return DocumentResponse(content=from_storage_dates([appointment])[0], headers={"ETag": etag})
 
 @api_router.put("/appointments/{appointment_id}", response_model=MedicalAppointment)
-async def update_appointment(appointment_id: str, appointment_update: AppointmentUpdate):
-    """Update a medical appointment"""
-    update_data = {k: v for k, v in appointment_update.dict().items() if v is not None}
+@api_router.patch("/appointments/{appointment_id}", response_model=MedicalAppointment)
+async def update_appointment(appointment_id: str, appointment_update: AppointmentUpdate, if_match: Optional[str] = Header(None)):
+    """Update the given fields of a medical appointment in a single atomic operation.
+
+    Send the ETag of the version you edited in If-Match to get 412 instead of
+    overwriting someone else's change. Without If-Match, a change that
+    depends on the current values is retried when another write lands
+    between its read and its write.
+    """
+    changes = appointment_changes(appointment_update)
+    expected_version = parse_if_match(if_match)
+    projection = model_projection(MedicalAppointment)
+    read_fields = set(SLOT_FIELDS) | set(tracked_fields("appointments"))
     
-    # Convert date objects to strings for MongoDB storage
-    if 'appointment_date' in update_data and isinstance(update_data['appointment_date'], date):
-        update_data['appointment_date'] = update_data['appointment_date'].isoformat()
+    for _ in range(UPDATE_ATTEMPTS):
+        update_data = dict(changes)
+        query = version_filter(appointment_id, expected_version)
+        current = merged = None
+        
+        if any(field in update_data for field in read_fields):
+            # Rescheduling, cancelling or recategorizing: the new slot and the
+            # dashboard counters depend on the values being replaced
+            current = await db.appointments.find_one(query, {"_id": 0, "version": 1, **{f: 1 for f in read_fields}})
+            if current is None:
+                await raise_update_failed(db.appointments, appointment_id, expected_version, "Appointment not found")
+            # Apply only to the version that was read
+            query = version_filter(appointment_id, current.get("version"))
+        
+        if any(field in update_data for field in SLOT_FIELDS):
+            merged = {**current, **update_data}
+            update_data['slot_start'] = slot_start(merged)
+            if update_data['slot_start'] is not None and await slot_index.conflict(
+                merged['doctor_name'], as_day(merged['appointment_date']), update_data['slot_start'], ignore_id=appointment_id
+            ):
+                raise appointment_conflict()
+        
+        try:
+            if update_data:
+                updated_appointment = await db.appointments.find_one_and_update(
+                    query,
+                    {"$set": {**update_data, "updated_at": datetime.utcnow()}, "$inc": {"version": 1}},
+                    projection=projection,
+                    return_document=ReturnDocument.AFTER,
+                )
+            else:
+                updated_appointment = await db.appointments.find_one(query, projection)
+        except DuplicateKeyError:
+            if merged:
+                slot_index.forget_day(merged['doctor_name'], as_day(merged['appointment_date']))
+            raise appointment_conflict()
+        
+        if updated_appointment is not None:
+            break
+        if current is None or expected_version is not None:
+            await raise_update_failed(db.appointments, appointment_id, expected_version, "Appointment not found")
+        # Changed by someone else between the read and the write: read it again
+    else:
+        raise HTTPException(status_code=409, detail="Appointment is being modified by someone else, retry")
     
-    result = await db.appointments.update_one(
-        {"id": appointment_id},
-        {"$set": update_data}
+    if 'slot_start' in update_data:
+        if update_data['slot_start'] is None:
+            slot_index.remove(appointment_id)
+        else:
+            slot_index.add(updated_appointment)
+    reminder_scheduler.update(updated_appointment)
+    if current:
+        await stats_counters.updated("appointments", current, update_data)
+    if update_data:
+        await collection_versions.bump("appointments")
+    return DocumentResponse(
+        content=from_storage_dates([updated_appointment])[0],
+        headers={"ETag": version_etag(updated_appointment.get("version"))},
     )
-    
-    if result.modified_count == 0:
-        raise HTTPException(status_code=404, detail="Appointment not found")
-    
-    updated_appointment = await db.appointments.find_one({"id": appointment_id})
-    # Convert string dates back to date objects
-    if 'appointment_date' in updated_appointment and isinstance(updated_appointment['appointment_date'], str):
-        updated_appointment['appointment_date'] = datetime.fromisoformat(updated_appointment['appointment_date']).date()
-    if 'created_at' in updated_appointment and isinstance(updated_appointment['created_at'], str):
-        updated_appointment['created_at'] = datetime.fromisoformat(updated_appointment['created_at'])
-    return MedicalAppointment(**updated_appointment)
 
 @api_router.delete("/appointments/{appointment_id}")
 async def delete_appointment(appointment_id: str):
     """Delete a medical appointment"""
-    result = await db.appointments.delete_one({"id": appointment_id})
-    if result.deleted_count == 0:
+    deleted = await db.appointments.find_one_and_delete(
+        {"id": appointment_id}, {"_id": 0, **{field: 1 for field in tracked_fields("appointments")}}
+    )
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Appointment not found")
+    slot_index.remove(appointment_id)
+    reminder_scheduler.remove(appointment_id)
+    await delta_sync.tombstone("appointments", appointment_id, datetime.utcnow())
+    await stats_counters.deleted("appointments", deleted)
+    await collection_versions.bump("appointments")
     return {"message": "Appointment deleted successfully"}
 
+# Doctor availability endpoints
+@api_router.get("/doctors/{doctor_name}/availability", response_model=DoctorAvailability)
+async def get_doctor_availability(doctor_name: str, day: date = Query(..., alias="date")):
+    """Get a doctor's booked and free slots for one day, from the in-memory schedule index"""
+    booked = await slot_index.booked(doctor_name, day)
+    booked_starts = {start for start, _, _ in booked}
+    available = [
+        format_time(start)
+        for opens, closes in DOCTOR_WORKING_HOURS
+        for start in range(opens, closes - APPOINTMENT_SLOT_MINUTES + 1, APPOINTMENT_SLOT_MINUTES)
+        if start not in booked_starts
+    ]
+    return DoctorAvailability(
+        doctor_name=doctor_name,
+        date=day,
+        slot_minutes=APPOINTMENT_SLOT_MINUTES,
+        booked=[format_time(start) for start in sorted(booked_starts)],
+        available=available,
+    )
+
 # Medical consultations endpoints
 @api_router.post("/consultations", response_model=MedicalConsultation)
 async def create_consultation(consultation: ConsultationCreate):
@@ -231,80 +1065,311 @@ async def create_consultation(consultation: ConsultationCreate):
     consultation_dict = consultation.dict()
     consultation_obj = MedicalConsultation(**consultation_dict)
     
-    result = await db.consultations.insert_one(consultation_obj.dict())
+    consultation_data = consultation_document(consultation_obj)
+    result = await db.consultations.insert_one(consultation_data)
+    await record_created("consultations", consultation_data)
     return consultation_obj
 
-@api_router.get("/consultations", response_model=List[MedicalConsultation])
-async def get_consultations():
-    """Get all medical consultations"""
-    consultations = await db.consultations.find().sort("consultation_date", -1).to_list(1000)
-    return [MedicalConsultation(**consultation) for consultation in consultations]
+@api_router.post("/consultations/bulk", response_model=BulkResult)
+async def bulk_consultations(request: Request):
+    """Create or update many consultations from a JSON array or an NDJSON stream.
+
+    Items with an "id" update that consultation, the others create new ones.
+    """
+    build_insert, build_update = bulk_builders(
+        MedicalConsultation, ConsultationCreate, ConsultationUpdate, consultation_document, consultation_changes
+    )
+    return await bulk_apply(
+        db.consultations, read_items(request), build_insert, build_update,
+        on_write=lambda written: record_bulk_writes("consultations", written),
+        tracked_fields=tracked_fields("consultations"),
+    )
+
+@api_router.get("/consultations", response_model=List[MedicalConsultation], dependencies=[Depends(rate_limited)])
+async def get_consultations(
+    request: Request,
+    status: Optional[str] = None,
+    doctor_name: Optional[str] = None,
+    patient_phone: Optional[str] = None,
+    consultation_type: Optional[str] = None,
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    view: str = Query("full", pattern="^(full|summary)$"),
+    fields: Optional[str] = None,
+    include_archived: bool = False,
+):
+    """Get medical consultations, newest first, one page at a time.
+
+    The cursor for the next page is returned in the X-Next-Cursor header.
+    Without limit the first page holds up to 1000 records and the following
+    ones 100.
+    Use view=summary or fields=a,b,c to receive only the listed fields.
+    Send the ETag back in If-None-Match to get an empty 304 while nothing changed.
+    Archived records are left out unless include_archived=true.
+    Each client is rate limited; over the limit the answer is 429 with Retry-After.
+    """
+    query = {k: v for k, v in {
+        "status": status,
+        "doctor_name": doctor_name,
+        "patient_phone": patient_phone,
+        "consultation_type": consultation_type,
+    }.items() if v is not None}
+    query.update(date_range_filter("consultation_date", date_from, date_to))
+
+    etag = await list_etag_for(request, "consultations")
+    if cached := not_modified(request, etag):
+        return cached
+
+    async def load_page():
+        output_fields, projection = list_view(MedicalConsultation, ConsultationSummary, view, fields, "consultation_date")
+        consultations, next_cursor = await fetch_page(list_sources("consultations", include_archived), query, "consultation_date", -1, page_limit(limit, after), after, projection)
+        return list_response(consultations, next_cursor, output_fields, etag)
+    return await shared_list_page("consultations", etag, load_page)
+
+@api_router.get("/consultations/sync", response_model=SyncResponse)
+async def sync_consultations(
+    since: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    """Consultations created, modified or deleted since a sync token.
+
+    Works like /appointments/sync.
+    """
+    return DocumentResponse(content=await sync_page("consultations", MedicalConsultation, since, limit))
 
 @api_router.get("/consultations/{consultation_id}", response_model=MedicalConsultation)
 async def get_consultation(consultation_id: str):
-    """Get a specific consultation"""
-    consultation = await db.consultations.find_one({"id": consultation_id})
+    """Get a specific consultation, archived or not"""
+    consultation = await find_with_archive("consultations", consultation_id, model_projection(MedicalConsultation))
     if not consultation:
         raise HTTPException(status_code=404, detail="Consultation not found")
-    return MedicalConsultation(**consultation)
+    return DocumentResponse(content=consultation)
+
+# Patient endpoints
+class PatientProfile(BaseModel):
+    phone: str  # E.164
+    patient_name: Optional[str] = None  # latest name given
+    names: List[str] = []
+    first_seen: Optional[datetime] = None
+    last_seen: Optional[datetime] = None
+    records: dict = {}  # collection -> records created
+
+class PatientHistoryEntry(BaseModel):
+    type: str  # appointment, consultation or emergency
+    at: datetime
+    id: str
+    record: dict
+
+# Record collection -> model of the history entry's record
+PATIENT_HISTORY_MODELS = {
+    "appointments": MedicalAppointment,
+    "consultations": MedicalConsultation,
+    "emergencies": EmergencyReport,
+}
+
+def patient_phone_key(phone: str) -> str:
+    phone_key = normalize_phone(phone, PATIENT_COUNTRY_CODE)
+    if phone_key is None:
+        raise HTTPException(status_code=400, detail="Invalid phone number")
+    return phone_key
+
+@api_router.get("/patients/{phone}", response_model=PatientProfile)
+async def get_patient(phone: str):
+    """Profile of the patient with a phone number, written in any format"""
+    profile = await patient_directory.get(patient_phone_key(phone))
+    if not profile:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    return DocumentResponse(content=profile)
+
+@api_router.get("/patients/{phone}/history", response_model=List[PatientHistoryEntry])
+async def get_patient_history(
+    phone: str,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    include_archived: bool = True,
+):
+    """Appointments, consultations and emergencies of a phone number, newest first.
+
+    Entries are ordered by appointment_date, consultation_date or timestamp
+    and read in one aggregation. The cursor for the next page is returned in
+    the X-Next-Cursor header. Archived records are included unless
+    include_archived=false.
+    """
+    phone_key = patient_phone_key(phone)
+    keyset = decode_cursor(after) if after else None
+    if keyset and not isinstance(keyset[0], datetime):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    sources = {
+        name: [name, archive_collection(name)] if include_archived else [name]
+        for name in PATIENT_SOURCES
+    }
+    projections = {name: model_projection(model) for name, model in PATIENT_HISTORY_MODELS.items()}
+    pipeline = history_pipeline(phone_key, limit + 1, keyset, projections, sources)
+    entries = await db[next(iter(sources))].aggregate(pipeline).to_list(limit + 1)
+
+    headers = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        headers = {"X-Next-Cursor": encode_cursor(entries[-1]["at"], entries[-1]["id"])}
+    from_storage_dates([entry["record"] for entry in entries if entry["type"] == "appointment"])
+    return DocumentResponse(content=entries, headers=headers)
 
 # Health tips endpoints
 @api_router.get("/health-tips", response_model=List[HealthTip])
-async def get_health_tips():
-    """Get all health tips"""
-    # Return static health tips for now
-    static_tips = [
-        {
-            "id": "tip-1",
-            "title": "Hidratación Diaria",
-            "content": "Bebe al menos 8 vasos de agua al día para mantener tu cuerpo hidratado y ayudar a tu organismo a funcionar correctamente.",
-            "category": "Nutrición",
-            "image_url": "",
-            "is_active": True
-        },
-        {
-            "id": "tip-2", 
-            "title": "Ejercicio Regular",
-            "content": "Realiza al menos 30 minutos de actividad física moderada 5 días a la semana para mantener un corazón saludable.",
-            "category": "Ejercicio",
-            "image_url": "",
-            "is_active": True
-        },
-        {
-            "id": "tip-3",
-            "title": "Descanso Adecuado",
-            "content": "Duerme entre 7-9 horas cada noche para permitir que tu cuerpo se recupere y tu mente se regenere.",
-            "category": "Descanso",
-            "image_url": "",
-            "is_active": True
-        },
-        {
-            "id": "tip-4",
-            "title": "Alimentación Balanceada",
-            "content": "Incluye frutas, verduras, proteínas magras y granos enteros en tu dieta diaria para obtener todos los nutrientes necesarios.",
-            "category": "Nutrición",
-            "image_url": "",
-            "is_active": True
-        },
-        {
-            "id": "tip-5",
-            "title": "Chequeos Médicos",
-            "content": "Realiza chequeos médicos regulares para detectar problemas de salud a tiempo y mantener un historial médico actualizado.",
-            "category": "Prevención",
-            "image_url": "",
-            "is_active": True
-        },
-        {
-            "id": "tip-6",
-            "title": "Manejo del Estrés",
-            "content": "Practica técnicas de relajación como meditación, yoga o respiración profunda para reducir el estrés diario.",
-            "category": "Bienestar Mental",
-            "image_url": "",
-            "is_active": True
-        }
+async def get_health_tips(request: Request, category: Optional[str] = None):
+    """Get active health tips, optionally only one category.
+
+    Served from the in-process catalog cache with an ETag, so clients
+    revalidating with If-None-Match get an empty 304 when nothing changed.
+    """
+    body, etag = await health_tips_catalog.get(category)
+    return cached_response(request, body, etag, f"public, max-age={HEALTH_TIPS_MAX_AGE}")
+
+@api_router.post("/health-tips", response_model=HealthTip)
+async def create_health_tip(tip: HealthTipCreate):
+    """Add a health tip to the catalog"""
+    tip_obj = HealthTip(**tip.dict())
+    await db.health_tips.insert_one(tip_obj.dict())
+    health_tips_catalog.invalidate()
+    return tip_obj
+
+@api_router.put("/health-tips/{tip_id}", response_model=HealthTip)
+async def update_health_tip(tip_id: str, tip_update: HealthTipUpdate):
+    """Edit a health tip"""
+    update_data = {k: v for k, v in tip_update.dict().items() if v is not None}
+    if update_data:
+        result = await db.health_tips.update_one({"id": tip_id}, {"$set": update_data})
+        if result.matched_count == 0:
+            raise HTTPException(status_code=404, detail="Health tip not found")
+    health_tips_catalog.invalidate()
+    tip = await db.health_tips.find_one({"id": tip_id})
+    if not tip:
+        raise HTTPException(status_code=404, detail="Health tip not found")
+    return HealthTip(**tip)
+
+@api_router.delete("/health-tips/{tip_id}")
+async def delete_health_tip(tip_id: str):
+    """Remove a health tip from the catalog.
+
+    The tip is deactivated rather than deleted, so the default tips seeded on
+    startup are not inserted again. PUT with is_active=true restores it.
+    """
+    result = await db.health_tips.update_one({"id": tip_id}, {"$set": {"is_active": False}})
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Health tip not found")
+    health_tips_catalog.invalidate()
+    return {"message": "Health tip deleted successfully"}
+
+# Search endpoint
+class SearchResult(BaseModel):
+    type: str  # consultation, appointment, emergency
+    score: float
+    record: dict
+
+SEARCH_MODELS = {
+    "consultations": MedicalConsultation,
+    "appointments": MedicalAppointment,
+    "emergencies": EmergencyReport,
+}
+
+@api_router.get("/search", response_model=List[SearchResult])
+async def search_records(
+    q: str = Query(..., min_length=2, max_length=200),
+    type: Optional[List[str]] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    after: Optional[str] = None,
+):
+    """Full-text search of consultation symptoms and diagnoses, appointment reasons
+    and notes, and emergency descriptions, best matches first.
+
+    Spanish stemming, case and accent insensitive. Quote phrases ("dolor de
+    cabeza") and prefix words with - to exclude them. type restricts the
+    search to some collections (consultations, appointments, emergencies,
+    repeatable). The next page cursor is returned in X-Next-Cursor.
+    """
+    collections = type or list(SEARCH_FIELDS)
+    unknown = set(collections) - set(SEARCH_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown search types: {', '.join(sorted(unknown))}")
+    keyset = None
+    if after:
+        keyset = decode_cursor(after)
+        if not isinstance(keyset[0], (int, float)):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    async def search(name: str):
+        pipeline = text_search_pipeline(q, limit + 1, keyset, model_projection(SEARCH_MODELS[name]))
+        return name, await db[name].aggregate(pipeline).to_list(limit + 1)
+
+    results = dict(await asyncio.gather(*(search(name) for name in dict.fromkeys(collections))))
+    page, more = merge_ranked(results, limit)
+
+    content = []
+    for name, document in page:
+        score = document.pop("_score")
+        if name == "appointments":
+            document = from_storage_dates([document])[0]
+        content.append({"type": SEARCH_FIELDS[name][0], "score": score, "record": document})
+    headers = None
+    if more:
+        _, last = page[-1]
+        headers = {"X-Next-Cursor": encode_cursor(content[-1]["score"], last["id"])}
+    return DocumentResponse(content=content, headers=headers)
+
+# Dashboard statistics endpoint
+@api_router.get("/stats")
+async def get_stats(
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+):
+    """Record counts per collection: total and by status, specialty, doctor, type and day.
+
+    Served from counters maintained on every write, so the cost does not grow
+    with the collections. from/to limit the "day" breakdown.
+    """
+    return await stats_counters.snapshot(date_from, date_to)
+
+# Exports
+# Exported collection -> (model giving the columns, date field of the from/to filter)
+EXPORT_SOURCES = {
+    "appointments": (MedicalAppointment, "appointment_date"),
+    "consultations": (MedicalConsultation, "consultation_date"),
+    "emergencies": (EmergencyReport, "timestamp"),
+}
+
+@api_router.get("/export/{collection_name}")
+async def export_collection(
+    collection_name: str,
+    export_format: str = Query("ndjson", alias="format", pattern="^(csv|ndjson|parquet)$"),
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    include_archived: bool = False,
+):
+    """Stream every appointment, consultation or emergency as CSV, NDJSON or Parquet.
+
+    Records are ordered by date (appointment_date, consultation_date or
+    timestamp), limited to [from, to] when given; archived records follow
+    the others when include_archived=true. The response is streamed, so it
+    has no size limit and no Content-Length.
+    """
+    if collection_name not in EXPORT_SOURCES:
+        raise HTTPException(status_code=404, detail="Unknown collection")
+    if export_format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+    model, date_field = EXPORT_SOURCES[collection_name]
+    query = date_range_filter(date_field, date_from, date_to)
+    cursors = [
+        collection.find(query, model_projection(model)).sort([(date_field, 1), ("id", 1)])
+        for collection in list_sources(collection_name, include_archived)
     ]
-    
-    return [HealthTip(**tip) for tip in static_tips]
+    media_type, _ = EXPORT_FORMATS[export_format]
+    return StreamingResponse(
+        stream_export(cursors, column_kinds(model), export_format, EXPORT_BATCH_SIZE),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(collection_name, export_format)}"'},
+    )
 
 # Root endpoint
 @api_router.get("/")
@@ -313,19 +1378,35 @@ async def root():
 
 # Health check endpoint
 @api_router.get("/health")
-async def health_check():
-    return {"status": "healthy", "timestamp": datetime.utcnow()}
-
-# Include the router in the main app
-app.include_router(api_router)
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=["*"],
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+async def health_check(deep: bool = False):
+    """Liveness check. With deep=true also pings MongoDB and reports connection pool usage."""
+    if not deep:
+        return {"status": "healthy", "timestamp": datetime.utcnow()}
+
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(client.admin.command("ping"), HEALTH_PING_TIMEOUT)
+        mongo = {"status": "ok"}
+    except asyncio.TimeoutError:
+        mongo = {"status": "error", "error": f"ping timed out after {HEALTH_PING_TIMEOUT}s"}
+    except Exception as e:
+        mongo = {"status": "error", "error": str(e)}
+    mongo["ping_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    mongo["max_pool_size"] = client.options.pool_options.max_pool_size
+    mongo["pools"] = metrics.pool_stats()
+
+    content = {
+        "status": "healthy" if mongo["status"] == "ok" else "unhealthy",
+        "timestamp": datetime.utcnow(),
+        "mongodb": mongo,
+    }
+    return JSONResponse(content=jsonable_encoder(content), status_code=200 if mongo["status"] == "ok" else 503)
+
+# Metrics endpoint
+@api_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Request and MongoDB metrics in the Prometheus text format"""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
 
 # Configure logging
 logging.basicConfig(
@@ -334,6 +1415,102 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+def bind_database(database):
+    """Point the API, and the caches kept over its collections, at a database"""
+    global db, health_tips_catalog, slot_index, notification_outbox, stats_counters, collection_versions, delta_sync, archiver
+    global rate_limiter, list_versions, list_pages, triage_queue, patient_directory, reminder_scheduler
+    db = database
+    reminder_scheduler = ReminderScheduler(
+        db.appointments, db.reminder_leases, send_reminder, REMINDER_LEAD_MINUTES, APPOINTMENT_TIMEZONE, REMINDER_RELOAD_SECONDS
+    )
+    patient_directory = PatientDirectory(db.patients)
+    triage_queue = TriageQueue(db.emergencies, TRIAGE_RULES, TRIAGE_DEFAULT_SEVERITY, TRIAGE_AGING_PER_MINUTE)
+    rate_limiter = RateLimiter(RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST) if RATE_LIMIT_PER_SECOND > 0 else None
+    list_versions = Coalescer("list_versions")
+    list_pages = Coalescer("list_pages", LIST_CACHE_SECONDS)
+    delta_sync = DeltaSync(db.tombstones, SYNC_OVERLAP_SECONDS)
+    archiver = Archiver(db, ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, on_archived=record_archived)
+    stats_counters = StatsCounters(db.stats)
+    collection_versions = CollectionVersions(db.collection_versions)
+    health_tips_catalog = HealthTipsCatalog(db.health_tips, HEALTH_TIPS_CACHE_TTL)
+    slot_index = SlotIndex(db.appointments, APPOINTMENT_SLOT_MINUTES, SLOT_CACHE_SECONDS)
+    notification_outbox = NotificationOutbox(
+        db.notification_outbox,
+        load_sender(NOTIFICATION_SENDER),
+        workers=NOTIFICATION_WORKERS,
+        batch_size=NOTIFICATION_BATCH_SIZE,
+        max_attempts=NOTIFICATION_MAX_ATTEMPTS,
+    )
+
+def connect():
+    """Create this process's MongoDB client from MONGO_URL, DB_NAME and the MONGO_* pool settings"""
+    global client
+    client = create_client(event_listeners=[metrics.CommandMetrics(), metrics.PoolMetrics()])
+    bind_database(client[os.environ['DB_NAME']])
+
+async def prepare_db():
+    await ensure_indexes(db)
+    await health_tips_catalog.seed()
+    await slot_index.warm(date.today())
+    await triage_queue.rebuild()
+    if REMINDER_LEAD_MINUTES:
+        await reminder_scheduler.reload()
+    if QUERY_PLAN_CHECK in ("warn", "strict"):
+        await check_query_plans(db, strict=QUERY_PLAN_CHECK == "strict")
+
+def start_background_tasks():
+    notification_outbox.start()
+    if TRIAGE_REBUILD_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(triage_queue.run(TRIAGE_REBUILD_SECONDS)))
+    if REMINDER_LEAD_MINUTES:
+        background_tasks.append(asyncio.create_task(reminder_scheduler.run()))
+    if ARCHIVE_INTERVAL_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(archiver.run(ARCHIVE_INTERVAL_SECONDS)))
+    if EMERGENCY_EVENTS_SOURCE == "changestream":
+        background_tasks.append(asyncio.create_task(
+            watch_changes(db.emergencies, emergency_events, emergency_change_event)
+        ))
+
+async def stop_background_tasks():
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    await notification_outbox.stop()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Per-worker startup and shutdown: runs in every process after it is forked"""
+    connect()
+    try:
+        await prepare_db()
+        start_background_tasks()
+        logger.info(f"Worker {os.getpid()} ready, MongoDB pool max {client.options.pool_options.max_pool_size}")
+        yield
+    finally:
+        await stop_background_tasks()
+        client.close()
+
+def create_app() -> FastAPI:
+    """Application factory (uvicorn server:create_app --factory, or the module-level app)"""
+    app = FastAPI(title="Salud al Paso API", version="1.0.0", lifespan=lifespan)
+
+    # Include the router in the main app
+    app.include_router(api_router)
+
+    # Innermost, so the metrics record compressed sizes
+    app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
+
+    app.add_middleware(metrics.MetricsMiddleware)
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=["*"],
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "ETag"],
+    )
+    return app
+
+app = create_app()
\ No newline at end of file
@@ -0,0 +1,186 @@
+"""Dashboard statistics kept as incrementally maintained counter documents.
+
+Every write to appointments, consultations or emergencies turns the record
+before and after the change into bucket keys (total, status, doctor, day,
+...) and applies the difference with $inc upserts on the stats collection,
+one document per (collection, dimension, key). Reading the statistics
+therefore costs one scan of a small collection whose size depends on the
+number of distinct statuses, doctors and days, not on the number of records.
+
+Archiving a record moves it without changing the counters: the statistics
+cover hot and archived records alike.
+
+Counters are updated after the record write, outside a transaction, so a
+crash between the two leaves them slightly off; rebuild() recounts
+everything with an aggregation (python manage.py rebuild-stats).
+"""
+from collections import Counter
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from archive import archive_collection
+
+# Counted dimensions per collection: dimension name -> record field.
+# "day" buckets use the date part of the field.
+DIMENSIONS: Dict[str, Dict[str, str]] = {
+    "appointments": {
+        "status": "status",
+        "specialty": "specialty",
+        "doctor": "doctor_name",
+        "day": "appointment_date",
+    },
+    "consultations": {
+        "status": "status",
+        "consultation_type": "consultation_type",
+        "doctor": "doctor_name",
+        "day": "consultation_date",
+    },
+    "emergencies": {
+        "status": "status",
+        "emergency_type": "emergency_type",
+        "day": "timestamp",
+    },
+}
+
+
+def tracked_fields(collection_name: str) -> Tuple[str, ...]:
+    """Record fields that affect the counters of a collection"""
+    return tuple(DIMENSIONS[collection_name].values())
+
+
+def _day_key(value) -> Optional[str]:
+    if isinstance(value, (datetime, date)):
+        return value.strftime("%Y-%m-%d")
+    if isinstance(value, str) and value:
+        return value[:10]
+    return None
+
+
+def buckets(collection_name: str, record: Optional[dict]) -> List[Tuple[str, str]]:
+    """(dimension, key) pairs a record is counted in"""
+    if not record:
+        return []
+    keys = [("total", "all")]
+    for dimension, field in DIMENSIONS[collection_name].items():
+        value = record.get(field)
+        key = _day_key(value) if dimension == "day" else value
+        if key is not None:
+            keys.append((dimension, str(key)))
+    return keys
+
+
+def _bucket_id(collection_name: str, dimension: str, key: str) -> str:
+    return f"{collection_name}|{dimension}|{key}"
+
+
+class StatsCounters:
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def record(self, collection_name: str, changes: Iterable[Tuple[Optional[dict], Optional[dict]]]):
+        """Apply (before, after) record pairs: before None for creates, after None for deletes"""
+        delta = Counter()
+        for before, after in changes:
+            delta.update(buckets(collection_name, after))
+            delta.subtract(buckets(collection_name, before))
+        operations = [
+            UpdateOne(
+                {"_id": _bucket_id(collection_name, dimension, key)},
+                {"$inc": {"count": amount},
+                 "$setOnInsert": {"collection": collection_name, "dimension": dimension, "key": key}},
+                upsert=True,
+            )
+            for (dimension, key), amount in delta.items()
+            if amount
+        ]
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+
+    async def created(self, collection_name: str, record: dict):
+        await self.record(collection_name, [(None, record)])
+
+    async def updated(self, collection_name: str, before: dict, changes: dict):
+        await self.record(collection_name, [(before, {**before, **changes})])
+
+    async def deleted(self, collection_name: str, record: dict):
+        await self.record(collection_name, [(record, None)])
+
+    async def snapshot(self, day_from: Optional[date] = None, day_to: Optional[date] = None) -> dict:
+        """{collection: {"total": n, dimension: {key: count}}}, days limited to [day_from, day_to]"""
+        days = {}
+        if day_from:
+            days["$gte"] = day_from.isoformat()
+        if day_to:
+            days["$lte"] = day_to.isoformat()
+        query = {"$or": [{"dimension": {"$ne": "day"}}, {"dimension": "day", "key": days}]} if days else {}
+
+        result = {
+            name: {"total": 0, **{dimension: {} for dimension in dimensions}}
+            for name, dimensions in DIMENSIONS.items()
+        }
+        async for bucket in self.collection.find(query, {"_id": 0}):
+            if bucket["count"] <= 0 or bucket["collection"] not in result:
+                continue
+            if bucket["dimension"] == "total":
+                result[bucket["collection"]]["total"] = bucket["count"]
+            else:
+                result[bucket["collection"]].setdefault(bucket["dimension"], {})[bucket["key"]] = bucket["count"]
+        for collection_stats in result.values():
+            if "day" in collection_stats:
+                collection_stats["day"] = dict(sorted(collection_stats["day"].items()))
+        return result
+
+    async def rebuild(self, db) -> int:
+        """Recount every bucket from the records with one aggregation per collection.
+
+        Writes made while the rebuild runs may be counted twice or not at all;
+        run it when traffic is low. Returns the number of buckets written.
+        """
+        written = 0
+        for collection_name, dimensions in DIMENSIONS.items():
+            facets = {"total": [{"$group": {"_id": "all", "count": {"$sum": 1}}}]}
+            for dimension, field in dimensions.items():
+                key = _day_expression(f"${field}") if dimension == "day" else f"${field}"
+                facets[dimension] = [
+                    {"$group": {"_id": key, "count": {"$sum": 1}}},
+                    {"$match": {"_id": {"$ne": None}}},
+                ]
+            counts = Counter()
+            # Archived records are still counted
+            for source in (collection_name, archive_collection(collection_name)):
+                facet = (await db[source].aggregate([{"$facet": facets}]).to_list(1))[0]
+                for dimension, groups in facet.items():
+                    counts.update({(dimension, str(group["_id"])): group["count"] for group in groups})
+
+            bucket_ids = []
+            operations = []
+            for (dimension, key), count in counts.items():
+                bucket_id = _bucket_id(collection_name, dimension, key)
+                bucket_ids.append(bucket_id)
+                operations.append(UpdateOne(
+                    {"_id": bucket_id},
+                    {"$set": {"collection": collection_name, "dimension": dimension, "key": key, "count": count}},
+                    upsert=True,
+                ))
+            if operations:
+                await self.collection.bulk_write(operations, ordered=False)
+            await self.collection.delete_many({"collection": collection_name, "_id": {"$nin": bucket_ids}})
+            written += len(operations)
+        return written
+
+
+def _day_expression(field: str) -> dict:
+    """YYYY-MM-DD of a BSON date, or the first ten characters of a legacy ISO string"""
+    return {
+        "$switch": {
+            "branches": [
+                {"case": {"$eq": [{"$type": field}, "date"]},
+                 "then": {"$dateToString": {"format": "%Y-%m-%d", "date": field}}},
+                {"case": {"$eq": [{"$type": field}, "string"]},
+                 "then": {"$substrCP": [field, 0, 10]}},
+            ],
+            "default": None,
+        }
+    }
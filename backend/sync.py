@@ -0,0 +1,135 @@
+"""Delta sync: changes to a collection since a client-held token.
+
+Every write stamps records with updated_at and deletions leave a tombstone
+(collection, id, updated_at) in the tombstones collection. A sync walks
+both in (updated_at, id) order, one page at a time.
+
+Timestamps come from the application clocks and a write may commit a
+little after its updated_at, so the token handed out at the end of a sync
+starts SYNC_OVERLAP_SECONDS before the sync began. The next sync therefore repeats
+the changes of that window; clients apply changes by id, so repeats are
+harmless. Tombstones expire after the retention period; a token older than
+that cannot be trusted and is answered with 410 so the client resyncs from
+scratch.
+"""
+import base64
+import heapq
+import json
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from pymongo import ASCENDING
+
+TOMBSTONE_RETENTION_DAYS = 90
+
+
+class SyncTokenError(ValueError):
+    """Token that cannot be decoded"""
+
+
+class SyncTokenExpired(Exception):
+    """Token older than the tombstone retention"""
+
+
+def _encode_time(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _decode_time(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+def encode_token(since: Optional[datetime], started: Optional[datetime] = None,
+                 after: Optional[Tuple[datetime, str]] = None) -> str:
+    """since: lower bound on updated_at; started/after: sync in progress and the last key sent"""
+    raw = {"t": _encode_time(since)}
+    if started:
+        raw["s"] = _encode_time(started)
+        raw["k"] = [_encode_time(after[0]), after[1]]
+    data = json.dumps(raw, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_token(token: str) -> Tuple[Optional[datetime], Optional[datetime], Optional[Tuple[datetime, str]]]:
+    try:
+        raw = json.loads(base64.urlsafe_b64decode((token + "=" * (-len(token) % 4)).encode()))
+        since = _decode_time(raw.get("t"))
+        started = _decode_time(raw.get("s"))
+        after = None
+        if started:
+            after = (_decode_time(raw["k"][0]), str(raw["k"][1]))
+        return since, started, after
+    except (ValueError, TypeError, KeyError, IndexError, AttributeError):
+        raise SyncTokenError("Invalid sync token")
+
+
+def _range_filter(since: Optional[datetime], after: Optional[Tuple[datetime, str]]) -> dict:
+    conditions = []
+    if since:
+        conditions.append({"updated_at": {"$gte": since}})
+    if after and after[0] == datetime.min:
+        # The last key sent was a record without updated_at; those sort first
+        # (null or missing) and are paged by id alone
+        conditions.append({"$or": [
+            {"updated_at": {"$ne": None}},
+            {"updated_at": None, "id": {"$gt": after[1]}},
+        ]})
+    elif after:
+        conditions.append({"$or": [
+            {"updated_at": {"$gt": after[0]}},
+            {"updated_at": after[0], "id": {"$gt": after[1]}},
+        ]})
+    if not conditions:
+        return {}
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+class DeltaSync:
+    def __init__(self, tombstones, overlap_seconds: float = 30, retention_days: int = TOMBSTONE_RETENTION_DAYS):
+        self.tombstones = tombstones
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self.retention = timedelta(days=retention_days)
+
+    async def tombstone(self, collection_name: str, record_id: str, when: datetime):
+        await self.tombstones.insert_one({"collection": collection_name, "id": record_id, "updated_at": when})
+
+    async def changes(self, collection, collection_name: str, token: Optional[str], limit: int,
+                      projection: dict) -> Tuple[List[dict], List[str], str, bool]:
+        """One page of changes: (changed records, deleted ids, next token, more pages follow)"""
+        now = datetime.utcnow()
+        since, started, after = decode_token(token) if token else (None, None, None)
+        if since and since < now - self.retention:
+            raise SyncTokenExpired()
+        started = started or now
+
+        query = _range_filter(since, after)
+        sort = [("updated_at", ASCENDING), ("id", ASCENDING)]
+        records = await collection.find(query, {**projection, "updated_at": 1}).sort(sort).to_list(limit + 1)
+        deleted = []
+        if since:
+            # A first sync has nothing cached to delete
+            deleted = await self.tombstones.find(
+                {"collection": collection_name, **query}, {"_id": 0, "id": 1, "updated_at": 1}
+            ).sort(sort).to_list(limit + 1)
+
+        merged = heapq.merge(
+            # Records from before delta sync sort first until backfill-updated-at stamps them
+            ((record.get("updated_at") or datetime.min, record["id"], False, record) for record in records),
+            ((tombstone["updated_at"], tombstone["id"], True, tombstone) for tombstone in deleted),
+            key=lambda entry: (entry[0], entry[1]),
+        )
+        changed, deleted_ids, last, more = [], [], None, False
+        for updated_at, record_id, is_tombstone, document in merged:
+            if len(changed) + len(deleted_ids) == limit:
+                more = True
+                break
+            if is_tombstone:
+                deleted_ids.append(record_id)
+            else:
+                document.pop("updated_at", None)
+                changed.append(document)
+            last = (updated_at, record_id)
+
+        if more:
+            return changed, deleted_ids, encode_token(since, started, last), True
+        return changed, deleted_ids, encode_token(started - self.overlap), False
@@ -0,0 +1,196 @@
+"""Emergency triage: severity scores and the dispatch priority queue.
+
+A report's severity comes from its emergency_type (TRIAGE_RULES) when it is
+created. Its priority grows while it waits:
+
+    priority = severity + aging_per_minute * minutes since the report
+
+Every waiting report gains priority at the same rate, so their order never
+changes with time. The heap key is therefore fixed when a report is queued:
+aging_per_minute * report minute - severity, smallest first.
+
+Each worker keeps its own heap of pending emergencies, built from MongoDB
+on startup and rebuilt periodically, and updated directly by this worker's
+creates, status changes and claims. A claim pops the top of the heap and
+moves that report from pending to in_progress with a conditional update, so
+an entry that is stale (the report was claimed or closed by another worker)
+is skipped, never handed out twice.
+"""
+import asyncio
+import heapq
+import logging
+import unicodedata
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+IN_PROGRESS = "in_progress"
+
+# Minutes are counted from a fixed naive UTC epoch, like the stored timestamps
+EPOCH = datetime(2000, 1, 1)
+
+# emergency_type -> severity, for the types offered by the app
+DEFAULT_TRIAGE_RULES = (
+    "Paro Cardíaco=100,Dificultad Respiratoria=95,Hemorragia=90,Pérdida de Conciencia=90,"
+    "Convulsiones=85,Intoxicación=75,Quemadura=70,Accidente de Tránsito=70,Accidente Laboral=65,"
+    "Caída o Fractura=55"
+)
+
+
+def normalize_type(emergency_type: str) -> str:
+    """Case and accent insensitive key: "Paro Cardíaco" and "paro cardiaco" are the same type"""
+    decomposed = unicodedata.normalize("NFKD", emergency_type or "")
+    return " ".join("".join(c for c in decomposed if not unicodedata.combining(c)).casefold().split())
+
+
+def parse_triage_rules(value: str) -> Dict[str, int]:
+    """"Paro Cardíaco=100,Hemorragia=90" -> {"paro cardiaco": 100, "hemorragia": 90}"""
+    rules = {}
+    for part in value.split(","):
+        if part.strip():
+            emergency_type, _, severity = part.partition("=")
+            try:
+                rules[normalize_type(emergency_type)] = int(severity)
+            except ValueError:
+                raise ValueError(f"Triage rule must be type=severity, got {part!r}")
+    return rules
+
+
+def _minutes(moment: datetime) -> float:
+    return (moment - EPOCH).total_seconds() / 60
+
+
+class TriageQueue:
+    def __init__(self, collection, rules: Dict[str, int], default_severity: int = 50, aging_per_minute: float = 1.0):
+        self.collection = collection
+        self.rules = rules
+        self.default_severity = default_severity
+        self.aging_per_minute = aging_per_minute
+        # Heap of (key, id); an entry is current only while queued[id] holds the same key
+        self._heap: List[Tuple[float, str]] = []
+        self._queued: Dict[str, float] = {}
+        # While a rebuild reads MongoDB: changes made meanwhile, id -> key or None (removed)
+        self._changes: Optional[Dict[str, Optional[float]]] = None
+
+    def severity(self, emergency_type: str) -> int:
+        return self.rules.get(normalize_type(emergency_type), self.default_severity)
+
+    def _key(self, emergency: dict) -> float:
+        severity = emergency.get("severity")
+        if severity is None:
+            severity = self.severity(emergency.get("emergency_type"))
+        return self.aging_per_minute * _minutes(emergency["timestamp"]) - severity
+
+    def priority(self, key: float, now: Optional[datetime] = None) -> float:
+        """Current priority of a queued key"""
+        return self.aging_per_minute * _minutes(now or datetime.utcnow()) - key
+
+    def __len__(self):
+        return len(self._queued)
+
+    def update(self, emergency: dict):
+        """Queue a pending emergency or drop one that is no longer pending (needs id, status, timestamp)"""
+        emergency_id = emergency["id"]
+        if emergency.get("status") != PENDING or not isinstance(emergency.get("timestamp"), datetime):
+            self.remove(emergency_id)
+            return
+        key = self._key(emergency)
+        if self._changes is not None:
+            self._changes[emergency_id] = key
+        if self._queued.get(emergency_id) != key:
+            self._queued[emergency_id] = key
+            heapq.heappush(self._heap, (key, emergency_id))
+        self._compact()
+
+    def remove(self, emergency_id: str):
+        if self._changes is not None:
+            self._changes[emergency_id] = None
+        self._queued.pop(emergency_id, None)
+
+    def _compact(self):
+        # Stale entries are skipped lazily; rebuild once they outnumber the live ones
+        if len(self._heap) > 2 * len(self._queued) + 64:
+            self._heap = [(key, emergency_id) for emergency_id, key in self._queued.items()]
+            heapq.heapify(self._heap)
+
+    def _pop(self) -> Optional[Tuple[float, str]]:
+        while self._heap:
+            key, emergency_id = heapq.heappop(self._heap)
+            if self._queued.get(emergency_id) == key:
+                self.remove(emergency_id)
+                return key, emergency_id
+        return None
+
+    def _requeue(self, emergency_id: str, key: float):
+        if emergency_id not in self._queued:
+            if self._changes is not None:
+                self._changes[emergency_id] = key
+            self._queued[emergency_id] = key
+            heapq.heappush(self._heap, (key, emergency_id))
+
+    def top(self, limit: int) -> List[Tuple[float, str]]:
+        """The limit highest priority (key, id) pairs, highest first"""
+        return heapq.nsmallest(limit, ((key, emergency_id) for emergency_id, key in self._queued.items()))
+
+    async def rebuild(self) -> int:
+        """Reload the pending emergencies from MongoDB"""
+        queued = {}
+        projection = {"_id": 0, "id": 1, "status": 1, "timestamp": 1, "severity": 1, "emergency_type": 1}
+        self._changes = {}
+        try:
+            async for emergency in self.collection.find({"status": PENDING}, projection):
+                if isinstance(emergency.get("timestamp"), datetime):
+                    queued[emergency["id"]] = self._key(emergency)
+            # This worker's own changes during the read win over what it read
+            for emergency_id, key in self._changes.items():
+                if key is None:
+                    queued.pop(emergency_id, None)
+                else:
+                    queued[emergency_id] = key
+        finally:
+            self._changes = None
+        self._queued = queued
+        self._heap = [(key, emergency_id) for emergency_id, key in queued.items()]
+        heapq.heapify(self._heap)
+        return len(queued)
+
+    async def claim(self, changes: dict, projection: dict) -> Optional[Tuple[dict, float]]:
+        """Move the highest priority pending emergency to in_progress.
+
+        Returns the emergency as it was before the update, with its queue key,
+        or None when nothing is pending. changes are $set with the status.
+        """
+        while True:
+            entry = self._pop()
+            if entry is None:
+                return None
+            key, emergency_id = entry
+            try:
+                previous = await self.collection.find_one_and_update(
+                    {"id": emergency_id, "status": PENDING},
+                    {"$set": {**changes, "status": IN_PROGRESS}, "$inc": {"version": 1}},
+                    projection=projection,
+                    return_document=ReturnDocument.BEFORE,
+                )
+            except Exception:
+                # Not claimed: keep it queued
+                self._requeue(emergency_id, key)
+                raise
+            if previous is not None:
+                return previous, key
+            # Claimed or closed by another worker since this one queued it
+
+    async def run(self, interval: float):
+        """Rebuild from MongoDB every interval seconds, picking up other workers' reports"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.rebuild()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Triage queue rebuild failed, retrying in {interval}s: {e}")
@@ -5,8 +5,11 @@ Tests all API endpoints with realistic health data
 """
 
 import requests
+import asyncio
 import json
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
+from pathlib import Path
+import sys
 import uuid
 import os
 from dotenv import load_dotenv
@@ -14,11 +17,50 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv('/app/frontend/.env')
 
+# The background workers (outbox, reminders) are tested in-process against the backend's MongoDB
+BACKEND_DIR = Path(__file__).resolve().parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+load_dotenv(BACKEND_DIR / ".env")
+
 # Get backend URL from frontend environment
 BACKEND_URL = os.getenv('EXPO_PUBLIC_BACKEND_URL', 'https://unan-health.preview.emergentagent.com')
 API_BASE_URL = f"{BACKEND_URL}/api"
 
-print(f"Testing backend API at: {API_BASE_URL}")
+# Realistic health data shared by the tests and benchmarks/load_test.py
+EMERGENCY_DATA = {
+    "patient_name": "María González",
+    "phone": "+505-8765-4321",
+    "location": {
+        "latitude": 12.1364,
+        "longitude": -86.2514,
+        "address": "Universidad Nacional Autónoma de Nicaragua, Managua"
+    },
+    "emergency_type": "Accidente cardiovascular",
+    "description": "Paciente presenta dolor en el pecho y dificultad para respirar"
+}
+
+APPOINTMENT_DATA = {
+    "patient_name": "Carlos Mendoza",
+    "patient_phone": "+505-7654-3210",
+    "doctor_name": "Dr. Ana Rodríguez",
+    "specialty": "Cardiología",
+    "appointment_date": "2025-01-20",
+    "appointment_time": "10:30",
+    "reason": "Chequeo rutinario del corazón"
+}
+
+APPOINTMENT_UPDATE_DATA = {
+    "status": "confirmed",
+    "notes": "Paciente confirmó asistencia"
+}
+
+CONSULTATION_DATA = {
+    "patient_name": "Lucía Herrera",
+    "patient_phone": "+505-5432-1098",
+    "doctor_name": "Dr. Roberto Martínez",
+    "consultation_type": "virtual",
+    "symptoms": "Dolor de cabeza persistente y mareos ocasionales"
+}
 
 class HealthAppAPITester:
     def __init__(self):
@@ -74,17 +116,7 @@ class HealthAppAPITester:
         print("\n=== Testing Emergency Endpoints ===")
         
         # Test data for emergency
-        emergency_data = {
-            "patient_name": "María González",
-            "phone": "+505-8765-4321",
-            "location": {
-                "latitude": 12.1364,
-                "longitude": -86.2514,
-                "address": "Universidad Nacional Autónoma de Nicaragua, Managua"
-            },
-            "emergency_type": "Accidente cardiovascular",
-            "description": "Paciente presenta dolor en el pecho y dificultad para respirar"
-        }
+        emergency_data = EMERGENCY_DATA
         
         # Test POST /api/emergencies
         try:
@@ -137,15 +169,7 @@ class HealthAppAPITester:
         print("\n=== Testing Medical Appointments Endpoints ===")
         
         # Test data for appointment
-        appointment_data = {
-            "patient_name": "Carlos Mendoza",
-            "patient_phone": "+505-7654-3210",
-            "doctor_name": "Dr. Ana Rodríguez",
-            "specialty": "Cardiología",
-            "appointment_date": "2025-01-20",
-            "appointment_time": "10:30",
-            "reason": "Chequeo rutinario del corazón"
-        }
+        appointment_data = APPOINTMENT_DATA
         
         appointment_id = None
         
@@ -198,10 +222,7 @@ class HealthAppAPITester:
                 self.log_test("GET /api/appointments/{id} (get specific appointment)", False, f"Error: {str(e)}")
             
             # Test PUT /api/appointments/{appointment_id}
-            update_data = {
-                "status": "confirmed",
-                "notes": "Paciente confirmó asistencia"
-            }
+            update_data = APPOINTMENT_UPDATE_DATA
             try:
                 response = self.session.put(
                     f"{API_BASE_URL}/appointments/{appointment_id}",
@@ -238,13 +259,7 @@ class HealthAppAPITester:
         print("\n=== Testing Medical Consultations Endpoints ===")
         
         # Test data for consultation
-        consultation_data = {
-            "patient_name": "Lucía Herrera",
-            "patient_phone": "+505-5432-1098",
-            "doctor_name": "Dr. Roberto Martínez",
-            "consultation_type": "virtual",
-            "symptoms": "Dolor de cabeza persistente y mareos ocasionales"
-        }
+        consultation_data = CONSULTATION_DATA
         
         consultation_id = None
         
@@ -296,6 +311,113 @@ class HealthAppAPITester:
             except Exception as e:
                 self.log_test("GET /api/consultations/{id} (get specific consultation)", False, f"Error: {str(e)}")
     
+    def test_bulk_import(self):
+        """Test bulk appointment import"""
+        print("\n=== Testing Bulk Import ===")
+        
+        appointments = [
+            {
+                "patient_name": f"Paciente Importado {i}",
+                "patient_phone": f"+505-8000-000{i}",
+                "doctor_name": "Dr. Ana Rodríguez",
+                "specialty": "Medicina General",
+                "appointment_date": "2025-02-10",
+                "appointment_time": f"{8 + i:02d}:00",
+                "reason": "Control general"
+            }
+            for i in range(3)
+        ]
+        appointments.append({"patient_name": "Incompleto"})  # Invalid item
+        
+        try:
+            response = self.session.post(f"{API_BASE_URL}/appointments/bulk", json=appointments)
+            if response.status_code == 200:
+                result = response.json()
+                if result.get("created") == 3 and result.get("failed") == 1:
+                    self.log_test("POST /api/appointments/bulk (bulk create)", True, f"Created: {result['created']}, failed: {result['failed']}")
+                    for item in result["results"]:
+                        if item["status"] == "created":
+                            self.session.delete(f"{API_BASE_URL}/appointments/{item['id']}")
+                else:
+                    self.log_test("POST /api/appointments/bulk (bulk create)", False, f"Unexpected result: {result}")
+            else:
+                self.log_test("POST /api/appointments/bulk (bulk create)", False, f"Status: {response.status_code}, Response: {response.text}")
+        except Exception as e:
+            self.log_test("POST /api/appointments/bulk (bulk create)", False, f"Error: {str(e)}")
+    
+    def test_appointment_conflicts(self):
+        """Test double-booking detection and doctor availability"""
+        print("\n=== Testing Appointment Conflicts ===")
+        
+        appointment_data = dict(APPOINTMENT_DATA, appointment_date="2025-03-03", appointment_time="09:00")
+        appointment_id = None
+        try:
+            response = self.session.post(f"{API_BASE_URL}/appointments", json=appointment_data)
+            if response.status_code == 200:
+                appointment_id = response.json()["id"]
+            response = self.session.post(f"{API_BASE_URL}/appointments", json=appointment_data)
+            if response.status_code == 409:
+                self.log_test("POST /api/appointments (double booking)", True, "Correctly returned 409 for a taken slot")
+            else:
+                self.log_test("POST /api/appointments (double booking)", False, f"Expected 409, got {response.status_code}")
+            
+            response = self.session.get(
+                f"{API_BASE_URL}/doctors/{appointment_data['doctor_name']}/availability",
+                params={"date": appointment_data["appointment_date"]}
+            )
+            availability = response.json()
+            if response.status_code == 200 and "09:00" in availability["booked"] and "09:00" not in availability["available"]:
+                self.log_test("GET /api/doctors/{name}/availability", True, f"{len(availability['available'])} free slots")
+            else:
+                self.log_test("GET /api/doctors/{name}/availability", False, f"Status: {response.status_code}, Response: {response.text}")
+            
+            response = self.session.post(f"{API_BASE_URL}/appointments", json=dict(appointment_data, appointment_time="09:10"))
+            if response.status_code == 422:
+                self.log_test("Error handling - Off-grid appointment time", True, "Correctly returned validation error")
+            else:
+                self.log_test("Error handling - Off-grid appointment time", False, f"Expected 422, got {response.status_code}")
+        except Exception as e:
+            self.log_test("Appointment conflicts", False, f"Error: {str(e)}")
+        finally:
+            if appointment_id:
+                self.session.delete(f"{API_BASE_URL}/appointments/{appointment_id}")
+    
+    def test_search_endpoint(self):
+        """Test full-text search"""
+        print("\n=== Testing Search Endpoint ===")
+        
+        try:
+            response = self.session.post(f"{API_BASE_URL}/consultations", json=CONSULTATION_DATA)
+            consultation_id = response.json().get("id")
+            # Unaccented, differently inflected query for "Dolor de cabeza persistente y mareos ocasionales"
+            response = self.session.get(f"{API_BASE_URL}/search", params={"q": "mareo cabeza", "type": "consultations"})
+            results = response.json()
+            if response.status_code == 200 and any(r["record"]["id"] == consultation_id for r in results):
+                self.log_test("GET /api/search (consultation symptoms)", True, f"{len(results)} results, top score {results[0]['score']:.2f}")
+            else:
+                self.log_test("GET /api/search (consultation symptoms)", False, f"Status: {response.status_code}, Response: {response.text[:200]}")
+        except Exception as e:
+            self.log_test("GET /api/search", False, f"Error: {str(e)}")
+    
+    def test_stats_endpoint(self):
+        """Test dashboard statistics"""
+        print("\n=== Testing Stats Endpoint ===")
+        
+        try:
+            before = self.session.get(f"{API_BASE_URL}/stats").json()
+            response = self.session.post(f"{API_BASE_URL}/emergencies", json=EMERGENCY_DATA)
+            after = self.session.get(f"{API_BASE_URL}/stats").json()
+            emergency_type = EMERGENCY_DATA["emergency_type"]
+            if (response.status_code == 200
+                    and after["emergencies"]["total"] == before["emergencies"]["total"] + 1
+                    and after["emergencies"]["emergency_type"].get(emergency_type, 0)
+                    == before["emergencies"]["emergency_type"].get(emergency_type, 0) + 1):
+                self.log_test("GET /api/stats (counters follow writes)", True, f"Emergencies: {after['emergencies']['total']}")
+            else:
+                self.log_test("GET /api/stats (counters follow writes)", False, f"Before: {before}, after: {after}")
+        except Exception as e:
+            self.log_test("GET /api/stats", False, f"Error: {str(e)}")
+    
     def test_health_tips_endpoint(self):
         """Test health tips endpoint"""
         print("\n=== Testing Health Tips Endpoint ===")
@@ -319,6 +441,480 @@ class HealthAppAPITester:
                 self.log_test("GET /api/health-tips (get health tips)", False, f"Status: {response.status_code}")
         except Exception as e:
             self.log_test("GET /api/health-tips (get health tips)", False, f"Error: {str(e)}")
+        
+        # Test conditional GET and caching headers
+        try:
+            response = self.session.get(f"{API_BASE_URL}/health-tips")
+            etag = response.headers.get("ETag")
+            revalidated = self.session.get(f"{API_BASE_URL}/health-tips", headers={"If-None-Match": etag})
+            if etag and "max-age" in response.headers.get("Cache-Control", "") and revalidated.status_code == 304:
+                self.log_test("GET /api/health-tips (If-None-Match)", True, f"304 for {etag}, Cache-Control: {response.headers['Cache-Control']}")
+            else:
+                self.log_test("GET /api/health-tips (If-None-Match)", False,
+                              f"ETag: {etag}, Cache-Control: {response.headers.get('Cache-Control')}, status: {revalidated.status_code}")
+        except Exception as e:
+            self.log_test("GET /api/health-tips (If-None-Match)", False, f"Error: {str(e)}")
+        
+        # Test the category filter and that edits show up at once (the cache of the worker that served them is dropped)
+        category = f"Prueba {uuid.uuid4()}"
+        tip_id = None
+        try:
+            etag = self.session.get(f"{API_BASE_URL}/health-tips").headers.get("ETag")
+            tip = {"title": "Lavado de Manos", "content": "Lávate las manos con agua y jabón.", "category": category}
+            tip_id = self.session.post(f"{API_BASE_URL}/health-tips", json=tip).json()["id"]
+            response = self.session.get(f"{API_BASE_URL}/health-tips", headers={"If-None-Match": etag})
+            listed = self.session.get(f"{API_BASE_URL}/health-tips", params={"category": category}).json()
+            if response.status_code == 200 and response.headers.get("ETag") != etag and [item["id"] for item in listed] == [tip_id]:
+                self.log_test("POST /api/health-tips (cache invalidated)", True, f"New ETag {response.headers.get('ETag')}, category lists only the new tip")
+            else:
+                self.log_test("POST /api/health-tips (cache invalidated)", False, f"Status: {response.status_code}, category list: {listed}")
+            
+            self.session.put(f"{API_BASE_URL}/health-tips/{tip_id}", json={"title": "Lavado de Manos Frecuente"})
+            listed = self.session.get(f"{API_BASE_URL}/health-tips", params={"category": category}).json()
+            if [item["title"] for item in listed] == ["Lavado de Manos Frecuente"]:
+                self.log_test("PUT /api/health-tips/{id} (cache invalidated)", True, "Edited title served at once")
+            else:
+                self.log_test("PUT /api/health-tips/{id} (cache invalidated)", False, f"Category list: {listed}")
+            
+            response = self.session.delete(f"{API_BASE_URL}/health-tips/{tip_id}")
+            listed = self.session.get(f"{API_BASE_URL}/health-tips", params={"category": category}).json()
+            if response.status_code == 200 and listed == []:
+                self.log_test("DELETE /api/health-tips/{id} (cache invalidated)", True, "Deleted tip no longer listed")
+            else:
+                self.log_test("DELETE /api/health-tips/{id} (cache invalidated)", False, f"Status: {response.status_code}, category list: {listed}")
+        except Exception as e:
+            self.log_test("Health tips editing", False, f"Error: {str(e)}")
+        
+        # Test that a deleted default tip stays deleted when the next worker seeds the catalog
+        from health_tips import HealthTipsCatalog
+        
+        async def reseed(collection):
+            catalog = HealthTipsCatalog(collection)
+            await catalog.seed()
+            # What DELETE /api/health-tips/tip-1 does
+            await collection.update_one({"id": "tip-1"}, {"$set": {"is_active": False}})
+            await HealthTipsCatalog(collection).seed()
+            body, _ = await HealthTipsCatalog(collection).get()
+            return json.loads(body)
+        
+        try:
+            tips = self.run_in_database(reseed, 1)
+            if tips and "tip-1" not in [tip["id"] for tip in tips]:
+                self.log_test("Health tips seed (deleted default tip)", True, f"{len(tips)} tips after reseeding")
+            else:
+                self.log_test("Health tips seed (deleted default tip)", False, f"Tips: {[tip['id'] for tip in tips]}")
+        except Exception as e:
+            self.log_test("Health tips seed (deleted default tip)", False, f"Error: {str(e)}")
+    
+    def test_list_pagination(self):
+        """Test cursor pagination and filters on list endpoints"""
+        print("\n=== Testing List Pagination ===")
+        
+        for endpoint in ["appointments", "consultations", "emergencies"]:
+            try:
+                response = self.session.get(f"{API_BASE_URL}/{endpoint}", params={"limit": 1})
+                if response.status_code != 200 or len(response.json()) > 1:
+                    self.log_test(f"GET /api/{endpoint}?limit=1 (first page)", False, f"Status: {response.status_code}")
+                    continue
+                next_cursor = response.headers.get("X-Next-Cursor")
+                if not next_cursor:
+                    self.log_test(f"GET /api/{endpoint}?limit=1 (first page)", True, "Single page, no cursor returned")
+                    continue
+                next_page = self.session.get(f"{API_BASE_URL}/{endpoint}", params={"limit": 1, "after": next_cursor})
+                first_ids = [item["id"] for item in response.json()]
+                next_ids = [item["id"] for item in next_page.json()]
+                if next_page.status_code == 200 and not set(first_ids) & set(next_ids):
+                    self.log_test(f"GET /api/{endpoint}?after=... (next page)", True, f"Next page ids: {next_ids}")
+                else:
+                    self.log_test(f"GET /api/{endpoint}?after=... (next page)", False, f"Status: {next_page.status_code}, ids: {next_ids}")
+            except Exception as e:
+                self.log_test(f"GET /api/{endpoint} (pagination)", False, f"Error: {str(e)}")
+
+        # Test that a request without limit or cursor keeps the 1000 record cap
+        try:
+            response = self.session.get(f"{API_BASE_URL}/appointments")
+            count = len(response.json())
+            if response.status_code == 200 and (count == 1000 or not response.headers.get("X-Next-Cursor")):
+                self.log_test("GET /api/appointments (no limit)", True, f"Returned {count} appointments")
+            else:
+                self.log_test("GET /api/appointments (no limit)", False, f"Status: {response.status_code}, truncated to {count}")
+        except Exception as e:
+            self.log_test("GET /api/appointments (no limit)", False, f"Error: {str(e)}")
+
+        # Test invalid cursor
+        try:
+            response = self.session.get(f"{API_BASE_URL}/appointments", params={"after": "not-a-cursor"})
+            if response.status_code == 400:
+                self.log_test("Error handling - Invalid cursor", True, "Correctly returned 400 for invalid cursor")
+            else:
+                self.log_test("Error handling - Invalid cursor", False, f"Expected 400, got {response.status_code}")
+        except Exception as e:
+            self.log_test("Error handling - Invalid cursor", False, f"Error: {str(e)}")
+    
+    def test_list_caching(self):
+        """Test conditional GET and compression on list endpoints"""
+        print("\n=== Testing List Caching ===")
+        
+        for endpoint in ["appointments", "consultations", "emergencies"]:
+            try:
+                response = self.session.get(f"{API_BASE_URL}/{endpoint}", headers={"Accept-Encoding": "gzip"})
+                etag = response.headers.get("ETag")
+                if response.status_code != 200 or not etag:
+                    self.log_test(f"GET /api/{endpoint} (ETag)", False, f"Status: {response.status_code}, ETag: {etag}")
+                    continue
+                cached = self.session.get(f"{API_BASE_URL}/{endpoint}", headers={"If-None-Match": etag})
+                if cached.status_code == 304 and not cached.content:
+                    self.log_test(f"GET /api/{endpoint} (If-None-Match)", True,
+                                  f"304 instead of {len(response.content)} bytes ({response.headers.get('Content-Encoding', 'identity')})")
+                else:
+                    self.log_test(f"GET /api/{endpoint} (If-None-Match)", False, f"Expected 304, got {cached.status_code}")
+            except Exception as e:
+                self.log_test(f"GET /api/{endpoint} (caching)", False, f"Error: {str(e)}")
+    
+    def test_archived_lists(self):
+        """Test that list endpoints can include archived records"""
+        print("\n=== Testing Archived Lists ===")
+        
+        for endpoint in ["appointments", "consultations", "emergencies"]:
+            try:
+                hot = self.session.get(f"{API_BASE_URL}/{endpoint}", params={"limit": 1000})
+                everything = self.session.get(f"{API_BASE_URL}/{endpoint}", params={"limit": 1000, "include_archived": "true"})
+                if hot.status_code == 200 and everything.status_code == 200 and len(everything.json()) >= len(hot.json()):
+                    self.log_test(f"GET /api/{endpoint}?include_archived=true", True,
+                                  f"{len(hot.json())} hot, {len(everything.json())} with archived")
+                else:
+                    self.log_test(f"GET /api/{endpoint}?include_archived=true", False,
+                                  f"Status: {hot.status_code}/{everything.status_code}")
+            except Exception as e:
+                self.log_test(f"GET /api/{endpoint}?include_archived=true", False, f"Error: {str(e)}")
+    
+    def test_delta_sync(self):
+        """Test incremental sync of appointments with tokens and tombstones"""
+        print("\n=== Testing Delta Sync ===")
+        
+        try:
+            token = None
+            while True:
+                response = self.session.get(f"{API_BASE_URL}/appointments/sync",
+                                            params={"since": token, "limit": 500} if token else {"limit": 500})
+                if response.status_code != 200:
+                    self.log_test("GET /api/appointments/sync (full)", False, f"Status: {response.status_code}")
+                    return
+                page = response.json()
+                token = page["token"]
+                if not page["has_more"]:
+                    break
+            self.log_test("GET /api/appointments/sync (full)", True, "Received a sync token")
+            
+            appointment_data = dict(APPOINTMENT_DATA, appointment_date="2025-03-04", appointment_time="10:00")
+            response = self.session.post(f"{API_BASE_URL}/appointments", json=appointment_data)
+            appointment_id = response.json()["id"]
+            self.session.delete(f"{API_BASE_URL}/appointments/{appointment_id}")
+            
+            response = self.session.get(f"{API_BASE_URL}/appointments/sync", params={"since": token})
+            page = response.json()
+            changed = [appointment["id"] for appointment in page["changed"]]
+            if response.status_code == 200 and appointment_id in page["deleted"] and appointment_id not in changed:
+                self.log_test("GET /api/appointments/sync (delta)", True,
+                              f"{len(changed)} changed, {len(page['deleted'])} deleted since the last sync")
+            else:
+                self.log_test("GET /api/appointments/sync (delta)", False, f"Status: {response.status_code}, Response: {response.text}")
+            
+            response = self.session.get(f"{API_BASE_URL}/appointments/sync", params={"since": "not-a-token"})
+            if response.status_code == 400:
+                self.log_test("Error handling - Invalid sync token", True, "Correctly returned 400")
+            else:
+                self.log_test("Error handling - Invalid sync token", False, f"Expected 400, got {response.status_code}")
+        except Exception as e:
+            self.log_test("GET /api/appointments/sync", False, f"Error: {str(e)}")
+    
+    def test_rate_limiting(self):
+        """Test that a client polling a list endpoint too fast gets 429, whatever X-Client-Id it sends"""
+        print("\n=== Testing Rate Limiting ===")
+        
+        try:
+            for attempt in range(1, 201):
+                headers = {"X-Client-Id": f"backend-test-{uuid.uuid4()}"}
+                response = self.session.get(f"{API_BASE_URL}/emergencies", params={"limit": 1}, headers=headers)
+                if response.status_code != 200:
+                    break
+            if response.status_code == 429 and response.headers.get("Retry-After"):
+                self.log_test("GET /api/emergencies (rate limit)", True,
+                              f"429 after {attempt} requests, Retry-After {response.headers['Retry-After']}s")
+            elif response.status_code == 200:
+                # RATE_LIMIT_PER_SECOND defaults to 0 until the deployment sets FORWARDED_ALLOW_IPS
+                self.log_test("GET /api/emergencies (rate limit)", True, "Not limited: rate limiting is disabled on this deployment")
+            else:
+                self.log_test("GET /api/emergencies (rate limit)", False, f"Last status: {response.status_code}")
+        except Exception as e:
+            self.log_test("GET /api/emergencies (rate limit)", False, f"Error: {str(e)}")
+        
+        # In-process, so it runs whether or not the deployment enables the limit
+        try:
+            from starlette.requests import Request
+            from rate_limit import RateLimiter
+            from server import client_key
+            
+            def request_from(host, client_id):
+                return Request({
+                    "type": "http", "method": "GET", "path": "/api/emergencies", "client": (host, 50000),
+                    "headers": [(b"x-client-id", client_id.encode())], "query_string": f"phone={client_id}".encode(),
+                })
+            
+            limiter = RateLimiter(rate=10, burst=40)
+            waits = [limiter.acquire(client_key(request_from("203.0.113.7", str(uuid.uuid4()))), now=0.0) for _ in range(41)]
+            other = limiter.acquire(client_key(request_from("203.0.113.8", str(uuid.uuid4()))), now=0.0)
+            if waits.count(0.0) == 40 and waits[-1] > 0 and other == 0.0:
+                self.log_test("Rate limit key (rotating X-Client-Id)", True, f"Refused after the burst of 40, wait {waits[-1]:.1f}s")
+            else:
+                self.log_test("Rate limit key (rotating X-Client-Id)", False, f"Allowed {waits.count(0.0)} of 41, other address wait {other}")
+        except Exception as e:
+            self.log_test("Rate limit key (rotating X-Client-Id)", False, f"Error: {str(e)}")
+    
+    def test_export(self):
+        """Test streaming exports in CSV and NDJSON"""
+        print("\n=== Testing Export ===")
+        
+        for export_format in ["csv", "ndjson"]:
+            try:
+                response = self.session.get(f"{API_BASE_URL}/export/appointments", params={"format": export_format}, stream=True)
+                lines = [line for line in response.iter_lines() if line]
+                if export_format == "csv":
+                    valid = bool(lines) and lines[0].decode().startswith("id,patient_name")
+                else:
+                    valid = all(json.loads(line).get("id") for line in lines)
+                if response.status_code == 200 and valid:
+                    self.log_test(f"GET /api/export/appointments?format={export_format}", True, f"{len(lines)} lines")
+                else:
+                    self.log_test(f"GET /api/export/appointments?format={export_format}", False, f"Status: {response.status_code}")
+            except Exception as e:
+                self.log_test(f"GET /api/export/appointments?format={export_format}", False, f"Error: {str(e)}")
+        
+        try:
+            response = self.session.get(f"{API_BASE_URL}/export/patients")
+            if response.status_code == 404:
+                self.log_test("Error handling - Unknown export collection", True, "Correctly returned 404")
+            else:
+                self.log_test("Error handling - Unknown export collection", False, f"Expected 404, got {response.status_code}")
+        except Exception as e:
+            self.log_test("Error handling - Unknown export collection", False, f"Error: {str(e)}")
+    
+    def test_emergency_queue(self):
+        """Test the triage queue and claiming the next emergency"""
+        print("\n=== Testing Emergency Queue ===")
+        
+        emergency_id = None
+        try:
+            response = self.session.post(f"{API_BASE_URL}/emergencies", json=dict(EMERGENCY_DATA, emergency_type="Paro Cardíaco"))
+            emergency_id = response.json()["id"]
+            response = self.session.get(f"{API_BASE_URL}/emergencies/queue", params={"limit": 1000})
+            queue = response.json()
+            priorities = [item["priority"] for item in queue]
+            queued_ids = [item["id"] for item in queue]
+            if (response.status_code == 200 and emergency_id in queued_ids
+                    and priorities == sorted(priorities, reverse=True)):
+                self.log_test("GET /api/emergencies/queue", True, f"{len(queue)} pending, top priority {priorities[0]}")
+            else:
+                self.log_test("GET /api/emergencies/queue", False, f"Status: {response.status_code}, Response: {response.text}")
+            
+            # Paro Cardíaco has the top severity, but older reports gain priority while they wait;
+            # never claim one of those, it may be a real emergency
+            if emergency_id in queued_ids and queued_ids[0] != emergency_id:
+                self.log_test("POST /api/emergencies/queue/claim", True,
+                              f"Not claimed: {queued_ids.index(emergency_id)} older reports come first")
+            else:
+                response = self.session.post(f"{API_BASE_URL}/emergencies/queue/claim", params={"dispatcher": "backend-test"})
+                claimed = response.json() if response.status_code == 200 else {}
+                if claimed.get("id") == emergency_id and claimed.get("status") == "in_progress":
+                    self.log_test("POST /api/emergencies/queue/claim", True, f"Claimed {claimed['emergency_type']}")
+                else:
+                    self.log_test("POST /api/emergencies/queue/claim", False, f"Status: {response.status_code}, claimed: {claimed.get('id')}")
+        except Exception as e:
+            self.log_test("GET /api/emergencies/queue", False, f"Error: {str(e)}")
+        finally:
+            if emergency_id:
+                self.session.put(f"{API_BASE_URL}/emergencies/{emergency_id}", params={"status": "resolved"})
+    
+    def test_patient_history(self):
+        """Test the patient profile and history of a phone number written in several formats"""
+        print("\n=== Testing Patient History ===")
+        
+        try:
+            phone = f"8{uuid.uuid4().int % 10_000_000:07d}"
+            self.session.post(f"{API_BASE_URL}/emergencies", json=dict(EMERGENCY_DATA, phone=f"+505 {phone[:4]}-{phone[4:]}"))
+            self.session.post(f"{API_BASE_URL}/consultations", json=dict(CONSULTATION_DATA, patient_phone=f"505{phone}"))
+            response = self.session.get(f"{API_BASE_URL}/patients/{phone}")
+            if response.status_code == 200 and sum(response.json()["records"].values()) == 2:
+                self.log_test("GET /api/patients/{phone}", True, f"Profile of {response.json()['phone']}")
+            else:
+                self.log_test("GET /api/patients/{phone}", False, f"Status: {response.status_code}, Response: {response.text}")
+            
+            response = self.session.get(f"{API_BASE_URL}/patients/{phone}/history", params={"limit": 1})
+            first_page = response.json()
+            cursor = response.headers.get("X-Next-Cursor")
+            response = self.session.get(f"{API_BASE_URL}/patients/{phone}/history", params={"limit": 1, "after": cursor})
+            entries = first_page + response.json()
+            if (response.status_code == 200 and cursor and sorted(entry["type"] for entry in entries) == ["consultation", "emergency"]
+                    and entries[0]["at"] >= entries[1]["at"]):
+                self.log_test("GET /api/patients/{phone}/history", True, "Merged timeline across two pages")
+            else:
+                self.log_test("GET /api/patients/{phone}/history", False, f"Status: {response.status_code}, Entries: {entries}")
+        except Exception as e:
+            self.log_test("GET /api/patients/{phone}/history", False, f"Error: {str(e)}")
+    
+    def run_in_database(self, test, collections: int):
+        """Run the coroutine function test with throwaway collections of the backend's MongoDB, dropped afterwards"""
+        from motor.motor_asyncio import AsyncIOMotorClient
+        
+        async def run():
+            client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"), serverSelectionTimeoutMS=5000)
+            database = client[os.environ.get("DB_NAME", "test_database")]
+            scratch = [database[f"backend_test_{uuid.uuid4().hex}"] for _ in range(collections)]
+            try:
+                return await test(*scratch)
+            finally:
+                for collection in scratch:
+                    await collection.drop()
+                client.close()
+        return asyncio.run(run())
+    
+    def test_outbox_dead_letter(self):
+        """Test that a notification its sender keeps rejecting is dead-lettered after max_attempts"""
+        print("\n=== Testing Notification Dead Letters ===")
+        from notifications import DEAD, NotificationOutbox, NotificationSender, outbox_messages
+        
+        class FailingSender(NotificationSender):
+            def __init__(self):
+                self.attempts = 0
+            
+            async def send(self, messages):
+                self.attempts += len(messages)
+                return ["provider unavailable"] * len(messages)
+        
+        async def deliver(collection):
+            sender = FailingSender()
+            outbox = NotificationOutbox(collection, sender, max_attempts=3, retry_base=0)
+            await outbox.enqueue(outbox_messages("emergency_created", EMERGENCY_DATA, [("sms", EMERGENCY_DATA["phone"])]))
+            for _ in range(outbox.max_attempts):
+                await outbox.drain_once()
+            # A dead message is not claimed again
+            leftover = await outbox.drain_once()
+            return sender.attempts, leftover, await collection.find_one({}, {"_id": 0})
+        
+        try:
+            attempts, leftover, message = self.run_in_database(deliver, 1)
+            if message["status"] == DEAD and message["attempts"] == 3 and attempts == 3 and leftover == 0:
+                self.log_test("Notification outbox (dead letter)", True, f"Dead after {attempts} attempts: {message['last_error']}")
+            else:
+                self.log_test("Notification outbox (dead letter)", False,
+                              f"Status: {message['status']}, attempts: {message['attempts']}, sends: {attempts}, leftover: {leftover}")
+        except Exception as e:
+            self.log_test("Notification outbox (dead letter)", False, f"Error: {str(e)}")
+    
+    def test_reminder_fired_once(self):
+        """Test that a reminder due on two workers at once is sent by only one of them"""
+        print("\n=== Testing Appointment Reminders ===")
+        from reminders import ReminderScheduler
+        
+        async def compete(appointments, leases):
+            start = (datetime.utcnow() + timedelta(hours=2)).replace(second=0, microsecond=0)
+            await appointments.insert_one(dict(
+                APPOINTMENT_DATA,
+                id=str(uuid.uuid4()),
+                appointment_date=datetime.combine(start.date(), datetime.min.time()),
+                appointment_time=start.strftime("%H:%M"),
+                status="scheduled",
+                created_at=start - timedelta(days=1),
+            ))
+            sent = []
+            
+            async def on_due(appointment, lead_minutes):
+                sent.append((appointment["id"], lead_minutes))
+            
+            workers = [ReminderScheduler(appointments, leases, on_due, [60], reload_seconds=0) for _ in range(2)]
+            for worker in workers:
+                await worker.reload()
+            due = start - timedelta(minutes=30)
+            await asyncio.gather(*(worker.fire_due(due) for worker in workers))
+            # A worker that comes back to it later finds it fired
+            await workers[1].reload()
+            await workers[1].fire_due(due)
+            return sent, await leases.find_one({}, {"_id": 0})
+        
+        try:
+            sent, lease = self.run_in_database(compete, 2)
+            if len(sent) == 1 and lease and lease.get("result") == "sent":
+                self.log_test("Appointment reminders (two workers)", True, "Reminder sent once")
+            else:
+                self.log_test("Appointment reminders (two workers)", False, f"Sent: {sent}, lease: {lease}")
+        except Exception as e:
+            self.log_test("Appointment reminders (two workers)", False, f"Error: {str(e)}")
+    
+    def test_compressed_if_match(self):
+        """Test that the ETag of a compressed response works as If-Match"""
+        print("\n=== Testing If-Match With Compressed Responses ===")
+        
+        try:
+            # A long reason takes the response over COMPRESSION_MIN_SIZE
+            appointment = dict(APPOINTMENT_DATA, doctor_name=f"Dr. {uuid.uuid4()}", reason="Chequeo rutinario. " * 100)
+            appointment_id = self.session.post(f"{API_BASE_URL}/appointments", json=appointment).json()["id"]
+            response = self.session.get(f"{API_BASE_URL}/appointments/{appointment_id}", headers={"Accept-Encoding": "gzip"})
+            etag = response.headers.get("ETag")
+            compressed = response.headers.get("Content-Encoding") == "gzip"
+            response = self.session.put(
+                f"{API_BASE_URL}/appointments/{appointment_id}", json={"notes": "Traer exámenes"}, headers={"If-Match": etag}
+            )
+            if compressed and response.status_code == 200:
+                self.log_test("PUT /api/appointments/{id} with a compressed ETag", True, f"If-Match {etag} accepted")
+            else:
+                self.log_test("PUT /api/appointments/{id} with a compressed ETag", False,
+                              f"Compressed: {compressed}, ETag: {etag}, Status: {response.status_code}")
+            self.session.delete(f"{API_BASE_URL}/appointments/{appointment_id}")
+        except Exception as e:
+            self.log_test("PUT /api/appointments/{id} with a compressed ETag", False, f"Error: {str(e)}")
+    
+    def test_optimistic_concurrency(self):
+        """Test that updates sent with a stale If-Match get 412 and leave the record alone"""
+        print("\n=== Testing Optimistic Concurrency ===")
+        
+        for method in ["put", "patch"]:
+            name = f"{method.upper()} /api/appointments/{{id}} with a stale If-Match"
+            try:
+                appointment = dict(APPOINTMENT_DATA, doctor_name=f"Dr. {uuid.uuid4()}")
+                appointment_id = self.session.post(f"{API_BASE_URL}/appointments", json=appointment).json()["id"]
+                stale_etag = self.session.get(f"{API_BASE_URL}/appointments/{appointment_id}").headers.get("ETag")
+                first = self.session.request(
+                    method, f"{API_BASE_URL}/appointments/{appointment_id}", json={"notes": "Primer cambio"}, headers={"If-Match": stale_etag}
+                )
+                second = self.session.request(
+                    method, f"{API_BASE_URL}/appointments/{appointment_id}", json={"notes": "Segundo cambio"}, headers={"If-Match": stale_etag}
+                )
+                notes = self.session.get(f"{API_BASE_URL}/appointments/{appointment_id}").json().get("notes")
+                if first.status_code == 200 and second.status_code == 412 and notes == "Primer cambio":
+                    self.log_test(name, True, f"First update 200, stale update 412, ETag now {first.headers.get('ETag')}")
+                else:
+                    self.log_test(name, False, f"Statuses: {first.status_code}, {second.status_code}, notes: {notes}")
+                self.session.delete(f"{API_BASE_URL}/appointments/{appointment_id}")
+            except Exception as e:
+                self.log_test(name, False, f"Error: {str(e)}")
+        
+        for method in ["put", "patch"]:
+            name = f"{method.upper()} /api/emergencies/{{id}} with a stale If-Match"
+            try:
+                emergency_id = self.session.post(f"{API_BASE_URL}/emergencies", json=EMERGENCY_DATA).json()["id"]
+                first = self.session.request(
+                    method, f"{API_BASE_URL}/emergencies/{emergency_id}", params={"status": "in_progress"}, headers={"If-Match": '"v1"'}
+                )
+                second = self.session.request(
+                    method, f"{API_BASE_URL}/emergencies/{emergency_id}", params={"status": "resolved"}, headers={"If-Match": '"v1"'}
+                )
+                if first.status_code == 200 and first.headers.get("ETag") == '"v2"' and second.status_code == 412:
+                    self.log_test(name, True, "First update 200, stale update 412")
+                else:
+                    self.log_test(name, False, f"Statuses: {first.status_code}, {second.status_code}, ETag: {first.headers.get('ETag')}")
+                self.session.put(f"{API_BASE_URL}/emergencies/{emergency_id}", params={"status": "resolved"})
+            except Exception as e:
+                self.log_test(name, False, f"Error: {str(e)}")
     
     def test_error_handling(self):
         """Test error handling for invalid requests"""
@@ -359,7 +955,23 @@ class HealthAppAPITester:
         self.test_emergency_endpoints()
         self.test_appointments_endpoints()
         self.test_consultations_endpoints()
+        self.test_bulk_import()
+        self.test_appointment_conflicts()
+        self.test_stats_endpoint()
+        self.test_search_endpoint()
         self.test_health_tips_endpoint()
+        self.test_list_pagination()
+        self.test_list_caching()
+        self.test_delta_sync()
+        self.test_archived_lists()
+        self.test_rate_limiting()
+        self.test_export()
+        self.test_emergency_queue()
+        self.test_patient_history()
+        self.test_compressed_if_match()
+        self.test_optimistic_concurrency()
+        self.test_outbox_dead_letter()
+        self.test_reminder_fired_once()
         self.test_error_handling()
         
         # Summary
@@ -384,6 +996,7 @@ class HealthAppAPITester:
         return passed == total
 
 if __name__ == "__main__":
+    print(f"Testing backend API at: {API_BASE_URL}")
     tester = HealthAppAPITester()
     success = tester.run_all_tests()
     
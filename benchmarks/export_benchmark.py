@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Streaming export benchmark.
+
+Loads synthetic consultations (1M by default) into a separate benchmark
+database, then streams the whole collection through the /api/export encoder
+in each format and reports throughput, time to the first chunk, output size
+and the peak memory allocated while exporting. Peak memory should stay flat
+as --consultations grows; compare with --baseline, which loads the whole
+collection into a list first, as the list endpoints do for one page.
+
+    python benchmarks/export_benchmark.py --consultations 1000000
+    python benchmarks/export_benchmark.py --skip-load --formats parquet --batch-size 5000
+
+Requires a running MongoDB (MONGO_URL, default mongodb://localhost:27017).
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from export import column_kinds, parquet_available, stream_export  # noqa: E402
+from indexes import INDEXES  # noqa: E402
+from serialization import model_projection  # noqa: E402
+from server import EXPORT_SOURCES  # noqa: E402
+
+MODEL, DATE_FIELD = EXPORT_SOURCES["consultations"]
+
+
+def synthetic_consultations(count, rng):
+    start = datetime(2024, 1, 1)
+    for _ in range(count):
+        consultation_date = start + timedelta(minutes=rng.randrange(60 * 24 * 365))
+        yield {
+            "id": str(uuid.uuid4()),
+            "patient_name": f"Paciente {rng.randrange(100_000)}",
+            "patient_phone": f"+505-8{rng.randrange(10_000_000):07d}",
+            "doctor_name": f"Dr. {rng.randrange(200)}",
+            "consultation_type": rng.choice(["virtual", "presencial"]),
+            "symptoms": rng.choice(["fiebre", "tos seca", "dolor de cabeza", "mareos", "dolor abdominal"]),
+            "consultation_date": consultation_date,
+            "status": rng.choice(["pending", "in_progress", "completed"]),
+            "diagnosis": rng.choice(["", "gripe", "migraña", "gastritis"]),
+            "treatment": "",
+            "follow_up_date": consultation_date + timedelta(days=14) if rng.random() < 0.3 else None,
+            "version": 1,
+        }
+
+
+async def load(db, count, batch_size, rng):
+    await db.consultations.drop()
+    await db.consultations.create_indexes(INDEXES["consultations"])
+    started = time.perf_counter()
+    batch = []
+    for document in synthetic_consultations(count, rng):
+        batch.append(document)
+        if len(batch) == batch_size:
+            await db.consultations.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await db.consultations.insert_many(batch, ordered=False)
+    print(f"Loaded {count:,} consultations in {time.perf_counter() - started:.1f}s")
+
+
+def cursor(db):
+    return db.consultations.find({}, model_projection(MODEL)).sort([(DATE_FIELD, 1), ("id", 1)])
+
+
+async def export(db, export_format, batch_size, rows):
+    tracemalloc.start()
+    started = time.perf_counter()
+    first_chunk = None
+    size = 0
+    async for chunk in stream_export([cursor(db)], column_kinds(MODEL), export_format, batch_size):
+        if first_chunk is None:
+            first_chunk = time.perf_counter() - started
+        size += len(chunk)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{export_format:<10} {elapsed:8.1f} s  {rows / elapsed:10,.0f} rows/s  first chunk {first_chunk * 1000:7.1f} ms"
+          f"  {size / 1e6:9.1f} MB  peak memory {peak / 1e6:7.1f} MB")
+
+
+async def materialize(db, rows):
+    tracemalloc.start()
+    started = time.perf_counter()
+    documents = await cursor(db).to_list(None)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{'to_list':<10} {elapsed:8.1f} s  {len(documents) / elapsed:10,.0f} rows/s  (no encoding)"
+          f"{'':>28}peak memory {peak / 1e6:7.1f} MB")
+
+
+async def main(args):
+    rng = random.Random(args.seed)
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[args.db]
+    try:
+        if not args.skip_load:
+            await load(db, args.consultations, args.load_batch_size, rng)
+        rows = await db.consultations.estimated_document_count()
+        print(f"Exporting {rows:,} consultations, {args.batch_size} per batch "
+              "(peak memory counts Python allocations only, traced at some cost in speed)")
+        for export_format in args.formats.split(","):
+            if export_format == "parquet" and not parquet_available():
+                print("parquet    skipped: pyarrow is not installed")
+                continue
+            await export(db, export_format, args.batch_size, rows)
+        if args.baseline:
+            await materialize(db, rows)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="salud_benchmark")
+    parser.add_argument("--consultations", type=int, default=1_000_000)
+    parser.add_argument("--load-batch-size", type=int, default=10_000)
+    parser.add_argument("--batch-size", type=int, default=1000, help="records per exported batch (EXPORT_BATCH_SIZE)")
+    parser.add_argument("--formats", default="csv,ndjson,parquet")
+    parser.add_argument("--baseline", action="store_true", help="also load the whole collection into memory")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-load", action="store_true", help="reuse the dataset from a previous run")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Nearest-emergency benchmark on a synthetic dataset.
+
+Loads synthetic emergency reports scattered around Nicaragua into a separate
+benchmark database, then times GET /api/emergencies/nearby's $geoNear
+pipeline against the previous approach of pulling every open report and
+filtering by distance on the client.
+
+Requires a running MongoDB (MONGO_URL, default mongodb://localhost:27017).
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from geo import EARTH_RADIUS_M, near_pipeline, to_geojson_point  # noqa: E402
+from indexes import ensure_indexes  # noqa: E402
+
+# Bounding box roughly covering Nicaragua
+LATITUDES = (10.7, 15.0)
+LONGITUDES = (-87.7, -83.1)
+STATUSES = ["pending", "in_progress", "resolved"]
+
+
+def synthetic_reports(count, rng):
+    start = datetime(2024, 1, 1)
+    for i in range(count):
+        location = {
+            "latitude": rng.uniform(*LATITUDES),
+            "longitude": rng.uniform(*LONGITUDES),
+            "address": f"Dirección sintética {i}",
+        }
+        yield {
+            "id": str(uuid.uuid4()),
+            "patient_name": f"Paciente {i}",
+            "phone": f"+505-{rng.randint(10000000, 99999999)}",
+            "location": location,
+            "geo": to_geojson_point(location),
+            "emergency_type": rng.choice(["Accidente", "Cardíaca", "Respiratoria", "Otro"]),
+            "description": "Reporte sintético de benchmark",
+            "timestamp": start + timedelta(seconds=i),
+            "status": rng.choice(STATUSES),
+        }
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+async def load(db, count, batch_size, rng):
+    await db.emergencies.drop()
+    await ensure_indexes(db)
+    batch = []
+    started = time.perf_counter()
+    for report in synthetic_reports(count, rng):
+        batch.append(report)
+        if len(batch) == batch_size:
+            await db.emergencies.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await db.emergencies.insert_many(batch, ordered=False)
+    print(f"Loaded {count:,} reports in {time.perf_counter() - started:.1f}s")
+
+
+async def geo_near(db, latitude, longitude, radius_m, limit):
+    pipeline = near_pipeline(latitude, longitude, radius_m, {"status": {"$in": ["pending", "in_progress"]}}, limit, {"_id": 0, "id": 1})
+    return await db.emergencies.aggregate(pipeline).to_list(limit)
+
+
+async def client_side(db, latitude, longitude, radius_m, limit):
+    reports = await db.emergencies.find({"status": {"$in": ["pending", "in_progress"]}}, {"_id": 0, "id": 1, "location": 1}).to_list(None)
+    nearby = []
+    for report in reports:
+        distance = haversine_m(latitude, longitude, report["location"]["latitude"], report["location"]["longitude"])
+        if distance <= radius_m:
+            nearby.append((distance, report["id"]))
+    nearby.sort()
+    return nearby[:limit]
+
+
+async def time_queries(name, function, db, points, radius_m, limit):
+    durations = []
+    for latitude, longitude in points:
+        started = time.perf_counter()
+        await function(db, latitude, longitude, radius_m, limit)
+        durations.append((time.perf_counter() - started) * 1000)
+    durations.sort()
+    p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+    print(f"{name:<24} queries={len(durations):<5} p50={statistics.median(durations):9.2f} ms  p95={p95:9.2f} ms")
+
+
+async def main(args):
+    rng = random.Random(args.seed)
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[args.db]
+    try:
+        if not args.skip_load:
+            await load(db, args.reports, args.batch_size, rng)
+        points = [(rng.uniform(*LATITUDES), rng.uniform(*LONGITUDES)) for _ in range(args.queries)]
+        radius_m = args.radius_km * 1000
+        print(f"Nearest open emergencies within {args.radius_km} km, limit {args.limit}")
+        await time_queries("$geoNear (2dsphere)", geo_near, db, points, radius_m, args.limit)
+        if args.baseline_queries:
+            await time_queries("client-side filter", client_side, db, points[:args.baseline_queries], radius_m, args.limit)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="salud_benchmark")
+    parser.add_argument("--reports", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--baseline-queries", type=int, default=3, help="client-side queries to run (0 to skip)")
+    parser.add_argument("--radius-km", type=float, default=5)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-load", action="store_true", help="reuse the dataset from a previous run")
+    asyncio.run(main(parser.parse_args()))
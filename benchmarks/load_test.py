@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Concurrent load test for the Salud al Paso API.
+
+Runs the backend_test.py scenarios (emergency create/update, appointment
+CRUD, consultation create/list, health tips) from many concurrent virtual
+users against the in-process ASGI app and a local MongoDB, then reports
+p50/p95/p99 latency and throughput per endpoint.
+
+Results can be saved as a baseline and later runs compared against it:
+
+    python benchmarks/load_test.py --concurrency 50 --duration 30 --save-baseline benchmarks/baselines/local.json
+    python benchmarks/load_test.py --concurrency 50 --duration 30 --compare benchmarks/baselines/local.json
+
+Latencies depend on the machine and the MongoDB deployment, so no baselines
+are committed (benchmarks/baselines/ is ignored by git): save one on the
+machine you measure on before a change and compare against it after.
+
+Requires a running MongoDB (MONGO_URL, default mongodb://localhost:27017).
+The database named by --db is dropped and reseeded at the start of every run.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / "backend"))
+sys.path.insert(0, str(ROOT_DIR))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="salud_loadtest", help="database to (re)create for the run")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=20, help="seconds to run")
+    parser.add_argument("--dataset", type=int, default=10_000, help="records preloaded per collection")
+    parser.add_argument("--scenarios", default="emergencies,appointments,consultations,health_tips")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save-baseline", type=Path, help="write results to this JSON file")
+    parser.add_argument("--compare", type=Path, help="compare results with this baseline JSON file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative p95 slowdown reported as a regression")
+    return parser.parse_args()
+
+
+args = parse_args()
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ["DB_NAME"] = args.db
+# Every virtual user shares one address: measure the API, not the rate limiter
+os.environ.setdefault("RATE_LIMIT_PER_SECOND", "0")
+
+import httpx  # noqa: E402
+from pymongo.errors import BulkWriteError  # noqa: E402
+
+import server  # noqa: E402
+from backend_test import (  # noqa: E402
+    APPOINTMENT_DATA,
+    APPOINTMENT_UPDATE_DATA,
+    CONSULTATION_DATA,
+    EMERGENCY_DATA,
+)
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def call(self, client, label, method, url, **kwargs):
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.latencies[label].append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            self.errors[label] += 1
+        return response
+
+
+# Scenarios from backend_test.py
+async def emergencies_scenario(client, recorder, rng):
+    response = await recorder.call(client, "POST /api/emergencies", "POST", "/api/emergencies", json=EMERGENCY_DATA)
+    emergency_id = response.json().get("id")
+    if emergency_id:
+        await recorder.call(client, "PUT /api/emergencies/{id}", "PUT", f"/api/emergencies/{emergency_id}",
+                            params={"status": "in_progress"})
+    await recorder.call(client, "GET /api/emergencies", "GET", "/api/emergencies")
+
+
+def random_slot(rng):
+    """Doctor, date and time spread widely enough that bookings rarely collide"""
+    return {
+        "doctor_name": f"Dr. {rng.randrange(500)}",
+        "appointment_date": date(2025, 1, 1) + timedelta(days=rng.randrange(365)),
+        "appointment_time": f"{rng.randrange(8, 18):02d}:{rng.choice((0, 30)):02d}",
+    }
+
+
+async def appointments_scenario(client, recorder, rng):
+    slot = random_slot(rng)
+    data = dict(APPOINTMENT_DATA, **slot, appointment_date=slot["appointment_date"].isoformat())
+    response = await recorder.call(client, "POST /api/appointments", "POST", "/api/appointments", json=data)
+    appointment_id = response.json().get("id")
+    await recorder.call(client, "GET /api/appointments", "GET", "/api/appointments")
+    if appointment_id:
+        await recorder.call(client, "GET /api/appointments/{id}", "GET", f"/api/appointments/{appointment_id}")
+        await recorder.call(client, "PUT /api/appointments/{id}", "PUT", f"/api/appointments/{appointment_id}",
+                            json=APPOINTMENT_UPDATE_DATA)
+        await recorder.call(client, "DELETE /api/appointments/{id}", "DELETE", f"/api/appointments/{appointment_id}")
+
+
+async def consultations_scenario(client, recorder, rng):
+    await recorder.call(client, "POST /api/consultations", "POST", "/api/consultations", json=CONSULTATION_DATA)
+    await recorder.call(client, "GET /api/consultations", "GET", "/api/consultations")
+
+
+async def health_tips_scenario(client, recorder, rng):
+    await recorder.call(client, "GET /api/health-tips", "GET", "/api/health-tips")
+
+
+SCENARIOS = {
+    "emergencies": emergencies_scenario,
+    "appointments": appointments_scenario,
+    "consultations": consultations_scenario,
+    "health_tips": health_tips_scenario,
+}
+
+
+async def seed(count, rng):
+    """Load count records per collection, built the same way the API writes them"""
+    await server.client.drop_database(args.db)
+    await server.prepare_db()
+    batch_size = 5000
+    for start in range(0, count, batch_size):
+        size = min(batch_size, count - start)
+        appointments, consultations, emergencies = [], [], []
+        for _ in range(size):
+            appointments.append(server.appointment_document(
+                server.MedicalAppointment(**dict(APPOINTMENT_DATA, **random_slot(rng)))))
+            consultations.append(server.consultation_document(server.MedicalConsultation(**CONSULTATION_DATA)))
+            emergencies.append(server.emergency_document(server.EmergencyReport(**EMERGENCY_DATA)))
+        try:
+            await server.db.appointments.insert_many(appointments, ordered=False)
+        except BulkWriteError:
+            pass  # the odd double-booked slot is rejected by the unique slot index
+        await server.db.consultations.insert_many(consultations, ordered=False)
+        await server.db.emergencies.insert_many(emergencies, ordered=False)
+
+
+async def virtual_user(client, recorder, scenarios, deadline, rng):
+    while time.perf_counter() < deadline:
+        await rng.choice(scenarios)(client, recorder, rng)
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(recorder, elapsed):
+    results = {}
+    for label, latencies in sorted(recorder.latencies.items()):
+        latencies.sort()
+        results[label] = {
+            "requests": len(latencies),
+            "errors": recorder.errors[label],
+            "rps": len(latencies) / elapsed,
+            "p50_ms": statistics.median(latencies) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+        }
+    return results
+
+
+def print_results(results):
+    print(f"\n{'endpoint':<34} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for label, r in results.items():
+        print(f"{label:<34} {r['requests']:>9} {r['errors']:>7} {r['rps']:>9.1f} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f}")
+
+
+def compare(results, baseline, threshold):
+    """Print p95 and throughput changes against a baseline; return True if any endpoint regressed"""
+    regressed = False
+    print(f"\n{'endpoint':<34} {'p95 before':>11} {'p95 now':>9} {'change':>8} {'req/s change':>13}")
+    for label, r in results.items():
+        before = baseline["results"].get(label)
+        if not before:
+            print(f"{label:<34} {'(new)':>11}")
+            continue
+        change = (r["p95_ms"] - before["p95_ms"]) / before["p95_ms"]
+        rps_change = (r["rps"] - before["rps"]) / before["rps"]
+        flag = "  REGRESSION" if change > threshold else ""
+        regressed = regressed or bool(flag)
+        print(f"{label:<34} {before['p95_ms']:>11.2f} {r['p95_ms']:>9.2f} {change:>+8.0%} {rps_change:>+13.0%}{flag}")
+    return regressed
+
+
+async def main():
+    rng = random.Random(args.seed)
+    scenarios = [SCENARIOS[name.strip()] for name in args.scenarios.split(",")]
+
+    # The ASGI transport does not run the lifespan, so connect as a worker would
+    server.connect()
+    print(f"Seeding {args.dataset:,} records per collection into {args.db}...")
+    await seed(args.dataset, rng)
+
+    recorder = Recorder()
+    transport = httpx.ASGITransport(app=server.app)
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", limits=limits) as client:
+        print(f"Running {len(scenarios)} scenario(s) with {args.concurrency} users for {args.duration}s...")
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(
+            virtual_user(client, recorder, scenarios, deadline, random.Random(args.seed + i))
+            for i in range(args.concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+
+    server.client.close()
+    results = summarize(recorder, elapsed)
+    print_results(results)
+
+    run = {
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "dataset": args.dataset,
+        "scenarios": args.scenarios,
+        "results": results,
+    }
+    if args.save_baseline:
+        args.save_baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.save_baseline.write_text(json.dumps(run, indent=2))
+        print(f"\nBaseline saved to {args.save_baseline}")
+    if args.compare:
+        if compare(results, json.loads(args.compare.read_text()), args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
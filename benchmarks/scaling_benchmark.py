@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Multi-worker throughput scaling benchmark.
+
+Starts the API with uvicorn --workers N for each requested N, drives it with
+a read-mostly request mix from several load-generator processes, and reports
+requests/second, speedup over one worker and scaling efficiency:
+
+    python benchmarks/scaling_benchmark.py --workers 1,2,4,8 --duration 20
+
+The load generators share the machine with the server; give them enough
+processes (--clients) to saturate the largest worker count, and leave cores
+for them, or the curve flattens because of the client rather than the API.
+
+Requires a running MongoDB (MONGO_URL, default mongodb://localhost:27017).
+The database named by --db is dropped and reseeded once per run.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import httpx
+import pymongo
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+# (weight, method, path) of the request mix; {id} is a seeded appointment
+REQUEST_MIX = [
+    (40, "GET", "/api/appointments?limit=20"),
+    (25, "GET", "/api/appointments/{id}"),
+    (20, "GET", "/api/health-tips"),
+    (10, "GET", "/api/consultations?limit=20"),
+    (5, "GET", "/api/emergencies?limit=20"),
+]
+
+
+def start_server(workers, port, db_name):
+    env = dict(os.environ, DB_NAME=db_name)
+    env.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    # The load generators share one address: measure the API, not the rate limiter
+    env.setdefault("RATE_LIMIT_PER_SECOND", "0")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR, env=env,
+    )
+
+
+def wait_ready(base_url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/api/health?deep=true", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"server at {base_url} did not become ready in {timeout}s")
+
+
+def seed(base_url, count, rng):
+    """Create count appointments through the bulk endpoint; return their ids"""
+    ids = []
+    with httpx.Client(base_url=base_url, timeout=120) as client:
+        for start in range(0, count, 1000):
+            items = [
+                {
+                    "patient_name": f"Paciente {start + i}",
+                    "patient_phone": f"+505-8{rng.randrange(10_000_000):07d}",
+                    "doctor_name": f"Dr. {rng.randrange(500)}",
+                    "specialty": "Medicina General",
+                    "appointment_date": (date(2025, 1, 1) + timedelta(days=rng.randrange(365))).isoformat(),
+                    "appointment_time": f"{rng.randrange(8, 18):02d}:{rng.choice((0, 30)):02d}",
+                    "reason": "Control general",
+                }
+                for i in range(min(1000, count - start))
+            ]
+            result = client.post("/api/appointments/bulk", json=items).json()
+            ids.extend(item["id"] for item in result["results"] if item["status"] == "created")
+    return ids
+
+
+async def drive(base_url, connections, deadline, ids, seed_value):
+    rng = random.Random(seed_value)
+    weights = [weight for weight, _, _ in REQUEST_MIX]
+    completed = errors = 0
+
+    async def user(client):
+        nonlocal completed, errors
+        while time.monotonic() < deadline:
+            _, method, path = rng.choices(REQUEST_MIX, weights)[0]
+            try:
+                response = await client.request(method, path.format(id=rng.choice(ids)))
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            completed += 1
+
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        await asyncio.gather(*(user(client) for _ in range(connections)))
+    return completed, errors
+
+
+def load_process(base_url, connections, deadline, ids, seed_value, results):
+    results.put(asyncio.run(drive(base_url, connections, deadline, ids, seed_value)))
+
+
+def measure(base_url, args, ids):
+    """Requests/second and error count from --clients processes running for --duration seconds"""
+    # warm up connections and worker caches
+    asyncio.run(drive(base_url, args.connections, time.monotonic() + args.warmup, ids, args.seed))
+    results = multiprocessing.Queue()
+    deadline = time.monotonic() + args.duration
+    processes = [
+        multiprocessing.Process(target=load_process,
+                                args=(base_url, args.connections, deadline, ids, args.seed + i, results))
+        for i in range(args.clients)
+    ]
+    started = time.monotonic()
+    for process in processes:
+        process.start()
+    totals = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    elapsed = time.monotonic() - started
+    return sum(done for done, _ in totals) / elapsed, sum(failed for _, failed in totals)
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    worker_counts = [int(n) for n in args.workers.split(",")]
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    # Start from an empty database; it is seeded on the first run and reused by the others
+    mongo = pymongo.MongoClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    mongo.drop_database(args.db)
+    mongo.close()
+
+    print(f"{'workers':>7} {'req/s':>10} {'speedup':>8} {'efficiency':>10} {'errors':>7}")
+    baseline = None
+    ids = None
+    for workers in worker_counts:
+        server = start_server(workers, args.port, args.db)
+        try:
+            wait_ready(base_url)
+            if ids is None:
+                print(f"Seeding {args.dataset:,} appointments into {args.db}...", file=sys.stderr)
+                ids = seed(base_url, args.dataset, rng)
+            rps, errors = measure(base_url, args, ids)
+        finally:
+            server.terminate()
+            server.wait()
+        baseline = baseline or rps / workers
+        speedup = rps / baseline
+        print(f"{workers:>7} {rps:>10.0f} {speedup:>7.2f}x {speedup / workers:>10.0%} {errors:>7}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="salud_scaling")
+    parser.add_argument("--workers", default=",".join(str(n) for n in (1, 2, 4, 8) if n <= os.cpu_count()))
+    parser.add_argument("--clients", type=int, default=max(1, os.cpu_count() // 2), help="load generator processes")
+    parser.add_argument("--connections", type=int, default=32, help="concurrent connections per load generator")
+    parser.add_argument("--duration", type=float, default=20, help="seconds measured per worker count")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds of unmeasured load before each run")
+    parser.add_argument("--dataset", type=int, default=10_000, help="appointments to seed")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=42)
+    main(parser.parse_args())
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Full-text search benchmark on a synthetic Spanish corpus.
+
+Loads synthetic consultations whose symptoms and diagnoses are built from a
+clinical vocabulary (with and without accents) into a separate benchmark
+database, then times GET /api/search's ranked $text pipeline against a
+case-insensitive regex scan, the only way to find a symptom before the
+text indexes existed.
+
+Requires a running MongoDB (MONGO_URL, default mongodb://localhost:27017).
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from indexes import INDEXES  # noqa: E402
+from search import text_search_pipeline  # noqa: E402
+
+SYMPTOMS = [
+    "dolor de cabeza", "dolores musculares", "fiebre alta", "tos seca", "tos con flema",
+    "náuseas", "vómitos", "mareos ocasionales", "dificultad para respirar", "dolor abdominal",
+    "diarrea", "cansancio", "pérdida de apetito", "erupción en la piel", "dolor de garganta",
+    "congestión nasal", "palpitaciones", "dolor en el pecho", "visión borrosa", "insomnio",
+]
+DIAGNOSES = [
+    "migraña", "gripe", "infección respiratoria", "gastritis", "hipertensión", "diabetes tipo 2",
+    "dengue", "faringitis", "ansiedad", "anemia", "bronquitis", "alergia estacional",
+]
+QUALIFIERS = ["persistente", "leve", "intenso", "desde hace tres días", "por las noches", "después de comer"]
+QUERIES = ["dolor de cabeza", "fiebre", "tos", "mareo", "respiracion", "dengue", "migrana", "dolor pecho"]
+
+
+def synthetic_consultations(count, rng):
+    start = datetime(2024, 1, 1)
+    for _ in range(count):
+        symptoms = ", ".join(
+            f"{symptom} {rng.choice(QUALIFIERS)}" for symptom in rng.sample(SYMPTOMS, rng.randint(1, 3))
+        )
+        yield {
+            "id": str(uuid.uuid4()),
+            "patient_name": "Paciente",
+            "patient_phone": f"+505-8{rng.randrange(10_000_000):07d}",
+            "doctor_name": f"Dr. {rng.randrange(200)}",
+            "consultation_type": rng.choice(["virtual", "presencial"]),
+            "symptoms": symptoms.capitalize(),
+            "diagnosis": rng.choice(DIAGNOSES) if rng.random() < 0.7 else "",
+            "consultation_date": start + timedelta(minutes=rng.randrange(60 * 24 * 365)),
+            "status": "completed",
+            "version": 1,
+        }
+
+
+async def load(db, count, batch_size, rng):
+    await db.consultations.drop()
+    await db.consultations.create_indexes(INDEXES["consultations"])
+    started = time.perf_counter()
+    batch = []
+    for document in synthetic_consultations(count, rng):
+        batch.append(document)
+        if len(batch) == batch_size:
+            await db.consultations.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await db.consultations.insert_many(batch, ordered=False)
+    print(f"Loaded {count:,} consultations in {time.perf_counter() - started:.1f}s")
+
+
+async def text_search(db, text, limit):
+    return await db.consultations.aggregate(
+        text_search_pipeline(text, limit, projection={"_id": 0, "id": 1})).to_list(limit)
+
+
+async def regex_scan(db, text, limit):
+    # Ranking needs every match, so the regex has to visit the whole collection too
+    pattern = {"$regex": text, "$options": "i"}
+    return await db.consultations.count_documents({"$or": [{"symptoms": pattern}, {"diagnosis": pattern}]})
+
+
+async def time_queries(name, function, db, queries, limit):
+    durations = []
+    for text in queries:
+        started = time.perf_counter()
+        await function(db, text, limit)
+        durations.append((time.perf_counter() - started) * 1000)
+    durations.sort()
+    p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+    print(f"{name:<20} queries={len(durations):<5} p50={statistics.median(durations):9.2f} ms  p95={p95:9.2f} ms")
+
+
+async def main(args):
+    rng = random.Random(args.seed)
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[args.db]
+    try:
+        if not args.skip_load:
+            await load(db, args.consultations, args.batch_size, rng)
+        queries = [rng.choice(QUERIES) for _ in range(args.queries)]
+
+        # Accent-insensitive matching: unaccented queries find accented text
+        found = await text_search(db, "migrana nauseas", 5)
+        print(f"'migrana nauseas' matched {len(found)} documents (stored as 'migraña', 'náuseas')")
+
+        print(f"Top {args.limit} matches")
+        await time_queries("$text (ranked)", text_search, db, queries, args.limit)
+        if args.baseline_queries:
+            await time_queries("regex scan", regex_scan, db, queries[:args.baseline_queries], args.limit)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="salud_benchmark")
+    parser.add_argument("--consultations", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--baseline-queries", type=int, default=5, help="regex scans to run (0 to skip)")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-load", action="store_true", help="reuse the dataset from a previous run")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Serialization benchmark for the 1000-row GET /api/appointments response.
+
+Compares the previous read path (ISO string conversion loop, one
+MedicalAppointment per row, response_model re-validation and JSON encoding)
+with the raw document encoder used by the list endpoints now.
+No MongoDB is needed: rows are built in their stored form.
+"""
+
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, date, timedelta
+from pathlib import Path
+from typing import List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmark")
+
+from pydantic import TypeAdapter  # noqa: E402
+
+from server import MedicalAppointment  # noqa: E402
+from serialization import dumps  # noqa: E402
+
+ROWS = 1000
+ROUNDS = 50
+
+
+def stored_appointments(rows):
+    """Appointments as they come back from MongoDB"""
+    start = date(2025, 1, 1)
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "patient_name": f"Paciente {i}",
+            "patient_phone": f"+505-8{i:03d}-{i:04d}",
+            "doctor_name": f"Dr. Médico {i % 20}",
+            "specialty": "Cardiología",
+            "appointment_date": (start + timedelta(days=i % 365)).isoformat(),
+            "appointment_time": "10:30",
+            "reason": "Chequeo rutinario del corazón y control de presión arterial " * 3,
+            "status": "scheduled",
+            "notes": "Paciente confirmó asistencia",
+            "created_at": datetime(2025, 1, 1, 8, 0, 0, 123000).isoformat(),
+        }
+        for i in range(rows)
+    ]
+
+
+def previous_path(appointments, adapter):
+    for appointment in appointments:
+        if isinstance(appointment["appointment_date"], str):
+            appointment["appointment_date"] = datetime.fromisoformat(appointment["appointment_date"]).date()
+        if isinstance(appointment["created_at"], str):
+            appointment["created_at"] = datetime.fromisoformat(appointment["created_at"])
+    models = [MedicalAppointment(**appointment) for appointment in appointments]
+    # What FastAPI does with response_model: validate again, then encode
+    validated = adapter.validate_python(models, from_attributes=True)
+    return json.dumps(adapter.dump_python(validated, mode="json")).encode()
+
+
+def raw_path(appointments):
+    return dumps(appointments)
+
+
+def measure(name, function, make_rows):
+    elapsed = 0.0
+    for _ in range(ROUNDS):
+        rows = make_rows()
+        started = time.perf_counter()
+        function(rows)
+        elapsed += time.perf_counter() - started
+    rows_per_second = ROWS * ROUNDS / elapsed
+    print(f"{name:<28} {elapsed / ROUNDS * 1000:8.2f} ms/page {rows_per_second:12,.0f} rows/sec")
+    return rows_per_second
+
+
+if __name__ == "__main__":
+    template = stored_appointments(ROWS)
+    adapter = TypeAdapter(List[MedicalAppointment])
+
+    print(f"GET /api/appointments serialization, {ROWS} rows x {ROUNDS} rounds")
+    before = measure("before (pydantic x2)", lambda rows: previous_path(rows, adapter), lambda: [dict(r) for r in template])
+    after = measure("after (raw documents)", raw_path, lambda: [dict(r) for r in template])
+    print(f"Speedup: {after / before:.1f}x")